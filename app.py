@@ -9,11 +9,13 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from utils.replica import RoutingSession
+
 
 # ---------------------------------
 # Extensions (initialized later)
 # ---------------------------------
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})  # replica routing: utils/replica.py
 migrate = Migrate()
 argon2 = Argon2()
 jwt = JWTManager()
@@ -55,6 +57,21 @@ def create_app():
         allow_headers=["Content-Type", "Authorization"]
     )
 
+    # ---------------------------------
+    # Database pool profile (per environment)
+    # ---------------------------------
+    from utils.db_pool import engine_options, register_engines
+
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI") or ""
+    if "SQLALCHEMY_ENGINE_OPTIONS" not in app.config and not uri.startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(ENV, app.config)
+
+    # ---------------------------------
+    # Optional read replica for reports (adds the "replica" bind)
+    # ---------------------------------
+    from utils.replica import init_replica
+    init_replica(app, db)
+
     # ---------------------------------
     # Initialize extensions
     # ---------------------------------
@@ -63,6 +80,12 @@ def create_app():
     argon2.init_app(app)
     jwt.init_app(app)
 
+    from utils.kiosk_auth import init_kiosk_auth
+    init_kiosk_auth(jwt)  # KIOSK tokens only reach sync and event upload
+
+    with app.app_context():
+        register_engines(db.engines)
+
     # ---------------------------------
     # Register Blueprints
     # ---------------------------------
@@ -71,16 +94,63 @@ def create_app():
     from routes.crypto_route import crypto_bp
     from routes.biometrics_routes import biometric_bp
     from routes.attendance_route import attendance_bp
+    from routes.metrics_routes import metrics_bp
+    from routes.diagnostics_routes import diagnostics_bp
+    from routes.health_routes import health_bp
+    from routes.gallery_routes import gallery_bp
+    from routes.jobs_routes import jobs_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(user_bp, url_prefix="/api/users")
     app.register_blueprint(crypto_bp, url_prefix="/api/crypto")
     app.register_blueprint(biometric_bp, url_prefix="/api/biometrics")
     app.register_blueprint(attendance_bp, url_prefix="/api/attendance")
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(diagnostics_bp, url_prefix="/api/diagnostics")
+    app.register_blueprint(health_bp, url_prefix="/api/health")
+    app.register_blueprint(gallery_bp, url_prefix="/api/gallery")
+    app.register_blueprint(jobs_bp, url_prefix="/api/jobs")
+
+    # ---------------------------------
+    # Instrumentation (latency, SQL, payload sizes, slow queries)
+    # ---------------------------------
+    from utils.metrics import init_metrics
+    from utils.slow_query import init_slow_query_log
+    init_metrics(app)
+    init_slow_query_log(app)
+
+    from utils.match_telemetry import init_match_telemetry
+    init_match_telemetry(app)
+
+    from utils.memory import init_memory_diagnostics
+    init_memory_diagnostics(app)
+
+    # ---------------------------------
+    # Background jobs (threads start with the worker's first request)
+    # ---------------------------------
+    from utils.jobs import init_jobs
+    init_jobs(app)
+
+    # ---------------------------------
+    # End-of-day closer (auto sign-out + absence marking) scheduler
+    # ---------------------------------
+    from utils.end_of_day import init_end_of_day
+    init_end_of_day(app)
+
+    # ---------------------------------
+    # Warm-up (gallery preload); servers that don't call warm_up() themselves
+    # can opt into a background warm-up with WARMUP_ON_START
+    # ---------------------------------
+    if app.config.get("WARMUP_ON_START"):
+        from utils.startup import start_warm_up
+        start_warm_up(app)
 
     return app
 
 
 if __name__ == "__main__":
+    from utils.startup import warm_up
+
     app = create_app()
+    warm_up(app)
     app.run(debug=True, host="0.0.0.0", port=5000)
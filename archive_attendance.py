@@ -0,0 +1,56 @@
+"""
+Move old attendance rows out of the hot tables into monthly Parquet files.
+
+Archives every whole month older than ATTENDANCE_RETENTION_DAYS (or
+--retention-days) for staff and student attendance, then deletes the archived
+rows. Safe to re-run: months already archived are merged, not duplicated.
+Run it from cron during quiet hours, one instance at a time.
+
+Usage:
+    python archive_attendance.py --dry-run
+    python archive_attendance.py [--retention-days 400] [--table staff|students]
+    python archive_attendance.py --list
+"""
+
+import argparse
+import sys
+
+from app import create_app
+from models.models import StaffAttendance, StudentAttendance
+from utils.archive import archive_cutoff, archive_model, archived_months
+
+TABLES = {"staff": StaffAttendance, "students": StudentAttendance}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old attendance months to Parquet")
+    parser.add_argument("--retention-days", type=int, help="Keep this many days hot (default: config)")
+    parser.add_argument("--table", choices=sorted(TABLES), action="append", help="Only this table (repeatable)")
+    parser.add_argument("--batch-size", type=int, help="Rows per select/delete batch (default: config)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived")
+    parser.add_argument("--list", action="store_true", help="Show archived months and exit")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        models = [TABLES[name] for name in (args.table or sorted(TABLES))]
+
+        if args.list:
+            for model in models:
+                for month in archived_months(model):
+                    print(f"{model.__tablename__:<20} {month['month']}  {month['rows']:>9,} rows  "
+                          f"{month['row_groups']:>3} row groups  {month['bytes']:>12,} bytes")
+            return 0
+
+        cutoff = archive_cutoff(args.retention_days)
+        print(f"Archiving attendance created before {cutoff:%Y-%m-%d}" + (" (dry run)" if args.dry_run else ""))
+        total = 0
+        for model in models:
+            total += sum(archive_model(model, cutoff, args.batch_size, args.dry_run).values())
+
+    print(f"✅ {total} rows {'to archive' if args.dry_run else 'archived'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
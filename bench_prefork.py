@@ -0,0 +1,246 @@
+"""
+Pre-fork benchmark: memory and latency of gunicorn.conf.py with the gallery
+loaded once in the master (preload) versus loaded by every worker.
+
+For each profile it starts gunicorn, waits until every worker is warm and
+their memory has settled, fires --requests face verifications (raw float32
+probes against /api/biometrics/verify/face, which searches the whole
+gallery) from --concurrency threads, and reads each process's memory from
+/proc. PSS totals count shared pages once, so they are what the deployment
+really costs; "shared" is what a worker still shares with the master.
+
+With --synthetic it seeds a throwaway SQLite database with that many 512-d
+templates (SECRET_KEY and JWT_SECRET_KEY must be set as for the app);
+otherwise it runs against DATABASE_URL as configured.
+
+Usage:
+    python bench_prefork.py --synthetic 20000 --workers 4
+    python bench_prefork.py --workers 4 --threads 8 --requests 2000
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+from utils.memory import process_memory
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ---------------------------
+# Gallery
+# ---------------------------
+
+def seed_synthetic(path, count, dim, rng):
+    """Create a SQLite database with `count` staff, one face template each; returns the templates."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from app import create_app, db
+    from models.models import Biometric, User
+
+    templates = rng.standard_normal((count, dim)).astype(np.float32)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {"firstname": f"Bench{i}", "lastname": "Prefork", "email": f"bench{i}@prefork.local",
+             "role": "STAFF", "department": f"Dept{i % 8}"}
+            for i in range(count)
+        ])
+        user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+        db.session.execute(db.insert(Biometric), [
+            {"user_id": user_id, "face_template": json.dumps(row.tolist()).encode("utf-8")}
+            for user_id, row in zip(user_ids, templates)
+        ])
+        db.session.commit()
+    return templates
+
+
+def configured_dim():
+    from app import create_app
+    from utils.face_gallery import gallery
+
+    app = create_app()
+    with app.app_context():
+        return gallery.load().dim
+
+
+# ---------------------------
+# Processes
+# ---------------------------
+
+def children(pid):
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fh:
+                # pid (comm) state ppid ...; comm may contain spaces
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return sorted(found)
+
+
+def wait_until_warm(proc, url, workers, timeout):
+    """Seconds until /ready answers and every worker exists with settled memory."""
+    started = time.perf_counter()
+    ready = None
+    stable, last = 0, None
+    while time.perf_counter() - started < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        if ready is None:
+            try:
+                if httpx.get(f"{url}/api/health/ready", timeout=2).status_code == 200:
+                    ready = time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+        pids = children(proc.pid)
+        total = sum((process_memory(pid) or {}).get("rss") or 0 for pid in pids)
+        if ready is not None and len(pids) == workers and last and abs(total - last) <= 0.01 * last:
+            stable += 1
+            if stable >= 3:
+                return ready, time.perf_counter() - started
+        else:
+            stable = 0
+        last = total
+        time.sleep(0.5)
+    raise RuntimeError("workers did not settle in time")
+
+
+def memory_snapshot(master):
+    workers = {pid: process_memory(pid) or {} for pid in children(master)}
+    return {"master": process_memory(master) or {}, "workers": workers}
+
+
+def fire(url, probes, concurrency):
+    latencies = []
+
+    def one(client, probe):
+        started = time.perf_counter()
+        response = client.post(
+            f"{url}/api/biometrics/verify/face", content=probe,
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    with httpx.Client(timeout=30) as client:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = list(pool.map(lambda probe: one(client, probe), probes))
+        elapsed = time.perf_counter() - started
+    latencies = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"rps": len(probes) / elapsed, "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": latencies.max()}
+
+
+def run_profile(preload, args, probes):
+    url = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ,
+        GUNICORN_PRELOAD=str(preload).lower(),
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_BIND=f"127.0.0.1:{args.port}",
+        GUNICORN_ACCESS_LOG="",
+        END_OF_DAY_ENABLED="false",
+    )
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn"], cwd=HERE, env=env, stdout=log, stderr=log)
+    try:
+        ready_s, warm_s = wait_until_warm(proc, url, args.workers, args.timeout)
+        idle = memory_snapshot(proc.pid)
+        latency = fire(url, probes, args.concurrency)
+        loaded = memory_snapshot(proc.pid)
+    except Exception:
+        log.seek(0)
+        sys.stderr.write(log.read().decode(errors="replace")[-4000:])
+        raise
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+    return {"ready_s": ready_s, "warm_s": warm_s, "idle": idle, "loaded": loaded, "latency": latency}
+
+
+# ---------------------------
+# Report
+# ---------------------------
+
+def summarise(snapshot):
+    workers = list(snapshot["workers"].values())
+
+    def mean(key):
+        return sum(w.get(key) or 0 for w in workers) / max(len(workers), 1) / 2**20
+
+    total_pss = ((snapshot["master"].get("pss") or 0) + sum(w.get("pss") or 0 for w in workers)) / 2**20
+    return {"worker_rss": mean("rss"), "worker_pss": mean("pss"), "worker_shared": mean("shared"),
+            "worker_private": mean("private"), "total_pss": total_pss}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare preloaded (copy-on-write) and per-worker gallery loading")
+    parser.add_argument("--synthetic", type=int, help="Seed a temporary SQLite gallery of this many templates")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for warm workers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic:
+            templates = seed_synthetic(os.path.join(tmp, "bench.db"), args.synthetic, args.dim, rng)
+            picks = templates[rng.integers(len(templates), size=args.requests)]
+            probes = picks + rng.normal(0, 0.3, picks.shape).astype(np.float32)
+        else:
+            probes = rng.standard_normal((args.requests, configured_dim()))
+        probes = [row.astype("<f4").tobytes() for row in probes]
+
+        results = {}
+        for name, preload in (("per-worker", False), ("preload", True)):
+            print(f"… {name}: {args.workers} workers × {args.threads} threads", file=sys.stderr)
+            results[name] = run_profile(preload, args, probes)
+
+    print(f"\n{'':<26} {'per-worker':>12} {'preload':>12}")
+
+    def row(label, value, fmt="{:12.1f}"):
+        print(f"{label:<26} " + " ".join(fmt.format(value(results[name])) for name in ("per-worker", "preload")))
+
+    row("first ready (s)", lambda r: r["ready_s"], "{:12.2f}")
+    row("all workers warm (s)", lambda r: r["warm_s"], "{:12.2f}")
+    for phase in ("idle", "loaded"):
+        row(f"{phase}: worker RSS MB", lambda r: summarise(r[phase])["worker_rss"])
+        row(f"{phase}: worker PSS MB", lambda r: summarise(r[phase])["worker_pss"])
+        row(f"{phase}: worker shared MB", lambda r: summarise(r[phase])["worker_shared"])
+        row(f"{phase}: worker private MB", lambda r: summarise(r[phase])["worker_private"])
+        row(f"{phase}: total PSS MB", lambda r: summarise(r[phase])["total_pss"])
+    row("requests/s", lambda r: r["latency"]["rps"])
+    row("p50 ms", lambda r: r["latency"]["p50_ms"], "{:12.2f}")
+    row("p95 ms", lambda r: r["latency"]["p95_ms"], "{:12.2f}")
+    row("p99 ms", lambda r: r["latency"]["p99_ms"], "{:12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
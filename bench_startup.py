@@ -0,0 +1,111 @@
+"""
+Cold-start benchmark: import time of `create_app()` in fresh interpreters.
+
+Each run spawns `python -X importtime` so nothing is cached between runs,
+reports the median wall time and import cost per package, and fails if a heavy
+module that routes should import lazily (numpy by default) is loaded at
+startup, or if the median exceeds --max-ms / regresses against --baseline.
+
+Usage:
+    python bench_startup.py [--runs 7] [--max-ms 1500] [--out startup.json]
+    python bench_startup.py --baseline startup.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import sys, time
+t0 = time.perf_counter()
+from app import create_app
+app = create_app()
+elapsed = time.perf_counter() - t0
+import json
+print(json.dumps({"ms": elapsed * 1000, "modules": sorted(sys.modules)}))
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("WARMUP_ON_START", "false")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package";
+    # self time is summed per root package (flask, sqlalchemy, numpy, routes, ...)
+    per_package = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        root = name.strip().split(".")[0]
+        per_package[root] = per_package.get(root, 0) + int(self_us)
+    result["package_us"] = per_package
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure create_app() cold-start import time")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--forbid", action="append", default=None,
+                        help="Module that must not be imported at startup (repeatable, default: numpy)")
+    parser.add_argument("--max-ms", type=float, help="Fail if the median exceeds this")
+    parser.add_argument("--baseline", help="JSON from a previous --out to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs baseline (0.2 = 20%%)")
+    parser.add_argument("--out", help="Write results as JSON")
+    args = parser.parse_args(argv)
+    forbid = args.forbid or ["numpy"]
+
+    runs = [run_once() for _ in range(args.runs)]
+    median_ms = statistics.median(r["ms"] for r in runs)
+    top = {}
+    for r in runs:
+        for name, us in r["package_us"].items():
+            top.setdefault(name, []).append(us)
+    slowest = sorted(((statistics.median(v) / 1000, k) for k, v in top.items()), reverse=True)[:args.top]
+
+    print(f"create_app() cold start: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(r['ms'] for r in runs):.1f}, max {max(r['ms'] for r in runs):.1f})")
+    print("\nImport time by package (ms):")
+    for ms, name in slowest:
+        print(f"  {ms:8.1f}  {name}")
+
+    failures = []
+    loaded = set(runs[0]["modules"])
+    for module in forbid:
+        if module in loaded:
+            failures.append(f"{module} is imported at startup")
+
+    if args.max_ms and median_ms > args.max_ms:
+        failures.append(f"median {median_ms:.1f} ms exceeds budget {args.max_ms:.1f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)["median_ms"]
+        if median_ms > baseline * (1 + args.tolerance):
+            failures.append(f"median {median_ms:.1f} ms regressed vs baseline {baseline:.1f} ms")
+        print(f"\nBaseline {baseline:.1f} ms → {median_ms:.1f} ms ({(median_ms / baseline - 1) * 100:+.1f}%)")
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"median_ms": median_ms, "runs_ms": [r["ms"] for r in runs],
+                       "slowest": [{"module": n, "ms": ms} for ms, n in slowest]}, fh, indent=2)
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Offline face match threshold calibration.
+
+Scores every pair of enrolled templates (blocked matrix products, see
+utils/similarity.py), splits the scores into genuine (same user) and impostor
+(different users) histograms, and reports FAR/FRR at the current threshold,
+the equal error rate and the lowest threshold meeting --target-far. Genuine
+pairs need users with more than one template; with one template each only the
+impostor side (and so FAR) is measured.
+
+FAR here is per pair. A sign-in searches the whole gallery, so the chance
+that an unknown face clears the threshold against someone is roughly
+1 - (1 - FAR) ** N; that figure is printed as well.
+
+--out writes the ROC/DET curve as CSV (threshold, far, frr, tar per bin edge)
+or, for a .json path, the summary with the curve and both histograms.
+
+Usage:
+    python calibrate_threshold.py --target-far 1e-4
+    python calibrate_threshold.py --workers 4 --block-size 4096 --out roc.csv
+    python calibrate_threshold.py --synthetic 20000 --per-user 3 --dim 512
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from utils.face_gallery import decode_template, normalise
+from utils.similarity import DEFAULT_BINS, equal_error_rate, error_rates, pair_histograms, threshold_for_far
+
+CURRENT_THRESHOLD = 0.65
+FAR_TABLE = (1e-2, 1e-3, 1e-4, 1e-5, 1e-6)
+
+
+def synthetic_gallery(users, per_user, dim, rng):
+    """Unit templates: each user's enrolments are noisy copies of one identity vector."""
+    identities = rng.standard_normal((users, dim)).astype(np.float32)
+    matrix = np.repeat(identities, per_user, axis=0)
+    matrix += rng.normal(0, 0.6, matrix.shape).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix, np.repeat(np.arange(1, users + 1), per_user)
+
+
+def db_gallery():
+    from app import create_app, db
+    from models.models import Biometric
+
+    app = create_app()
+    vectors, user_ids = [], []
+    with app.app_context():
+        rows = (
+            db.session.query(Biometric.user_id, Biometric.face_template)
+            .filter(Biometric.face_template.isnot(None), Biometric.user_id.isnot(None))
+            .order_by(Biometric.id)
+            .yield_per(1000)
+        )
+        for user_id, raw in rows:
+            vector = decode_template(raw)
+            unit = normalise(vector) if vector is not None else None
+            if unit is not None:
+                vectors.append(unit)
+                user_ids.append(user_id)
+
+    # Same rule as the gallery: keep the dominant dimension
+    dim = Counter(v.size for v in vectors).most_common(1)[0][0] if vectors else 0
+    keep = [i for i, v in enumerate(vectors) if v.size == dim]
+    matrix = np.empty((len(keep), dim), dtype=np.float32)
+    for row, i in enumerate(keep):
+        matrix[row] = vectors[i]
+    return matrix, np.asarray([user_ids[i] for i in keep])
+
+
+def rates_at(thresholds, far, frr, threshold):
+    index = int(np.searchsorted(thresholds, threshold - 1e-9))
+    return float(far[index]), float(frr[index])
+
+
+def write_curve(path, thresholds, far, frr, summary, genuine, impostor):
+    if path.endswith(".json"):
+        payload = {
+            **summary,
+            "curve": {"threshold": thresholds.round(6).tolist(), "far": far.tolist(), "frr": frr.tolist()},
+            "histograms": {"genuine": genuine.tolist(), "impostor": impostor.tolist()},
+        }
+        with open(path, "w") as f:
+            json.dump(payload, f)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["threshold", "far", "frr", "tar"])
+        for t, a, r in zip(thresholds, far, frr):
+            writer.writerow([f"{t:.4f}", f"{a:.6e}", f"{r:.6e}", f"{1 - r:.6e}"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genuine/impostor score distributions and a recommended threshold")
+    parser.add_argument("--synthetic", type=int, metavar="USERS", help="Use a random gallery of USERS identities")
+    parser.add_argument("--per-user", type=int, default=3, help="Templates per synthetic user")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--target-far", type=float, default=1e-4, help="Per-pair false accept rate to meet")
+    parser.add_argument("--block-size", type=int, default=2048, help="Rows per tile; memory ~ 16 × block² bytes")
+    parser.add_argument("--workers", type=int, default=1, help="Processes scoring row blocks in parallel")
+    parser.add_argument("--bins", type=int, default=DEFAULT_BINS, help="Histogram bins over [-1, 1]")
+    parser.add_argument("--out", help="Write the ROC/DET curve (.csv) or full summary (.json)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        matrix, user_ids = synthetic_gallery(args.synthetic, args.per_user, args.dim, np.random.default_rng(args.seed))
+    else:
+        matrix, user_ids = db_gallery()
+    n = len(matrix)
+    if n < 2:
+        print("⚠️ Need at least two templates")
+        return 2
+
+    def progress(done, total):
+        print(f"\r  scoring row blocks {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    started = time.perf_counter()
+    genuine, impostor = pair_histograms(
+        matrix, user_ids, block=args.block_size, bins=args.bins, workers=args.workers, progress=progress
+    )
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+
+    genuine_pairs, impostor_pairs = int(genuine.sum()), int(impostor.sum())
+    thresholds, far, frr = error_rates(genuine, impostor)
+    index, recommended = threshold_for_far(thresholds, far, args.target_far)
+    current_far, current_frr = rates_at(thresholds, far, frr, CURRENT_THRESHOLD)
+
+    summary = {
+        "templates": n,
+        "users": int(len(np.unique(user_ids))),
+        "dim": int(matrix.shape[1]),
+        "genuine_pairs": genuine_pairs,
+        "impostor_pairs": impostor_pairs,
+        "seconds": round(elapsed, 2),
+        "target_far": args.target_far,
+        "recommended_threshold": round(recommended, 4),
+        "far_at_recommended": float(far[index]),
+        "frr_at_recommended": float(frr[index]) if genuine_pairs else None,
+        "current_threshold": CURRENT_THRESHOLD,
+        "far_at_current": current_far,
+        "frr_at_current": current_frr if genuine_pairs else None,
+    }
+    if genuine_pairs:
+        summary["eer_threshold"], summary["eer"] = equal_error_rate(thresholds, far, frr)
+
+    pairs_per_second = (genuine_pairs + impostor_pairs) / max(elapsed, 1e-9)
+    print(f"{n} templates, {summary['users']} users, dim={summary['dim']}: "
+          f"{genuine_pairs:,} genuine / {impostor_pairs:,} impostor pairs in {elapsed:.2f}s "
+          f"({pairs_per_second:,.0f} pairs/s)")
+    if not genuine_pairs:
+        print("⚠️ No user has two templates: FRR cannot be measured, thresholds below only bound FAR")
+    if impostor_pairs * args.target_far < 1:
+        print(f"⚠️ Not enough impostor pairs to resolve FAR {args.target_far:g}")
+
+    print(f"\n  {'target FAR':>10}  {'threshold':>9}  {'FRR':>9}  {'1:N FAR':>9}")
+    for target in sorted({*FAR_TABLE, args.target_far}, reverse=True):
+        i, t = threshold_for_far(thresholds, far, target)
+        frr_text = f"{frr[i]:9.4%}" if genuine_pairs else f"{'-':>9}"
+        print(f"  {target:>10.0e}  {t:9.3f}  {frr_text}  {1 - (1 - far[i]) ** (n - 1):9.4%}")
+
+    print(f"\n  current threshold {CURRENT_THRESHOLD}: FAR {current_far:.2e}"
+          + (f", FRR {current_frr:.4%}" if genuine_pairs else ""))
+    if genuine_pairs:
+        print(f"  equal error rate {summary['eer']:.4%} at {summary['eer_threshold']:.3f}")
+    print(f"✅ Recommended threshold for FAR ≤ {args.target_far:g}: {recommended:.3f}")
+
+    if args.out:
+        write_curve(args.out, thresholds, far, frr, summary, genuine, impostor)
+        print(f"  curve written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
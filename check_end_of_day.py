@@ -0,0 +1,82 @@
+"""
+End-of-day check: someone marked ABSENT who signs in later that day must end
+up signed in, not absent.
+
+Seeds a throwaway SQLite database with one staff member and one student,
+closes today (both get ABSENT rows), signs both in through the manual
+endpoints and fails (exit code 1) unless each ABSENT row became the day's
+sign-in: staff ON_TIME/LATE, the student SIGNED_IN, with no second row.
+SECRET_KEY and JWT_SECRET_KEY must be set as for the app.
+
+Usage:
+    python check_end_of_day.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, time, timezone
+
+os.environ["END_OF_DAY_ENABLED"] = "false"
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'check.db')}"
+        from flask_jwt_extended import create_access_token
+
+        from app import create_app, db
+        from models.models import User, Student, StaffAttendance, StudentAttendance
+        from utils.end_of_day import close_day
+
+        app = create_app()
+        failures = []
+        with app.app_context():
+            db.create_all()
+            person = {"firstname": "Check", "department": "Check"}
+            admin = User(lastname="Admin", email="admin@check.local", role="ADMIN", **person)
+            staff = User(lastname="Staff", email="staff@check.local", role="STAFF", **person)
+            student = Student(lastname="Student", email="student@check.local", role="STUDENT", **person)
+            db.session.add_all([admin, staff, student])
+            db.session.commit()
+
+            today = datetime.now(timezone.utc).date()
+            summary = close_day(today)
+            print(f"Closed {summary['date']}: {summary['staff_absent']} staff, "
+                  f"{summary['students_absent']} students absent")
+
+            token = create_access_token(identity=str(admin.uuid), additional_claims={"role": "ADMIN"})
+            client = app.test_client()
+            client.set_cookie("access_token_cookie", token)
+            morning = datetime.combine(today, time(8, 0)).isoformat()
+
+            response = client.post("/api/attendance/manual/staff",
+                                   json={"user_id": staff.id, "action": "sign_in", "timestamp": morning})
+            if response.status_code != 200:
+                failures.append(f"staff sign-in answered {response.status_code}")
+            response = client.post("/api/attendance/manual/student",
+                                   json={"student_id": student.id, "action": "sign_in", "timestamp": morning})
+            if response.status_code != 201:
+                failures.append(f"student sign-in answered {response.status_code}")
+
+            db.session.expire_all()
+            for label, model, person, expected in (
+                ("staff", StaffAttendance, staff, {"ON_TIME", "LATE"}),
+                ("student", StudentAttendance, student, {"SIGNED_IN"}),
+            ):
+                rows = model.query.filter_by(user_id=person.id).all()
+                statuses = [row.status for row in rows]
+                print(f"{label}: {statuses}")
+                if len(rows) != 1 or rows[0].status not in expected or rows[0].time_in is None:
+                    failures.append(f"{label} has {statuses}, expected one row in {sorted(expected)}")
+            db.session.remove()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Sign-ins after the end-of-day run replace ABSENT")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
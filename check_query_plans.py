@@ -0,0 +1,175 @@
+"""
+Query-plan regression check for hot-path SQL (PostgreSQL only).
+
+Seeds a realistic dataset inside a transaction, ANALYZEs it, EXPLAINs every
+hot-path query listed in hot_path_queries() and fails (exit code 1) if any of
+them plans a sequential scan on a listed table. The transaction is rolled
+back at the end, so the seed data never persists.
+
+Usage:
+    python check_query_plans.py [--users 5000] [--students 5000] [--days 60]
+"""
+
+import argparse
+import json
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import select, text
+
+from app import create_app, db
+from models.models import User, Student, StaffAttendance, StudentAttendance
+
+
+def hot_path_queries(sample):
+    """(name, statement, tables that must not be sequentially scanned)."""
+    today = date.today()
+    start = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+    end = start + timedelta(hours=23, minutes=59, seconds=59)
+
+    return [
+        ("login: user by email",
+         select(User).where(User.email == sample["email"]),
+         {"users"}),
+        ("jwt: user by uuid",
+         select(User).where(User.uuid == sample["uuid"]),
+         {"users"}),
+        ("signin: today's staff record",
+         select(StaffAttendance)
+         .where(StaffAttendance.user_id == sample["user_id"], StaffAttendance.created_at >= start)
+         .order_by(StaffAttendance.id.desc()).limit(1),
+         {"staff_attendance"}),
+        ("manual student: today's record",
+         select(StudentAttendance)
+         .where(StudentAttendance.user_id == sample["student_id"], StudentAttendance.date == today),
+         {"student_attendance"}),
+        ("dashboard: today's staff",
+         select(StaffAttendance)
+         .where(StaffAttendance.created_at >= start, StaffAttendance.created_at <= end)
+         .order_by(StaffAttendance.user_id),
+         {"staff_attendance"}),
+        ("dashboard: today's students",
+         select(StudentAttendance)
+         .where(StudentAttendance.created_at >= start, StudentAttendance.created_at <= end)
+         .order_by(StudentAttendance.user_id),
+         {"student_attendance"}),
+        ("absent: staff not signed in today",
+         select(User.id)
+         .where(User.role == "STAFF", ~select(StaffAttendance.id).where(
+             StaffAttendance.user_id == User.id,
+             StaffAttendance.created_at >= start, StaffAttendance.created_at < start + timedelta(days=1),
+             StaffAttendance.time_in.isnot(None)).exists())
+         .order_by(User.lastname, User.firstname, User.id).limit(50),
+         {"staff_attendance"}),
+        ("absent: students not signed in today",
+         select(Student.id)
+         .where(~select(StudentAttendance.id).where(
+             StudentAttendance.user_id == Student.id, StudentAttendance.date == today,
+             StudentAttendance.time_in.isnot(None)).exists())
+         .order_by(Student.lastname, Student.firstname, Student.id).limit(50),
+         {"student_attendance"}),
+        ("changes: staff since cursor",
+         select(StaffAttendance)
+         .where(StaffAttendance.change_seq > sample["recent_seq"])
+         .order_by(StaffAttendance.change_seq).limit(501),
+         {"staff_attendance"}),
+        ("changes: students since cursor",
+         select(StudentAttendance)
+         .where(StudentAttendance.change_seq > sample["recent_seq"])
+         .order_by(StudentAttendance.change_seq).limit(501),
+         {"student_attendance"}),
+    ]
+
+
+def seed(conn, users, students, days):
+    """Bulk-insert synthetic rows with set-based SQL (fast even for large counts)."""
+    conn.execute(text(f"""
+        INSERT INTO users (uuid, firstname, lastname, email, role, department, created_at, updated_at)
+        SELECT md5('u' || g), 'Plan', 'Check' || g, 'plan' || g || '@plancheck.local',
+               'STAFF', 'Dept' || (g % 40), now(), now()
+        FROM generate_series(1, {users}) g
+    """))
+    conn.execute(text(f"""
+        INSERT INTO students (uuid, firstname, lastname, email, role, department, created_at, updated_at)
+        SELECT md5('s' || g), 'Plan', 'Check' || g, 'plan' || g || '@plancheck.local',
+               'STUDENT', 'Dept' || (g % 40), now(), now()
+        FROM generate_series(1, {students}) g
+    """))
+    conn.execute(text(f"""
+        INSERT INTO staff_attendance (user_id, created_at, time_in, method, status, change_seq)
+        SELECT u.id, d + interval '7 hours 50 minutes', d + interval '7 hours 50 minutes', 'face', 'ON_TIME',
+               nextval('attendance_change_seq')
+        FROM users u
+        CROSS JOIN generate_series(current_date - {days}, current_date, interval '1 day') d
+        WHERE u.email LIKE '%@plancheck.local'
+    """))
+    conn.execute(text(f"""
+        INSERT INTO student_attendance (user_id, created_at, time_in, method, status, date, change_seq)
+        SELECT s.id, d + interval '8 hours', d + interval '8 hours', 'manual', 'SIGNED_IN', d::date,
+               nextval('attendance_change_seq')
+        FROM students s
+        CROSS JOIN generate_series(current_date - {days}, current_date, interval '1 day') d
+        WHERE s.email LIKE '%@plancheck.local'
+    """))
+    for table in ("users", "students", "staff_attendance", "student_attendance"):
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+def seq_scans(plan, tables):
+    """Return the listed tables that appear under a Seq Scan node anywhere in the plan."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in tables:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child, tables))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail if hot-path queries plan a sequential scan")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--verbose", action="store_true", help="Print every plan")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != "postgresql":
+            print(f"⚠️ Query-plan check needs PostgreSQL (configured: {engine.dialect.name})")
+            return 2
+
+        failures = 0
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                seed(conn, args.users, args.students, args.days)
+                sample = conn.execute(text("""
+                    SELECT u.id, u.uuid, u.email, s.id FROM users u, students s
+                    WHERE u.email LIKE '%@plancheck.local' AND s.email LIKE '%@plancheck.local'
+                    LIMIT 1
+                """)).one()
+                sample = {"user_id": sample[0], "uuid": sample[1], "email": sample[2], "student_id": sample[3]}
+                # A cursor a few hundred changes behind the head, like a client polling regularly
+                sample["recent_seq"] = conn.execute(text("SELECT last_value - 300 FROM attendance_change_seq")).scalar()
+
+                for name, stmt, tables in hot_path_queries(sample):
+                    compiled = stmt.compile(dialect=conn.dialect)
+                    row = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+                    plan = (json.loads(row) if isinstance(row, str) else row)[0]["Plan"]
+                    scans = seq_scans(plan, tables)
+                    status = "FAIL" if scans else "ok"
+                    print(f"[{status:>4}] {name}" + (f" (seq scan on {', '.join(scans)})" if scans else ""))
+                    if args.verbose or scans:
+                        print(json.dumps(plan, indent=2))
+                    failures += bool(scans)
+            finally:
+                trans.rollback()
+
+    print(f"\n{failures} hot-path quer{'y' if failures == 1 else 'ies'} with sequential scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
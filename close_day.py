@@ -0,0 +1,49 @@
+"""
+Close a day's attendance: sign out everyone still signed in at office close
+and add ABSENT rows for staff and students with no record (set-based SQL, see
+utils/end_of_day.py). Safe to re-run; the app's scheduler does this daily at
+END_OF_DAY_AT, this is for cron setups and catching up missed days.
+
+Usage:
+    python close_day.py                      # today (UTC)
+    python close_day.py --date 2025-03-14 --dry-run
+    python close_day.py --start 2025-03-01 --end 2025-03-14
+"""
+
+import argparse
+import sys
+from datetime import date, timedelta
+
+from app import create_app
+from utils.end_of_day import close_day
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Auto sign-out and absence marking for a day")
+    parser.add_argument("--date", type=date.fromisoformat, help="Day to close (default: today, UTC)")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day of a range to close")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day of the range, inclusive")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args(argv)
+
+    if args.start:
+        end = args.end or args.start
+        days = [args.start + timedelta(days=i) for i in range((end - args.start).days + 1)]
+    else:
+        days = [args.date]
+
+    app = create_app()
+    with app.app_context():
+        for day in days:
+            summary = close_day(day, args.dry_run)
+            if summary is None:
+                print(f"⚠️ {day}: another process is closing the day, skipped")
+                continue
+            print(f"{'Would close' if args.dry_run else '✅ Closed'} {summary['date']}: "
+                  f"staff {summary['staff_closed']} signed out, {summary['staff_absent']} absent; "
+                  f"students {summary['students_closed']} signed out, {summary['students_absent']} absent")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
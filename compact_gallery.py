@@ -0,0 +1,41 @@
+"""
+Remove orphaned biometric rows and templates beyond the newest K per user,
+in batches, then vacuum (see utils/gallery_compaction.py). Also available as
+the "gallery_compaction" background job.
+
+Usage:
+    python compact_gallery.py --dry-run
+    python compact_gallery.py --keep 2 --batch-size 1000
+"""
+
+import argparse
+import sys
+
+from app import create_app
+from utils.gallery_compaction import compact_gallery
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact the biometric gallery")
+    parser.add_argument("--keep", type=int, help="Templates kept per user (default: GALLERY_KEEP_PER_USER)")
+    parser.add_argument("--batch-size", type=int, help="Rows deleted per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    args = parser.parse_args(argv)
+    if args.keep is not None and args.keep < 1:
+        parser.error("--keep must be at least 1")
+
+    app = create_app()
+    with app.app_context():
+        summary = compact_gallery(args.keep, args.batch_size, args.dry_run)
+
+    print(f"{'Would remove' if args.dry_run else '✅ Removed'} "
+          f"{summary['orphans'] + summary['superseded']} rows: {summary['orphans']} orphaned, "
+          f"{summary['superseded']} beyond the newest {summary['keep_per_user']} per user "
+          f"({summary['face_templates']} face templates)")
+    if summary.get("vacuumed") is False:
+        print("⚠️ Vacuum failed; see the log")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,6 +22,17 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # -----------------------
+    # Connection pool (see utils/db_pool.py for per-environment profiles)
+    # Unset values fall back to the profile; pool_size/max_overflow default
+    # to sizing computed from WEB_CONCURRENCY, GUNICORN_THREADS and
+    # DB_MAX_CONNECTIONS. Set SQLALCHEMY_ENGINE_OPTIONS to bypass entirely.
+    # -----------------------
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE")) if os.getenv("DB_POOL_SIZE") else None
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW")) if os.getenv("DB_MAX_OVERFLOW") else None
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT")) if os.getenv("DB_POOL_TIMEOUT") else None
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE")) if os.getenv("DB_POOL_RECYCLE") else None
+
     # JWT Secret Key (for signing JWT tokens)
     # Replace with a different secure random string in production.
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "replace-with-jwt-secret")
@@ -37,3 +48,125 @@ class Config:
     JWT_REFRESH_COOKIE_NAME = "refresh_token_cookie"
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=3)   # Adjust as needed
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)  # Refresh token expiry
+
+    # -----------------------
+    # Metrics (/metrics, Prometheus text format)
+    # -----------------------
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Optional bearer token required from the Prometheus scraper
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # -----------------------
+    # Slow SQL log (/api/diagnostics/slow-queries)
+    # -----------------------
+    SLOW_QUERY_THRESHOLD_MS = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+    SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"  # PostgreSQL only
+    SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+
+    # -----------------------
+    # Face gallery / warm-up
+    # -----------------------
+    FACE_GALLERY_REFRESH_SECONDS = int(os.getenv("FACE_GALLERY_REFRESH_SECONDS", "30"))
+    FACE_GALLERY_MODE = os.getenv("FACE_GALLERY_MODE", "float32")  # "float32" or "int8"
+    FACE_GALLERY_SHORTLIST = int(os.getenv("FACE_GALLERY_SHORTLIST", "32"))  # int8: candidates re-scored exactly
+    FACE_GALLERY_SPILL_DIR = os.getenv("FACE_GALLERY_SPILL_DIR")  # int8: where exact rows are memory-mapped
+    # Kiosks may send a department scope; fall back to a global search on a scoped miss
+    FACE_SCOPE_FALLBACK_GLOBAL = os.getenv("FACE_SCOPE_FALLBACK_GLOBAL", "true").lower() == "true"
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() == "true"
+
+    # -----------------------
+    # Per-kiosk hot cache of recently matched faces
+    # -----------------------
+    FACE_HOT_CACHE_ENABLED = os.getenv("FACE_HOT_CACHE_ENABLED", "true").lower() == "true"
+    FACE_HOT_CACHE_SIZE = int(os.getenv("FACE_HOT_CACHE_SIZE", "500"))      # users per kiosk
+    FACE_HOT_CACHE_KIOSKS = int(os.getenv("FACE_HOT_CACHE_KIOSKS", "64"))   # kiosks per worker
+    FACE_HOT_CACHE_MARGIN = float(os.getenv("FACE_HOT_CACHE_MARGIN", "0.1"))  # added to the threshold for hot hits
+
+    # -----------------------
+    # Offline kiosks: gallery snapshots/deltas and event upload
+    # -----------------------
+    GALLERY_SNAPSHOT_DIR = os.getenv("GALLERY_SNAPSHOT_DIR")  # default: <tmp>/gallery-snapshots
+    KIOSK_EVENTS_MAX_BATCH = int(os.getenv("KIOSK_EVENTS_MAX_BATCH", "1000"))
+    KIOSK_EVENTS_MAX_AGE_HOURS = int(os.getenv("KIOSK_EVENTS_MAX_AGE_HOURS", "72"))  # older uploaded events are refused
+    KIOSK_EVENTS_MAX_SKEW_SECONDS = int(os.getenv("KIOSK_EVENTS_MAX_SKEW_SECONDS", "300"))  # kiosk clock ahead of ours
+    KIOSK_TOKEN_EXPIRES_DAYS = int(os.getenv("KIOSK_TOKEN_EXPIRES_DAYS", "90"))  # KIOSK-role tokens (POST /api/auth/kiosk-token)
+
+    # -----------------------
+    # Live dashboard stream (SSE); each open stream holds a worker thread, so a
+    # worker serves at most GUNICORN_THREADS - 2 (see attendance_events.max_streams)
+    # -----------------------
+    ATTENDANCE_STREAM_MAX_SUBSCRIBERS = int(os.getenv(
+        "ATTENDANCE_STREAM_MAX_SUBSCRIBERS", str(max(int(os.getenv("GUNICORN_THREADS", "4")) - 2, 0))
+    ))  # per worker
+    ATTENDANCE_STREAM_BUFFER = int(os.getenv("ATTENDANCE_STREAM_BUFFER", "256"))     # events queued per subscriber
+    ATTENDANCE_STREAM_HISTORY = int(os.getenv("ATTENDANCE_STREAM_HISTORY", "1000"))  # events kept for resume
+    ATTENDANCE_STREAM_HEARTBEAT_SECONDS = float(os.getenv("ATTENDANCE_STREAM_HEARTBEAT_SECONDS", "15"))
+    ATTENDANCE_STREAM_POLL_SECONDS = float(os.getenv("ATTENDANCE_STREAM_POLL_SECONDS", "1"))  # change feed, per worker
+    ATTENDANCE_STREAM_FEED_BATCH = int(os.getenv("ATTENDANCE_STREAM_FEED_BATCH", "100"))  # more per poll: one "reload"
+
+    # -----------------------
+    # Attendance retention: months older than this move to Parquet (archive_attendance.py)
+    # -----------------------
+    ATTENDANCE_RETENTION_DAYS = int(os.getenv("ATTENDANCE_RETENTION_DAYS", "400"))
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")  # default: <app root>/archive
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))          # rows per select/delete
+    ARCHIVE_ROW_GROUP_SIZE = int(os.getenv("ARCHIVE_ROW_GROUP_SIZE", "10000"))  # smaller = finer range pruning
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))  # rows per Arrow batch / Parquet row group
+
+    # -----------------------
+    # Background jobs (reports); results are kept on local disk
+    # -----------------------
+    JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"  # run jobs in this process
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))               # concurrent jobs per worker process
+    JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))     # submissions rejected beyond this
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "120"))  # RUNNING without heartbeat → re-queued
+    JOB_RETRY_BACKOFF_SECONDS = int(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "30"))  # doubled per attempt
+    JOB_OUTPUT_DIR = os.getenv("JOB_OUTPUT_DIR")  # default: <app root>/job-output
+    JOB_RESULT_TTL_HOURS = int(os.getenv("JOB_RESULT_TTL_HOURS", "72"))
+
+    # -----------------------
+    # Bulk manual attendance (a whole class / department in one request)
+    # -----------------------
+    MANUAL_BULK_MAX_IDS = int(os.getenv("MANUAL_BULK_MAX_IDS", "500"))
+
+    # -----------------------
+    # End of day: close open records at office close, mark absentees (UTC)
+    # -----------------------
+    END_OF_DAY_ENABLED = os.getenv("END_OF_DAY_ENABLED", "true").lower() == "true"  # in-process scheduler
+    END_OF_DAY_AT = os.getenv("END_OF_DAY_AT", "23:00")                  # HH:MM, after office close
+    END_OF_DAY_WEEKDAYS = os.getenv("END_OF_DAY_WEEKDAYS", "0,1,2,3,4")  # Monday=0; no absences on weekends
+    END_OF_DAY_POLL_SECONDS = int(os.getenv("END_OF_DAY_POLL_SECONDS", "60"))
+
+    # -----------------------
+    # Read replica for reports and roster lists (optional, see utils/replica.py)
+    # -----------------------
+    REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")  # unset: everything reads the primary
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))  # staleness tolerance
+    REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+
+    # -----------------------
+    # Face match telemetry (ring buffer per worker, flushed to daily files)
+    # -----------------------
+    MATCH_TELEMETRY_ENABLED = os.getenv("MATCH_TELEMETRY_ENABLED", "true").lower() == "true"
+    MATCH_TELEMETRY_SIZE = int(os.getenv("MATCH_TELEMETRY_SIZE", "10000"))  # events kept in memory
+    MATCH_TELEMETRY_FLUSH_SECONDS = float(os.getenv("MATCH_TELEMETRY_FLUSH_SECONDS", "5"))  # 0 = no files
+    MATCH_TELEMETRY_DIR = os.getenv("MATCH_TELEMETRY_DIR")  # default: <app root>/match-telemetry
+
+    # -----------------------
+    # Duplicate face detection at enrolment (see utils/duplicates.py)
+    # -----------------------
+    DUPLICATE_FACE_ACTION = os.getenv("DUPLICATE_FACE_ACTION", "reject")  # "reject" (409), "flag" or "off"
+    DUPLICATE_FACE_THRESHOLD = float(os.getenv("DUPLICATE_FACE_THRESHOLD", "0.65"))  # similarity to another user
+    DUPLICATE_FACE_TOP_K = int(os.getenv("DUPLICATE_FACE_TOP_K", "5"))  # nearest users checked / reported
+
+    # -----------------------
+    # Gallery compaction (see utils/gallery_compaction.py)
+    # -----------------------
+    GALLERY_KEEP_PER_USER = int(os.getenv("GALLERY_KEEP_PER_USER", "3"))  # newest templates kept per user
+    GALLERY_COMPACTION_BATCH_SIZE = int(os.getenv("GALLERY_COMPACTION_BATCH_SIZE", "500"))  # rows per delete
+
+    # -----------------------
+    # Worker memory diagnostics (see utils/memory.py)
+    # -----------------------
+    MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "0"))  # >0: trace allocations from start
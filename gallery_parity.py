@@ -0,0 +1,179 @@
+"""
+Accuracy parity check for the face gallery modes.
+
+Scores the same probes three ways — the reference per-template
+`cosine_similarity` loop, the float32 gallery and the int8 gallery with
+exact re-ranking — and compares the sign-in decision (matched user at the
+0.65 threshold). It also checks the runner-up score (best score of any
+other user, the match margin) against a brute-force pass over every
+template, both over the whole gallery and scoped to two random
+departments. Exits non-zero if the int8 or float32 decisions or runner-ups
+differ from the reference more than --max-mismatches.
+
+Usage:
+    python gallery_parity.py --synthetic 2000 --dim 512 --probes 300
+    python gallery_parity.py --from-db --probes 300
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from routes.attendance_route import cosine_similarity
+from utils.face_gallery import RUNNER_UP_CANDIDATES, build_state, decode_template, normalise, score_state
+
+THRESHOLD = 0.65
+RUNNER_UP_TOLERANCE = 1e-4  # float32 gallery scores against the float64 brute force
+
+
+def synthetic_gallery(n, dim, rng):
+    # A few users share a "look-alike" direction so near-threshold impostors exist
+    base = rng.standard_normal((n, dim))
+    lookalikes = rng.choice(n, size=max(n // 20, 1), replace=False)
+    base[lookalikes] += 1.5 * base[lookalikes[0]]
+    user_ids = list(range(1, n + 1))
+    # Every tenth user enrols a second template and a few enrol more than the
+    # runner-up candidate pool, so the best rows can all be one person
+    extra = np.concatenate([np.arange(0, n, 10), np.repeat(np.arange(min(n, 5)), 2 * RUNNER_UP_CANDIDATES)])
+    base = np.vstack([base, base[extra] + rng.normal(0, 0.3, (len(extra), dim))])
+    user_ids += [user_ids[i] for i in extra]
+    departments = [f"Dept{user_id % 4}" for user_id in user_ids]
+    return [row.tolist() for row in base], user_ids, departments
+
+
+def db_gallery():
+    from app import create_app
+    from models.models import Biometric
+
+    app = create_app()
+    with app.app_context():
+        rows = Biometric.query.filter(
+            Biometric.face_template.isnot(None), Biometric.user_id.isnot(None)
+        ).order_by(Biometric.id).all()
+        templates, user_ids, departments = [], [], []
+        for bio in rows:
+            vector = decode_template(bio.face_template)
+            if vector is not None:
+                templates.append(json.loads(bio.face_template.decode("utf-8")))
+                user_ids.append(bio.user_id)
+                departments.append(bio.user.department if bio.user else None)
+    return templates, user_ids, departments
+
+
+def make_probes(templates, count, rng):
+    """Genuine probes at several noise levels (some near the threshold) plus impostors."""
+    dim = len(templates[0])
+    probes = []
+    for i in range(count):
+        if i % 5 == 4:
+            probes.append(rng.standard_normal(dim).tolist())
+        else:
+            source = np.asarray(templates[rng.integers(len(templates))])
+            noise = rng.choice([0.2, 0.6, 0.9, 1.1]) * np.std(source)
+            probes.append((source + rng.normal(0, noise, dim)).tolist())
+    return probes
+
+
+def reference_decision(probe, templates, user_ids):
+    """The pre-gallery match_face loop: float64 cosine against every template."""
+    best_user, best_score = None, -1
+    for template, user_id in zip(templates, user_ids):
+        score = cosine_similarity(probe, template)
+        if score > best_score:
+            best_user, best_score = user_id, score
+    return (best_user if best_score >= THRESHOLD else None), float(best_score)
+
+
+def reference_runner_up(unit, matrix, user_ids, rows):
+    """Brute force over `rows`: the best float64 score of anyone but the best row's user, or None."""
+    if len(rows) == 0:
+        return None
+    scores = matrix[rows] @ unit.astype(np.float64)
+    users = user_ids[rows]
+    others = scores[users != users[np.argmax(scores)]]
+    return float(others.max()) if len(others) else None
+
+
+def runner_up_differs(expected, got):
+    if expected is None or got is None:
+        return expected is not got
+    return abs(expected - got) > RUNNER_UP_TOLERANCE
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare gallery modes against the cosine_similarity reference")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--synthetic", type=int, default=2000, help="Random gallery size")
+    source.add_argument("--from-db", action="store_true", help="Use the enrolled templates")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--probes", type=int, default=300)
+    parser.add_argument("--shortlist", type=int, default=32)
+    parser.add_argument("--max-mismatches", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    loaded = db_gallery() if args.from_db else synthetic_gallery(args.synthetic, args.dim, rng)
+    templates, user_ids, departments = loaded
+    if not templates:
+        print("⚠️ No templates to compare")
+        return 2
+
+    matrix = np.stack([normalise(t) for t in templates])
+    states = {
+        "float32": build_state(matrix, user_ids, range(len(user_ids)), departments=departments),
+        "int8": build_state(matrix, user_ids, range(len(user_ids)), mode="int8", departments=departments),
+    }
+    probes = make_probes(templates, args.probes, rng)
+
+    brute = matrix.astype(np.float64)
+    user_array = np.asarray(user_ids)
+    department_array = np.asarray(departments, dtype=object)
+    names = sorted(set(departments), key=str)
+    every_row = np.arange(len(user_ids))
+
+    mismatches = {mode: 0 for mode in states}
+    max_diff = {mode: 0.0 for mode in states}
+    runner_up_mismatches = {(mode, kind): 0 for mode in states for kind in ("unscoped", "scoped")}
+    accepted = 0
+    for probe in probes:
+        ref_user, ref_score = reference_decision(probe, templates, user_ids)
+        accepted += ref_user is not None
+        unit = normalise(probe)
+        for mode, state in states.items():
+            row, score = score_state(state, unit, args.shortlist)
+            user = int(state.user_ids[row]) if score >= THRESHOLD else None
+            mismatches[mode] += user != ref_user
+            max_diff[mode] = max(max_diff[mode], abs(score - ref_score))
+
+        scope = list(rng.choice(names, size=min(2, len(names)), replace=False))
+        searches = (
+            ("unscoped", None, every_row),
+            ("scoped", scope, np.flatnonzero(np.isin(department_array, scope))),
+        )
+        for kind, scope_arg, rows in searches:
+            expected = reference_runner_up(unit, brute, user_array, rows)
+            for mode, state in states.items():
+                _, _, second = score_state(state, unit, args.shortlist, scope_arg, runner_up=True)
+                runner_up_mismatches[(mode, kind)] += runner_up_differs(expected, second)
+
+    print(f"{len(probes)} probes against {len(templates)} templates "
+          f"({accepted} accepted by the reference at {THRESHOLD})")
+    for mode, state in states.items():
+        print(f"  {mode:<8} decision mismatches: {mismatches[mode]:<4} "
+              f"max |score diff|: {max_diff[mode]:.2e}  resident bytes: {state.nbytes:,}")
+        print(f"  {mode:<8} runner-up mismatches: unscoped {runner_up_mismatches[(mode, 'unscoped')]:<4} "
+              f"scoped {runner_up_mismatches[(mode, 'scoped')]}")
+    float64_bytes = matrix.size * 8
+    print(f"  float64 lists (previous): ~{float64_bytes:,} bytes of values alone")
+
+    counts = [*mismatches.values(), *runner_up_mismatches.values()]
+    failed = any(count > args.max_mismatches for count in counts)
+    print("❌ Parity check failed" if failed else "✅ Parity check passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
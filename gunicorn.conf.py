@@ -0,0 +1,78 @@
+"""
+Production gunicorn profile: pre-fork with the app and face gallery loaded
+once in the master and shared copy-on-write by the workers.
+
+    gunicorn                      # reads this file from the working directory
+    WEB_CONCURRENCY=4 GUNICORN_THREADS=8 gunicorn
+
+  * preload_app: wsgi.py (create_app + warm_up) is imported in the master, so
+    the gallery matrix, the numpy/BLAS stack and the archive manifest are
+    built once; forked workers share those pages until they write to them.
+  * GC: collection is off in the master while it loads. Once it is ready
+    (when_ready, before the first fork) the loaded objects are frozen into
+    the permanent generation and collection is turned back on, so the
+    long-lived master still collects what it allocates later; before each
+    fork gc.freeze() parks anything newer too. Otherwise the workers' first
+    collections write to every object header and un-share the pages.
+  * After fork each worker drops the inherited connection pools
+    (engine.dispose(close=False)); the master closed its own connections
+    before forking. The job runner, end-of-day scheduler and telemetry
+    flusher threads are started per process on the worker's first request,
+    and the SSE broker resets itself in the child (its change feed starts
+    with the worker's first stream; a worker holds at most threads - 2).
+
+WEB_CONCURRENCY and GUNICORN_THREADS are the same variables utils/db_pool.py
+sizes the connection pool from. bench_prefork.py compares this profile's
+memory and latency against per-worker loading (GUNICORN_PRELOAD=false).
+"""
+
+import gc
+import os
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycled workers are forked from the master again (its warmed state, which
+# may be older than the live gallery; the worker refreshes it as usual)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None  # empty: no access log
+errorlog = "-"
+
+if preload_app:
+    # Loading allocates a lot; without collections in between, the loaded
+    # objects sit densely in their pages instead of around freed holes
+    gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        # Warm-up is done: keep what it built out of future collections
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from utils.startup import prepare_fork
+        from wsgi import app
+
+        prepare_fork(app)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from utils.startup import after_fork
+        from wsgi import app
+
+        after_fork(app)
+    server.log.info("Worker %s forked (preload=%s, threads=%s)", worker.pid, preload_app, threads)
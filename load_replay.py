@@ -0,0 +1,352 @@
+"""
+Morning-rush load replay harness.
+
+Replays the 07:45–08:15 kiosk rush against a running app instance: face
+sign-ins arriving on a realistic curve, mixed with admins logging in and
+polling the today dashboard. Reports throughput, error rate and latency
+per interval so capacity changes can be compared before deploying.
+
+Usage:
+    python load_replay.py seed --users 500
+    python load_replay.py run --url http://localhost:5000 --workers 32 \\
+        --speedup 10 --admin-email admin@example.com --admin-password secret
+    python load_replay.py cleanup
+
+`seed` and `cleanup` talk to the configured database directly (like
+create_admin.py); `run` only talks HTTP, so it works against any server
+setup (flask dev server, gunicorn with N workers, ...).
+
+Note: the replay compresses the *shape* of the rush, not the wall clock.
+ON_TIME/LATE decisions still use the server's current time.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+SEED_DOMAIN = "loadtest.local"
+DEFAULT_GALLERY_FILE = "loadtest_gallery.json"
+RUSH_WINDOW_SECONDS = 30 * 60  # 07:45 → 08:15
+DEPARTMENTS = ["Engineering", "Finance", "Operations", "Sales", "HR", "Support"]
+
+
+# ---------------------------
+# Seeding (direct DB access)
+# ---------------------------
+
+def seed(users, dim, gallery_file):
+    """Create synthetic staff with random face embeddings."""
+    from app import create_app, db
+    from models.models import User, Biometric
+
+    app = create_app()
+    rng = random.Random(42)
+    gallery = []
+
+    with app.app_context():
+        for i in range(users):
+            embedding = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+            user = User(
+                uuid=str(uuid.uuid4()),
+                firstname=f"Load{i}",
+                lastname="Test",
+                email=f"load{i}@{SEED_DOMAIN}",
+                role="STAFF",
+                department=rng.choice(DEPARTMENTS)
+            )
+            db.session.add(user)
+            db.session.add(Biometric(user=user, face_template=json.dumps(embedding).encode("utf-8")))
+            gallery.append({"uuid": user.uuid, "embedding": embedding})
+        db.session.commit()
+
+    with open(gallery_file, "w") as fh:
+        json.dump({"dim": dim, "users": gallery}, fh)
+    print(f"✅ Seeded {users} staff ({dim}-d faces), probes written to {gallery_file}")
+
+
+def cleanup():
+    """Remove seeded staff together with their biometrics and attendance."""
+    from app import create_app, db
+    from models.models import User
+
+    app = create_app()
+    with app.app_context():
+        seeded = User.query.filter(User.email.like(f"%@{SEED_DOMAIN}")).all()
+        for user in seeded:
+            db.session.delete(user)  # ORM cascade removes biometrics/attendance
+        db.session.commit()
+    print(f"🧹 Removed {len(seeded)} seeded staff")
+
+
+# ---------------------------
+# Arrival schedule
+# ---------------------------
+
+def arrival_offset(rng):
+    """Seconds after 07:45 for one arrival: a peak just before 08:00 plus stragglers."""
+    if rng.random() < 0.8:
+        offset = rng.gauss(13 * 60, 6 * 60)
+    else:
+        offset = rng.uniform(0, RUSH_WINDOW_SECONDS)
+    return min(max(offset, 0.0), RUSH_WINDOW_SECONDS)
+
+
+def noisy_probe(rng, embedding, noise):
+    return [x + rng.gauss(0.0, noise) for x in embedding]
+
+
+def build_schedule(gallery, args, rng):
+    """Return a sorted list of (due_seconds, kind, payload) kiosk events."""
+    events = []
+    dim = gallery["dim"]
+
+    for person in gallery["users"]:
+        if rng.random() > args.turnout:
+            continue
+        due = arrival_offset(rng)
+        probe = noisy_probe(rng, person["embedding"], args.noise)
+        events.append((due, "signin", {"face_embedding": probe}))
+
+        # People often scan twice when the kiosk feels slow
+        if rng.random() < args.rescan_rate:
+            events.append((due + rng.uniform(2, 20), "signin", {"face_embedding": probe}))
+
+    unknown = int(len(events) * args.unknown_rate)
+    for _ in range(unknown):
+        probe = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+        events.append((arrival_offset(rng), "signin", {"face_embedding": probe}))
+
+    # Compress the 30-minute window by the speedup factor
+    events = [(due / args.speedup, kind, payload) for due, kind, payload in events]
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+# ---------------------------
+# Recording
+# ---------------------------
+
+class Recorder:
+    """Collect (elapsed, kind, latency, ok) samples and summarise them by interval."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def record(self, elapsed, kind, latency, ok):
+        with self.lock:
+            self.samples.append((elapsed, kind, latency, ok))
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.samples)
+
+    @staticmethod
+    def percentile(values, pct):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        idx = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+        return values[idx]
+
+    def summarise(self, samples):
+        by_kind = defaultdict(list)
+        for _, kind, latency, ok in samples:
+            by_kind[kind].append((latency, ok))
+
+        rows = []
+        for kind in sorted(by_kind):
+            latencies = [lat for lat, _ in by_kind[kind]]
+            errors = sum(1 for _, ok in by_kind[kind] if not ok)
+            rows.append({
+                "kind": kind,
+                "count": len(latencies),
+                "error_rate": errors / len(latencies),
+                "p50_ms": self.percentile(latencies, 50) * 1000,
+                "p95_ms": self.percentile(latencies, 95) * 1000,
+                "p99_ms": self.percentile(latencies, 99) * 1000,
+                "max_ms": max(latencies) * 1000,
+            })
+        return rows
+
+    def timeline(self):
+        buckets = defaultdict(list)
+        for sample in self.snapshot():
+            buckets[int(sample[0] // self.interval)].append(sample)
+
+        timeline = []
+        for bucket in sorted(buckets):
+            for row in self.summarise(buckets[bucket]):
+                row["t"] = int(bucket * self.interval)
+                row["rps"] = row["count"] / self.interval
+                timeline.append(row)
+        return timeline
+
+
+def print_rows(rows, title):
+    print(f"\n{title}")
+    print(f"{'t(s)':>6} {'kind':<10} {'count':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for r in rows:
+        print(
+            f"{r['t'] if 't' in r else '-':>6} {r['kind']:<10} {r['count']:>6} {r.get('rps', 0):>7.1f} "
+            f"{r['error_rate'] * 100:>5.1f}% {r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f} "
+            f"{r['p99_ms']:>7.1f} {r['max_ms']:>7.1f}"
+        )
+
+
+# ---------------------------
+# Replay
+# ---------------------------
+
+def timed(recorder, start, due, kind, fn):
+    """Run one request; latency is measured from its *scheduled* time so queueing counts."""
+    ok = False
+    try:
+        response = fn()
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    finished = time.perf_counter() - start
+    recorder.record(finished, kind, finished - due, ok)
+
+
+def admin_loop(args, recorder, start, stop):
+    """One admin: log in, then poll /today/staff until the replay ends."""
+    client = httpx.Client(base_url=args.url, timeout=args.timeout)
+    credentials = {"email": args.admin_email, "password": args.admin_password}
+    next_login = 0.0
+
+    while not stop.is_set():
+        now = time.perf_counter() - start
+        if now >= next_login:
+            timed(recorder, start, now, "login", lambda: client.post("/api/auth/login", json=credentials))
+            next_login = now + args.login_every
+        now = time.perf_counter() - start
+        timed(recorder, start, now, "poll", lambda: client.get("/api/attendance/today/staff"))
+        stop.wait(args.poll_interval)
+
+    client.close()
+
+
+def run(args):
+    with open(args.gallery_file) as fh:
+        gallery = json.load(fh)
+
+    rng = random.Random(args.seed)
+    events = build_schedule(gallery, args, rng)
+    duration = RUSH_WINDOW_SECONDS / args.speedup
+    print(
+        f"▶️  Replaying {len(events)} kiosk scans over {duration:.0f}s "
+        f"({args.workers} workers, {args.admins} admins) against {args.url}"
+    )
+
+    recorder = Recorder(args.report_interval)
+    local = threading.local()
+    stop = threading.Event()
+
+    def kiosk_client():
+        if not hasattr(local, "client"):
+            local.client = httpx.Client(base_url=args.url, timeout=args.timeout)
+        return local.client
+
+    def signin(due, payload):
+        client = kiosk_client()
+        timed(recorder, start, due, "signin", lambda: client.post("/api/attendance/signin", json=payload))
+
+    start = time.perf_counter()
+    admins = []
+    if args.admin_email and args.admin_password:
+        for _ in range(args.admins):
+            t = threading.Thread(target=admin_loop, args=(args, recorder, start, stop), daemon=True)
+            t.start()
+            admins.append(t)
+
+    reported = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for due, _, payload in events:
+            delay = due - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(signin, due, payload)
+
+            elapsed = time.perf_counter() - start
+            if elapsed - reported >= args.report_interval:
+                reported = elapsed
+                recent = [s for s in recorder.snapshot() if s[0] >= elapsed - args.report_interval]
+                for row in recorder.summarise(recent):
+                    print(
+                        f"  t={elapsed:6.0f}s {row['kind']:<7} n={row['count']:<5} "
+                        f"err={row['error_rate'] * 100:4.1f}% p95={row['p95_ms']:.0f}ms"
+                    )
+
+    stop.set()
+    for t in admins:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    summary = recorder.summarise(recorder.snapshot())
+    for row in summary:
+        row["rps"] = row["count"] / elapsed
+
+    print_rows(recorder.timeline(), "Timeline (latency in ms, measured from scheduled time)")
+    print_rows(summary, "Summary")
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({
+                "timeline": recorder.timeline(),
+                "summary": summary,
+            }, fh, indent=2)
+        print(f"\n📝 Results written to {args.out}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Morning-rush load replay")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="Create synthetic staff and face embeddings")
+    p_seed.add_argument("--users", type=int, default=500)
+    p_seed.add_argument("--dim", type=int, default=128)
+    p_seed.add_argument("--gallery-file", default=DEFAULT_GALLERY_FILE)
+
+    sub.add_parser("cleanup", help="Remove synthetic staff")
+
+    p_run = sub.add_parser("run", help="Replay the morning rush over HTTP")
+    p_run.add_argument("--url", default="http://localhost:5000")
+    p_run.add_argument("--gallery-file", default=DEFAULT_GALLERY_FILE)
+    p_run.add_argument("--workers", type=int, default=16, help="Concurrent kiosk connections")
+    p_run.add_argument("--speedup", type=float, default=10.0, help="Compress the 30-minute window by this factor")
+    p_run.add_argument("--turnout", type=float, default=0.95)
+    p_run.add_argument("--rescan-rate", type=float, default=0.1)
+    p_run.add_argument("--unknown-rate", type=float, default=0.03)
+    p_run.add_argument("--noise", type=float, default=0.3, help="Gaussian noise added to enrolled faces")
+    p_run.add_argument("--admins", type=int, default=3)
+    p_run.add_argument("--admin-email")
+    p_run.add_argument("--admin-password")
+    p_run.add_argument("--poll-interval", type=float, default=5.0)
+    p_run.add_argument("--login-every", type=float, default=300.0)
+    p_run.add_argument("--report-interval", type=float, default=10.0)
+    p_run.add_argument("--timeout", type=float, default=30.0)
+    p_run.add_argument("--seed", type=int, default=7)
+    p_run.add_argument("--out", help="Write timeline and summary as JSON")
+
+    args = parser.parse_args(argv)
+    if args.command == "seed":
+        seed(args.users, args.dim, args.gallery_file)
+    elif args.command == "cleanup":
+        cleanup()
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Memory report for capacity planning (see utils/memory.py).
+
+Without --pid / --match it builds the app in this process, loads the face
+gallery as a worker's warm-up does and reports what that costs: RSS, cache
+sizes and, with --tracemalloc, the top allocators of the load.
+
+With --pid or --match it reads running processes from /proc instead, e.g.
+every gunicorn worker. PSS splits shared pages between the processes that
+map them, so the PSS total is what the whole group really costs; a worker's
+"shared" bytes are pages still shared copy-on-write with its master.
+
+Usage:
+    python memory_report.py --tracemalloc 1 --top 15
+    python memory_report.py --match gunicorn
+    python memory_report.py --pid 4121 --pid 4122 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from utils.memory import memory_report, process_memory, start_tracing
+
+
+def _mb(value):
+    return f"{value / 2**20:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def _size(value):
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}" if unit != "B" else f"{value} B"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def matching_pids(pattern):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as fh:
+                cmdline = fh.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if pattern in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def report_processes(pids, as_json):
+    rows = {pid: process_memory(pid) for pid in pids}
+    rows = {pid: memory for pid, memory in rows.items() if memory}
+    if as_json:
+        print(json.dumps({"processes": rows}, indent=2))
+        return 0 if rows else 1
+    if not rows:
+        print("⚠️ No readable processes")
+        return 1
+
+    print(f"{'pid':>8} {'rss MB':>9} {'pss MB':>9} {'shared MB':>9} {'private MB':>10} {'peak MB':>9}")
+    for pid, m in rows.items():
+        print(f"{pid:>8} {_mb(m.get('rss'))} {_mb(m.get('pss'))} {_mb(m.get('shared'))} "
+              f"{_mb(m.get('private')):>10} {_mb(m.get('peak_rss'))}")
+    total_rss = sum(m.get("rss") or 0 for m in rows.values())
+    total_pss = sum(m.get("pss") or 0 for m in rows.values())
+    print(f"{'total':>8} {_mb(total_rss)} {_mb(total_pss)}   (RSS double-counts shared pages; PSS does not)")
+    return 0
+
+
+def report_self(args):
+    if args.tracemalloc:
+        start_tracing(args.tracemalloc)
+    before = process_memory()
+
+    from app import create_app
+    from utils.startup import warm_up
+
+    app = create_app()
+    after_app = process_memory()
+    warm_up(app)
+    report = memory_report(allocators=args.top)
+    report["stages"] = {"start": before, "app": after_app, "warm": report["process"]}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{'stage':<8} {'rss MB':>9} {'pss MB':>9}")
+    for stage, m in report["stages"].items():
+        print(f"{stage:<8} {_mb((m or {}).get('rss'))} {_mb((m or {}).get('pss'))}")
+    print("\nCaches:")
+    for name, size in report["caches"].items():
+        print(f"  {name:<20} {_size(size) if size is not None else '(empty)':>10}")
+    if report.get("top_allocators"):
+        print(f"\nTop allocators (tracing: {report['tracemalloc']['traced_bytes'] / 2**20:.1f} MB live):")
+        for stat in report["top_allocators"]:
+            print(f"  {_size(stat['bytes']):>10} {stat['blocks']:>8} blocks  {stat['where'][0]}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker memory: RSS/PSS, cache sizes, top allocators")
+    parser.add_argument("--pid", type=int, action="append", help="Report this running process (repeatable)")
+    parser.add_argument("--match", help="Report every process whose command line contains this")
+    parser.add_argument("--tracemalloc", type=int, default=0, metavar="FRAMES",
+                        help="Trace allocations while loading (this process only)")
+    parser.add_argument("--top", type=int, default=10, help="Allocators to list")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.pid or args.match:
+        pids = sorted(set(args.pid or []) | set(matching_pids(args.match) if args.match else []))
+        return report_processes(pids, args.json)
+    return report_self(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Add gallery_changes table
+
+Revision ID: 3f1c9a7d2b10
+Revises: 8c90ce57381f
+Create Date: 2026-10-19 10:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b10'
+down_revision = '8c90ce57381f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('gallery_changes',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('biometric_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('department', sa.String(length=100), nullable=True),
+    sa.Column('op', sa.Enum('ADD', 'REMOVE', name='gallery_change_ops'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('gallery_changes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_gallery_changes_biometric_id'), ['biometric_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_gallery_changes_department'), ['department'], unique=False)
+        batch_op.create_index(batch_op.f('ix_gallery_changes_user_id'), ['user_id'], unique=False)
+
+    # Existing enrolments become the first versions of the gallery
+    op.execute("""
+        INSERT INTO gallery_changes (biometric_id, user_id, department, op, created_at)
+        SELECT b.id, b.user_id, u.department, 'ADD', CURRENT_TIMESTAMP
+        FROM biometrics b
+        JOIN users u ON u.id = b.user_id
+        WHERE b.face_template IS NOT NULL
+        ORDER BY b.id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_changes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_gallery_changes_user_id'))
+        batch_op.drop_index(batch_op.f('ix_gallery_changes_department'))
+        batch_op.drop_index(batch_op.f('ix_gallery_changes_biometric_id'))
+
+    op.drop_table('gallery_changes')
+    sa.Enum('ADD', 'REMOVE', name='gallery_change_ops').drop(op.get_bind(), checkfirst=True)
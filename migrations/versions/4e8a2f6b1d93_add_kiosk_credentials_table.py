@@ -0,0 +1,30 @@
+"""Add kiosk_credentials table
+
+Revision ID: 4e8a2f6b1d93
+Revises: 7d3e9b1c5a24
+Create Date: 2026-10-19 11:02:17.583104
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8a2f6b1d93'
+down_revision = '7d3e9b1c5a24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('kiosk_credentials',
+    sa.Column('kiosk_id', sa.String(length=64), nullable=False),
+    sa.Column('token_version', sa.Integer(), nullable=False),
+    sa.Column('issued_at', sa.DateTime(), nullable=True),
+    sa.Column('revoked_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('kiosk_id')
+    )
+
+
+def downgrade():
+    op.drop_table('kiosk_credentials')
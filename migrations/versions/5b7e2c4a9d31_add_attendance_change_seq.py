@@ -0,0 +1,59 @@
+"""Add change_seq to attendance tables
+
+Revision ID: 5b7e2c4a9d31
+Revises: 3f1c9a7d2b10
+Create Date: 2026-10-19 11:02:17.381254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c4a9d31'
+down_revision = '3f1c9a7d2b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(sa.schema.CreateSequence(sa.Sequence('attendance_change_seq')))
+
+    with op.batch_alter_table('staff_attendance', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.BigInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_staff_attendance_change_seq'), ['change_seq'], unique=False)
+
+    with op.batch_alter_table('student_attendance', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.BigInteger(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_student_attendance_change_seq'), ['change_seq'], unique=False)
+
+    # Existing rows get sequence values in id order, staff first
+    if bind.dialect.name == 'postgresql':
+        for table in ('staff_attendance', 'student_attendance'):
+            op.execute(f"""
+                UPDATE {table} t SET change_seq = s.seq
+                FROM (SELECT id, nextval('attendance_change_seq') AS seq
+                      FROM (SELECT id FROM {table} ORDER BY id) o) s
+                WHERE t.id = s.id
+            """)
+    else:
+        op.execute("UPDATE staff_attendance SET change_seq = id")
+        op.execute("""
+            UPDATE student_attendance
+            SET change_seq = id + (SELECT COALESCE(MAX(change_seq), 0) FROM staff_attendance)
+        """)
+
+
+def downgrade():
+    with op.batch_alter_table('student_attendance', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_student_attendance_change_seq'))
+        batch_op.drop_column('change_seq')
+
+    with op.batch_alter_table('staff_attendance', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_staff_attendance_change_seq'))
+        batch_op.drop_column('change_seq')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(sa.schema.DropSequence(sa.Sequence('attendance_change_seq')))
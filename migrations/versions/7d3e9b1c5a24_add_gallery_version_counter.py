@@ -0,0 +1,41 @@
+"""Add gallery_version counter and gallery_changes.version
+
+Revision ID: 7d3e9b1c5a24
+Revises: e2b8c6d41f07
+Create Date: 2026-10-19 18:05:12.407331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3e9b1c5a24'
+down_revision = 'e2b8c6d41f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('gallery_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Existing changes keep their ids as versions, so kiosk cursors stay valid
+    op.execute("INSERT INTO gallery_version (id, version) SELECT 1, COALESCE(MAX(id), 0) FROM gallery_changes")
+
+    with op.batch_alter_table('gallery_changes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.BigInteger(), nullable=True))
+    op.execute("UPDATE gallery_changes SET version = id")
+    with op.batch_alter_table('gallery_changes', schema=None) as batch_op:
+        batch_op.alter_column('version', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.create_index(batch_op.f('ix_gallery_changes_version'), ['version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_changes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_gallery_changes_version'))
+        batch_op.drop_column('version')
+
+    op.drop_table('gallery_version')
@@ -0,0 +1,32 @@
+"""Add (user, day) indexes to attendance tables
+
+Revision ID: e2b8c6d41f07
+Revises: 9a4d6e1f7c52
+Create Date: 2026-10-19 16:20:44.108317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8c6d41f07'
+down_revision = '9a4d6e1f7c52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('staff_attendance', schema=None) as batch_op:
+        batch_op.create_index('ix_staff_attendance_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('student_attendance', schema=None) as batch_op:
+        batch_op.create_index('ix_student_attendance_user_id_date', ['user_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('student_attendance', schema=None) as batch_op:
+        batch_op.drop_index('ix_student_attendance_user_id_date')
+
+    with op.batch_alter_table('staff_attendance', schema=None) as batch_op:
+        batch_op.drop_index('ix_staff_attendance_user_id_created_at')
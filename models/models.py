@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime, timezone
 from flask_argon2 import Argon2
+from sqlalchemy.orm import Session as OrmSession
 from app import db
 
 # ============================================================
@@ -126,6 +127,10 @@ class Student(db.Model):
 # ============================================================
 class StaffAttendance(db.Model):
     __tablename__ = "staff_attendance"
+    __table_args__ = (
+        # Per-person day lookups and the absentee anti-join (NOT EXISTS per user and day)
+        db.Index("ix_staff_attendance_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
@@ -134,6 +139,7 @@ class StaffAttendance(db.Model):
     time_out = db.Column(db.DateTime, nullable=True)
     method = db.Column(db.String(20), nullable=True, index=True)
     status = db.Column(db.String(30), default="SIGNED_IN", index=True)
+    change_seq = db.Column(db.BigInteger, nullable=True, index=True)  # see next_change_seq()
 
 
 # ============================================================
@@ -141,6 +147,9 @@ class StaffAttendance(db.Model):
 # ============================================================
 class StudentAttendance(db.Model):
     __tablename__ = "student_attendance"
+    __table_args__ = (
+        db.Index("ix_student_attendance_user_id_date", "user_id", "date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False, index=True)
@@ -150,4 +159,292 @@ class StudentAttendance(db.Model):
     method = db.Column(db.String(20), nullable=True, index=True)
     status = db.Column(db.String(30), default="SIGNED_IN", index=True)
     date = db.Column(db.Date, default=lambda: datetime.now(timezone.utc).date(), index=True)
+    change_seq = db.Column(db.BigInteger, nullable=True, index=True)  # see next_change_seq()
+
+
+# ============================================================
+# Attendance change sequence
+# ============================================================
+# One sequence shared by both attendance tables, so a single cursor covers
+# staff and student changes. SQLite has no sequences; there the next value is
+# derived from the current maximum (writes are serialised anyway).
+#
+# On PostgreSQL values are handed out at flush, not at commit, so a row with
+# a lower seq can become visible after one with a higher seq. Before its
+# first stamp each transaction takes one more value, the marker, and holds it
+# as an advisory lock until it ends; all of its stamps are above the marker.
+# change_seq_watermark() reads the held markers: below the lowest of them,
+# nothing is left to commit.
+ATTENDANCE_CHANGE_SEQ = db.Sequence("attendance_change_seq", metadata=db.metadata)
+
+# Advisory lock keys of held markers: "SEQ" in the top bits, the marker below
+CHANGE_MARKER_BASE = 0x534551 << 40
+
+
+def _reserve_change_seqs(connection, count):
+    """SQLite: reserve `count` consecutive values and return the first."""
+    # Several flushes may stamp rows before any is committed: continue from the
+    # last value handed out in this transaction
+    transaction = connection.get_transaction()
+    last = connection.info.get("attendance_change_seq")
+    if last and last[0] is transaction:
+        first = last[1] + 1
+    else:
+        first = max(
+            connection.execute(db.select(db.func.max(StaffAttendance.change_seq))).scalar() or 0,
+            connection.execute(db.select(db.func.max(StudentAttendance.change_seq))).scalar() or 0,
+        ) + 1
+    connection.info["attendance_change_seq"] = (transaction, first + count - 1)
+    return first
+
+
+def _hold_change_marker(connection):
+    """PostgreSQL: lock a marker below every change_seq this transaction will take."""
+    # Innermost: a savepoint rolled back releases the locks taken inside it
+    transaction = connection.get_nested_transaction() or connection.get_transaction()
+    held = connection.info.get("attendance_change_marker")
+    if held is not None and held is transaction:
+        return
+    connection.execute(
+        db.text("SELECT pg_advisory_xact_lock(:base + nextval('attendance_change_seq'))"),
+        {"base": CHANGE_MARKER_BASE},
+    )
+    connection.info["attendance_change_marker"] = transaction
+
+
+def change_seq_watermark(connection):
+    """
+    Highest change_seq below which every change is committed or abandoned:
+    rows at or under it never gain a lower-seq neighbour later.
+    """
+    if connection.dialect.name != "postgresql":
+        return max(
+            connection.execute(db.select(db.func.max(StaffAttendance.change_seq))).scalar() or 0,
+            connection.execute(db.select(db.func.max(StudentAttendance.change_seq))).scalar() or 0,
+        )
+
+    # The sequence first: a transaction that takes values after this read is
+    # above it, one that took values before it holds its marker by now
+    last_value, is_called = connection.execute(
+        db.text("SELECT last_value, is_called FROM attendance_change_seq")
+    ).one()
+    upper = last_value if is_called else last_value - 1
+    lowest_marker = connection.execute(
+        db.text(
+            "SELECT min(((classid::bigint << 32) | objid::bigint) - :base) FROM pg_locks "
+            "WHERE locktype = 'advisory' AND objsubid = 1 AND granted "
+            "AND classid::bigint BETWEEN :low AND :high"
+        ),
+        {"base": CHANGE_MARKER_BASE, "low": CHANGE_MARKER_BASE >> 32, "high": (CHANGE_MARKER_BASE >> 32) + 0xFF},
+    ).scalar()
+    return upper if lowest_marker is None else min(upper, lowest_marker - 1)
+
+
+def next_change_seqs(connection, count=1):
+    """Return `count` consecutive attendance change sequence values."""
+    if connection.dialect.name == "postgresql":
+        _hold_change_marker(connection)
+        return list(connection.execute(
+            db.text("SELECT nextval('attendance_change_seq') FROM generate_series(1, :n)"), {"n": count}
+        ).scalars())
+
+    first = _reserve_change_seqs(connection, count)
+    return list(range(first, first + count))
+
+
+def bulk_change_seq(connection, key, low, high):
+    """
+    change_seq expression for a set-based UPDATE / INSERT ... SELECT whose rows
+    are keyed by the integer column `key`, with values in [low, high]:
+    nextval() per row on PostgreSQL, a reserved block offset by the key on SQLite.
+    """
+    if connection.dialect.name == "postgresql":
+        _hold_change_marker(connection)
+        return ATTENDANCE_CHANGE_SEQ.next_value()
+    return key + (_reserve_change_seqs(connection, high - low + 1) - low)
+
+
+def next_change_seq(connection):
+    """Return the next attendance change sequence value on this connection."""
+    return next_change_seqs(connection)[0]
+
+
+# Every ORM insert/update of an attendance row takes the next change sequence,
+# stamped for the whole flush at once so bulk marking costs one extra query.
+# Bulk SQL writes must set change_seq themselves (see bulk_change_seq()).
+@db.event.listens_for(OrmSession, "before_flush")
+def _stamp_attendance_changes(session, flush_context, instances):
+    targets = [obj for obj in session.new if isinstance(obj, (StaffAttendance, StudentAttendance))]
+    targets += [
+        obj for obj in session.dirty
+        if isinstance(obj, (StaffAttendance, StudentAttendance))
+        and session.is_modified(obj, include_collections=False)
+    ]
+    if targets:
+        for obj, value in zip(targets, next_change_seqs(session.connection(), len(targets))):
+            obj.change_seq = value
+
+
+# ============================================================
+# Gallery Change Log Model
+# ============================================================
+class GalleryChange(db.Model):
+    """Append-only log of face gallery changes, ordered by version (see GalleryVersion)."""
+    __tablename__ = "gallery_changes"
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, index=True)
+    biometric_id = db.Column(db.Integer, nullable=False, index=True)  # no FK: removals outlive the row
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    department = db.Column(db.String(100), nullable=True, index=True)
+    op = db.Column(db.Enum("ADD", "REMOVE", name="gallery_change_ops"), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+# ============================================================
+# Gallery Version Counter
+# ============================================================
+class GalleryVersion(db.Model):
+    """
+    Single-row counter holding the gallery version.
+
+    Ids (and sequence values in general) are handed out at insert time, not
+    at commit, so a change with a lower id can become visible after one with
+    a higher id and a reader cursoring on max(id) would skip it. Bumping this
+    row with UPDATE ... RETURNING inside the writing transaction locks it until
+    commit: writers take versions one transaction after another, so every
+    change up to the committed counter value is already visible.
+    """
+    __tablename__ = "gallery_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+db.event.listen(
+    GalleryVersion.__table__,
+    "after_create",
+    db.DDL("INSERT INTO gallery_version (id, version) VALUES (1, 0)"),
+)
+
+
+def bump_gallery_version(connection, count=1):
+    """Take `count` consecutive gallery versions in this transaction; returns them."""
+    counter = GalleryVersion.__table__
+    last = connection.execute(
+        counter.update()
+        .where(counter.c.id == 1)
+        .values(version=counter.c.version + count)
+        .returning(counter.c.version)
+    ).scalar_one()
+    return list(range(last - count + 1, last + 1))
+
+
+def _record_gallery_change(connection, biometric, op):
+    if biometric.face_template is None:
+        return
+    department = connection.execute(
+        db.select(User.department).where(User.id == biometric.user_id)
+    ).scalar() if biometric.user_id else None
+    connection.execute(
+        GalleryChange.__table__.insert().values(
+            version=bump_gallery_version(connection)[0],
+            biometric_id=biometric.id,
+            user_id=biometric.user_id,
+            department=department,
+            op=op,
+            created_at=datetime.now(timezone.utc),
+        )
+    )
+
+
+# Every ORM insert/delete of a face template bumps the gallery version.
+# Bulk SQL deletes must call record_gallery_removals() themselves.
+@db.event.listens_for(Biometric, "after_insert")
+def _biometric_added(mapper, connection, target):
+    _record_gallery_change(connection, target, "ADD")
+
+
+@db.event.listens_for(Biometric, "after_delete")
+def _biometric_removed(mapper, connection, target):
+    _record_gallery_change(connection, target, "REMOVE")
+
+
+def record_gallery_removals(connection, rows):
+    """Log REMOVE changes for (biometric_id, user_id, department) rows deleted in bulk."""
+    if rows:
+        versions = bump_gallery_version(connection, len(rows))
+        connection.execute(
+            GalleryChange.__table__.insert(),
+            [
+                {"version": v, "biometric_id": b, "user_id": u, "department": d, "op": "REMOVE",
+                 "created_at": datetime.now(timezone.utc)}
+                for v, (b, u, d) in zip(versions, rows)
+            ],
+        )
+
+
+# ============================================================
+# Kiosk Credential Model
+# ============================================================
+class KioskCredential(db.Model):
+    """
+    Current token version of an offline kiosk (see utils/kiosk_auth.py).
+
+    KIOSK tokens carry the version they were issued at and are only accepted
+    while it matches: issuing a new token or revoking bumps it, which cuts
+    off every earlier token of that kiosk.
+    """
+    __tablename__ = "kiosk_credentials"
+
+    kiosk_id = db.Column(db.String(64), primary_key=True)
+    token_version = db.Column(db.Integer, nullable=False, default=0)
+    issued_at = db.Column(db.DateTime, nullable=True)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+
+
+# ============================================================
+# Background Job Model
+# ============================================================
+class Job(db.Model):
+    """A queued/running/finished background job (see utils/jobs.py)."""
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    uuid = db.Column(db.String(36), default=lambda: str(uuid.uuid4()), unique=True, nullable=False, index=True)
+    type = db.Column(db.String(50), nullable=False, index=True)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(
+        db.Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", name="job_statuses"),
+        nullable=False,
+        default="QUEUED",
+        index=True
+    )
+    progress = db.Column(db.Float, nullable=False, default=0.0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    error = db.Column(db.Text, nullable=True)
+    result_path = db.Column(db.String(500), nullable=True)
+    result_name = db.Column(db.String(255), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True, index=True)
+    run_after = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # stale RUNNING jobs are re-queued
+    finished_at = db.Column(db.DateTime, nullable=True)
 
+    def to_dict(self):
+        return {
+            "id": self.uuid,
+            "type": self.type,
+            "params": self.params,
+            "status": self.status,
+            "progress": round(self.progress or 0.0, 3),
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "error": self.error,
+            "has_result": self.result_path is not None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
@@ -0,0 +1,46 @@
+"""
+Local read-replica stand-in: copy a primary SQLite database into a second
+file, once or every --interval seconds, so replica routing (utils/replica.py)
+can be exercised without PostgreSQL streaming replication. The interval plays
+the part of replication lag.
+
+Usage:
+    DATABASE_URL=sqlite:///primary.db REPLICA_DATABASE_URL=sqlite:///replica.db flask run
+    python replica_standin.py --primary primary.db --replica replica.db --interval 2
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+
+
+def copy_database(primary, replica):
+    """Consistent online copy (SQLite backup API), safe while the app is writing."""
+    source = sqlite3.connect(f"file:{primary}?mode=ro", uri=True)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh a SQLite replica stand-in from the primary")
+    parser.add_argument("--primary", required=True, help="Primary SQLite file")
+    parser.add_argument("--replica", required=True, help="Replica SQLite file (overwritten)")
+    parser.add_argument("--interval", type=float, help="Keep copying every N seconds (simulated lag)")
+    args = parser.parse_args(argv)
+
+    while True:
+        started = time.perf_counter()
+        copy_database(args.primary, args.replica)
+        print(f"✅ {args.primary} → {args.replica} in {time.perf_counter() - started:.2f}s", flush=True)
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, request, jsonify, abort, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from datetime import datetime, date, time as dtime, timezone
-from models.models import Student, User, Biometric, StaffAttendance, StudentAttendance
+from datetime import datetime, date, time as dtime, timedelta, timezone
+from models.models import Student, User, Biometric, StaffAttendance, StudentAttendance, change_seq_watermark
 from app import db
-import json
-import numpy as np
+from utils import metrics
+from utils.metrics import time_matcher
+from utils.attendance_events import broker, StreamFull
+from utils.archive import read_archived
+from utils.export import EXPORT_FORMATS, EXPORT_KINDS, stream_export
+from utils.kiosk_auth import kiosk_scope, require_admin_or_kiosk
+from utils.probe import read_probe
+from utils.replica import replica_reads
+import time
 
 # ---------------------------
 # Office Hours Configuration
@@ -14,32 +21,87 @@ OFFICE_CLOSE = dtime(16, 59, 0)  # 04:59 PM
 
 attendance_bp = Blueprint("attendance", __name__, url_prefix="/api/attendance")
 
+SCOPED_SEARCHES = metrics.counter(
+    "face_scoped_searches_total",
+    "Scoped face searches by outcome (matched in scope, or fell back to global).",
+    ("result",),
+)
+
 # ---------------------------
 # Utility Functions
 # ---------------------------
 def cosine_similarity(a, b):
-    """Compute cosine similarity between two vectors."""
+    """Compute cosine similarity between two vectors (reference implementation)."""
+    import numpy as np  # imported lazily: only matching needs numpy
+
     a, b = np.array(a), np.array(b)
     dot = np.dot(a, b)
     return dot / (np.linalg.norm(a) * np.linalg.norm(b))
 
 
-def match_face(embedding, threshold=0.65):
-    """Return best matching user from face embeddings."""
-    biometrics = Biometric.query.filter(Biometric.face_template.isnot(None)).all()
-    best_match, best_score = None, -1
+def parse_scope(value):
+    """Normalise a kiosk scope (a department or list of departments) to a list, or None."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return value
+    raise ValueError("scope must be a department name or a list of department names")
 
-    for bio in biometrics:
-        try:
-            stored_embedding = json.loads(bio.face_template.decode("utf-8"))
-            score = cosine_similarity(embedding, stored_embedding)
-            if score > best_score:
-                best_match, best_score = bio.user, score
-        except Exception:
-            continue
 
-    if best_match and best_score >= threshold:
-        return best_match, "face", best_score
+KIOSK_ID_MAX_LENGTH = 64
+
+
+def parse_kiosk_id(value):
+    """Validate a kiosk id (hot-set key): a short string, or None."""
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str) or len(value) > KIOSK_ID_MAX_LENGTH:
+        raise ValueError(f"kiosk_id must be a string of at most {KIOSK_ID_MAX_LENGTH} characters")
+    return value
+
+
+def match_face(embedding, threshold=0.65, kiosk_id=None, scope=None):
+    """
+    Return best matching user, trying the kiosk's hot set before the gallery.
+
+    With a scope only those departments' partitions are searched; a miss falls
+    back to the whole gallery when FACE_SCOPE_FALLBACK_GLOBAL is on (visitors).
+    The hot set is per kiosk and scope and only learns in-scope matches, so it
+    never answers with someone the scoped search would not have found.
+    """
+    from utils.face_gallery import gallery
+    from utils.face_hot_cache import hot_cache
+    from utils.match_telemetry import telemetry
+
+    started = time.perf_counter()
+    source, runner_up = "hot", None
+    user_id, score = hot_cache.match(kiosk_id, embedding, threshold, scope)
+    if user_id is None:
+        search_started = time.perf_counter()
+        source = "scoped" if scope else "gallery"
+        user_id, score, runner_up = gallery.match(embedding, scope, runner_up=True)
+        if scope:
+            in_scope = user_id is not None and score >= threshold
+            if not in_scope and current_app.config.get("FACE_SCOPE_FALLBACK_GLOBAL", True):
+                SCOPED_SEARCHES.inc(result="fallback")
+                source = "fallback"
+                user_id, score, runner_up = gallery.match(embedding, runner_up=True)
+            else:
+                SCOPED_SEARCHES.inc(result="scoped")
+        hot_cache.record_full_search(time.perf_counter() - search_started)
+        if user_id is not None and score >= threshold and source != "fallback":
+            hot_cache.remember(kiosk_id, user_id, scope)
+
+    accepted = user_id is not None and score >= threshold
+    telemetry.record("signin", source, gallery.state().size, score, runner_up, threshold, accepted,
+                     time.perf_counter() - started)
+
+    if accepted:
+        user = db.session.get(User, user_id)
+        if user:
+            return user, "face", score
     return None, None, None
 
 
@@ -55,35 +117,94 @@ def match_fingerprint(fingerprint_template):
 
 def has_signed_in_today(user_id):
     """Check if staff has already signed in today."""
-    today = date.today()
-    return (
-        StaffAttendance.query.filter(
-            StaffAttendance.user_id == user_id,
-            StaffAttendance.timestamp >= datetime(today.year, today.month, today.day)
-        ).first()
-        is not None
-    )
+    record = get_today_attendance_record(user_id)
+    return record is not None and record.time_in is not None
 
 
 def get_today_attendance_record(user_id):
     """Return today's staff attendance record."""
-    today = date.today()
-    start = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+    return get_staff_record_for_day(user_id, date.today())
+
+
+def get_staff_record_for_day(user_id, day):
+    """Return the staff attendance record created on the given day."""
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
     return (
         StaffAttendance.query.filter(
             StaffAttendance.user_id == user_id,
-            StaffAttendance.created_at >= start
+            StaffAttendance.created_at >= start,
+            StaffAttendance.created_at < start + timedelta(days=1)
         ).order_by(StaffAttendance.id.desc()).first()
     )
 
 
+def record_staff_sign_in(user_id, when, method, record=None, created_at=None):
+    """Apply a sign-in to the day's record (created if missing); the caller commits."""
+    if not record:
+        record = StaffAttendance(user_id=user_id, created_at=created_at or when)
+        db.session.add(record)
+
+    record.time_in = when
+    record.method = method
+    record.status = "ON_TIME" if when.time() <= OFFICE_OPEN else "LATE"
+    return record
+
+
+def apply_manual_staff_action(record, user_id, action, dt):
+    """
+    Manual sign_in / sign_out rules for a staff member's day record.
+
+    Returns (record, outcome) with outcome "signed_in", "already_signed_in" or
+    "signed_out"; the caller commits.
+    """
+    if action == "sign_in":
+        if record and record.time_in:
+            return record, "already_signed_in"
+        return record_staff_sign_in(user_id, dt, "manual", record, created_at=datetime.now(timezone.utc)), "signed_in"
+
+    if not record:
+        record = StaffAttendance(user_id=user_id, created_at=datetime.now(timezone.utc))
+        db.session.add(record)
+
+    record.time_out = dt
+    record.method = "manual"
+    record.status = "EARLY_SIGNOUT" if dt.time() < OFFICE_CLOSE else "SIGNED_OUT"
+    return record, "signed_out"
+
+
+def apply_manual_student_action(record, student_id, action, dt, today):
+    """
+    Manual sign_in / sign_out rules for a student's day record.
+
+    Returns (record, outcome) with outcome "signed_in", "already_signed_in",
+    "signed_out", "already_signed_out" or "not_signed_in"; the caller commits.
+    """
+    if action == "sign_in":
+        if record and record.time_in:
+            return record, "already_signed_in"
+        if not record:
+            record = StudentAttendance(user_id=student_id, date=today, created_at=datetime.now(timezone.utc))
+            db.session.add(record)
+        record.time_in = dt
+        # An ABSENT row left by the end-of-day run becomes the day's record
+        record.status = "SIGNED_IN"
+        return record, "signed_in"
+
+    if not record or not record.time_in:
+        return record, "not_signed_in"
+    if record.time_out:
+        return record, "already_signed_out"
+    record.time_out = dt
+    return record, "signed_out"
+
+
 def has_student_signed_in_today(user_id):
     """Check if student has already signed in today."""
     today = date.today()
     return (
         StudentAttendance.query.filter(
             StudentAttendance.user_id == user_id,
-            StudentAttendance.timestamp >= datetime(today.year, today.month, today.day)
+            StudentAttendance.date == today
         ).first()
         is not None
     )
@@ -100,34 +221,110 @@ def get_today_student_attendance_record(user_id):
         ).order_by(StudentAttendance.id.desc()).first()
     )
 
+
+def serialize_staff_record(r):
+    """Staff attendance row as returned by /today/staff and the live stream."""
+    return {
+        "id": r.id,
+        "user_id": r.user_id,
+        "user_name": f"{r.user.firstname} {r.user.lastname}" if r.user else None,
+        "time_in": r.time_in.isoformat() if r.time_in else None,
+        "time_out": r.time_out.isoformat() if r.time_out else None,
+        "status": r.status,
+        "method": r.method
+    }
+
+
+def serialize_student_record(r):
+    """Student attendance row as returned by /today/students and the live stream."""
+    return {
+        "id": r.id,
+        "user_id": r.user_id,
+        "user_name": f"{r.student.firstname} {r.student.lastname}" if r.student else None,
+        "time_in": r.time_in.isoformat() if r.time_in else None,
+        "time_out": r.time_out.isoformat() if r.time_out else None,
+        "status": r.status,
+        "method": r.method
+    }
+
+
+def parse_date_range():
+    """?start=&end= (YYYY-MM-DD, end inclusive) → naive UTC [start, end) bounds, or (None, None)."""
+    start, end = request.args.get("start"), request.args.get("end")
+    if not start and not end:
+        return None, None
+    start = datetime.fromisoformat(start) if start else datetime(1970, 1, 1)
+    end = datetime.fromisoformat(end) if end else datetime.now(timezone.utc).replace(tzinfo=None)
+    return start, end.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+
+ARCHIVE_REPORT_COLUMNS = ["id", "user_id", "created_at", "time_in", "time_out", "status", "method"]
+
+
+def with_archived_records(data, model, person_model, start, end):
+    """Append archived rows in [start, end) (older than any hot row) to a report, newest first."""
+    rows = read_archived(model, start, end, ARCHIVE_REPORT_COLUMNS)
+    if not rows:
+        return data
+
+    people = person_model.query.filter(person_model.id.in_({r["user_id"] for r in rows})).all()
+    names = {p.id: f"{p.firstname} {p.lastname}" for p in people}
+    rows.sort(key=lambda r: r["created_at"], reverse=True)
+    return data + [
+        {
+            "id": r["id"],
+            "user_id": r["user_id"],
+            "user_name": names.get(r["user_id"]),
+            "time_in": r["time_in"].isoformat() if r["time_in"] else None,
+            "time_out": r["time_out"].isoformat() if r["time_out"] else None,
+            "status": r["status"],
+            "method": r["method"],
+            "archived": True
+        } for r in rows
+    ]
+
+
 # ---------------------------
 # Routes
 # ---------------------------
 
 @attendance_bp.route("/signin", methods=["POST"])
 def signin():
-    """Biometric sign-in (face or fingerprint)."""
-    data = request.get_json(silent=True)
+    """
+    Biometric sign-in (face or fingerprint). face_embedding may be a JSON
+    array, base64 float32/float16, or an octet-stream body (utils/probe.py).
+    """
+    try:
+        data, embedding = read_probe("face_embedding")
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     if not data:
         return jsonify({"success": False, "message": "Invalid request"}), 400
 
-    embedding = data.get("face_embedding")
     fingerprint = data.get("fingerprint_template")
+    try:
+        kiosk_id = parse_kiosk_id(data.get("kiosk_id") or request.headers.get("X-Kiosk-Id"))
+        scope = parse_scope(data.get("scope"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-    if not embedding and not fingerprint:
+    if embedding is None and not fingerprint:
         return jsonify({"success": False, "message": "No biometric provided"}), 400
 
     matched_user, method_used, score = None, None, None
 
-    if embedding:
-        matched_user, method_used, score = match_face(embedding)
+    if embedding is not None:
+        with time_matcher("face"):
+            matched_user, method_used, score = match_face(embedding, kiosk_id=kiosk_id, scope=scope)
     if not matched_user and fingerprint:
-        matched_user, method_used = match_fingerprint(fingerprint)
+        with time_matcher("fingerprint"):
+            matched_user, method_used = match_fingerprint(fingerprint)
 
     if not matched_user:
         return jsonify({"success": False, "message": "No match found"}), 200
 
-    if has_signed_in_today(matched_user.id):
+    record = get_today_attendance_record(matched_user.id)
+    if record and record.time_in:
         return jsonify({
             "success": True,
             "message": "Already signed in today",
@@ -137,13 +334,7 @@ def signin():
             "method": method_used
         }), 200
 
-    record = StaffAttendance(
-        user=matched_user,
-        timestamp=datetime.utcnow(),
-        method=method_used,
-        status="SIGNED_IN"
-    )
-    db.session.add(record)
+    record = record_staff_sign_in(matched_user.id, datetime.now(timezone.utc), method_used, record)
     db.session.commit()
 
     return jsonify({
@@ -154,16 +345,85 @@ def signin():
         "lastname": matched_user.lastname,
         "method": method_used,
         "score": float(score) if score else None,
-        "time": record.timestamp.isoformat()
+        "time": record.time_in.isoformat()
     }), 200
 
 
+@attendance_bp.route("/events", methods=["POST"])
+@jwt_required()
+def upload_kiosk_events():
+    """
+    Batch upload of sign-ins matched locally by an offline kiosk.
+
+    Body: {"kiosk_id": ..., "events": [{"user_uuid", "time" (ISO 8601), "score"}]}.
+    Events are applied with the normal sign-in rules for the day they happened;
+    re-uploading a batch is harmless (already signed-in users are reported as
+    duplicates). Admins or KIOSK tokens (utils/kiosk_auth.py); a kiosk token's
+    own kiosk id is logged. Refused per event: users outside a scoped kiosk
+    token's departments ("out_of_scope") and times in the future or older than
+    KIOSK_EVENTS_MAX_AGE_HOURS ("time_out_of_range").
+    """
+    require_admin_or_kiosk()
+
+    data = request.get_json(silent=True)
+    events = data.get("events") if data else None
+    if not isinstance(events, list) or not events:
+        return jsonify({"success": False, "message": "No events provided"}), 400
+
+    max_events = current_app.config.get("KIOSK_EVENTS_MAX_BATCH", 1000)
+    if len(events) > max_events:
+        return jsonify({"success": False, "message": f"At most {max_events} events per upload"}), 400
+
+    uuids = {e.get("user_uuid") for e in events if isinstance(e, dict)}
+    users = {u.uuid: u for u in User.query.filter(User.uuid.in_(uuids)).all()} if uuids else {}
+    scope = kiosk_scope()
+    now = datetime.now(timezone.utc)
+    earliest = now - timedelta(hours=current_app.config.get("KIOSK_EVENTS_MAX_AGE_HOURS", 72))
+    latest = now + timedelta(seconds=current_app.config.get("KIOSK_EVENTS_MAX_SKEW_SECONDS", 300))
+
+    results = []
+    for event in events:
+        event = event if isinstance(event, dict) else {}
+        user = users.get(event.get("user_uuid"))
+        if not user:
+            results.append({"user_uuid": event.get("user_uuid"), "status": "unknown_user"})
+            continue
+        if scope and user.department not in scope:
+            results.append({"user_uuid": user.uuid, "status": "out_of_scope"})
+            continue
+        try:
+            when = datetime.fromisoformat(event.get("time"))
+        except (TypeError, ValueError):
+            results.append({"user_uuid": user.uuid, "status": "invalid_time"})
+            continue
+        when = when.replace(tzinfo=timezone.utc) if when.tzinfo is None else when.astimezone(timezone.utc)
+        if not earliest <= when <= latest:
+            results.append({"user_uuid": user.uuid, "status": "time_out_of_range"})
+            continue
+
+        record = get_staff_record_for_day(user.id, when.date())
+        if record and record.time_in:
+            results.append({"user_uuid": user.uuid, "status": "duplicate", "time": record.time_in.isoformat()})
+            continue
+
+        record = record_staff_sign_in(user.id, when, "face_offline", record)
+        db.session.flush()
+        results.append({"user_uuid": user.uuid, "status": "recorded", "attendance_status": record.status})
+
+    db.session.commit()
+    recorded = sum(r["status"] == "recorded" for r in results)
+    current_app.logger.info("Kiosk %s uploaded %d events (%d recorded)",
+                            get_jwt().get("kiosk_id") or data.get("kiosk_id"), len(events), recorded)
+    return jsonify({"success": True, "recorded": recorded, "results": results}), 200
+
+
 # ---------------------------
 # Admin: List Users / Students
 # ---------------------------
 
 @attendance_bp.route("/users", methods=["GET"])
 @jwt_required()
+@replica_reads
 def list_users_for_admin():
     """Return minimal user list for admin dropdown."""
     claims = get_jwt()
@@ -186,6 +446,7 @@ def list_users_for_admin():
 
 @attendance_bp.route("/students", methods=["GET"])
 @jwt_required()
+@replica_reads
 def list_students_for_admin():
     """Return minimal student list for admin dropdown."""
     claims = get_jwt()
@@ -254,14 +515,7 @@ def manual_staff_attendance():
                 }
             }), 200
 
-        if not record:
-            record = StaffAttendance(user_id=user.id, created_at=datetime.now(timezone.utc))
-            db.session.add(record)
-
-        record.time_in = dt
-        record.method = "manual"
-        record.status = "ON_TIME" if dt.time() <= OFFICE_OPEN else "LATE"
-
+        record, _ = apply_manual_staff_action(record, user.id, action, dt)
         db.session.commit()
         return jsonify({
             "success": True,
@@ -275,14 +529,7 @@ def manual_staff_attendance():
         }), 200
 
     if action == "sign_out":
-        if not record:
-            record = StaffAttendance(user_id=user.id, created_at=datetime.now(timezone.utc))
-            db.session.add(record)
-
-        record.time_out = dt
-        record.method = "manual"
-        record.status = "EARLY_SIGNOUT" if dt.time() < OFFICE_CLOSE else "SIGNED_OUT"
-
+        record, _ = apply_manual_staff_action(record, user.id, action, dt)
         db.session.commit()
         return jsonify({
             "success": True,
@@ -311,7 +558,7 @@ def manual_student_attendance():
             return jsonify({"success": False, "message": "Invalid JSON"}), 400
 
         data = request.get_json()
-        print("📩 Received data:", data)
+        current_app.logger.debug("Manual student attendance payload: %s", data)
 
         student_id = data.get("student_id")
         action = (data.get("action") or "").lower()
@@ -348,15 +595,7 @@ def manual_student_attendance():
                     }
                 }), 200
 
-            if not record:
-                record = StudentAttendance(
-                    user_id=student.id,
-                    date=today,
-                    created_at=datetime.now(timezone.utc)
-                )
-                db.session.add(record)
-
-            record.time_in = dt
+            record, _ = apply_manual_student_action(record, student.id, action, dt, today)
             db.session.commit()
 
             return jsonify({
@@ -385,7 +624,7 @@ def manual_student_attendance():
                     }
                 }), 200
 
-            record.time_out = dt
+            record, _ = apply_manual_student_action(record, student.id, action, dt, today)
             db.session.commit()
 
             return jsonify({
@@ -403,17 +642,165 @@ def manual_student_attendance():
 
     except Exception as e:
         db.session.rollback()
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("Manual student attendance failed")
         return jsonify({"success": False, "message": f"Internal Server Error: {str(e)}"}), 500
 
 
+# ---------------------------
+# Bulk Manual Attendance
+# ---------------------------
+
+def parse_bulk_request(id_field):
+    """
+    Validate a bulk manual payload → (ids, action, dt) or (None, error_response).
+    ids are de-duplicated ints, in request order; anything else (strings,
+    floats, booleans) is rejected rather than coerced.
+    """
+    data = request.get_json(silent=True) if request.is_json else None
+    if not isinstance(data, dict):
+        return None, (jsonify({"success": False, "message": "Invalid JSON"}), 400)
+
+    ids = data.get(id_field)
+    action = data.get("action")
+    action = action.lower() if isinstance(action, str) else ""
+    ts = data.get("timestamp")
+
+    if not isinstance(ids, list) or not ids or action not in ("sign_in", "sign_out"):
+        return None, (jsonify({"success": False, "message": f"Missing {id_field} or invalid action"}), 400)
+
+    max_ids = current_app.config.get("MANUAL_BULK_MAX_IDS", 500)
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return None, (jsonify({"success": False, "message": f"{id_field} must be integers"}), 400)
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > max_ids:
+        return None, (jsonify({"success": False, "message": f"At most {max_ids} ids per request"}), 400)
+
+    try:
+        dt = datetime.fromisoformat(ts).replace(tzinfo=timezone.utc) if ts else datetime.now(timezone.utc)
+    except Exception:
+        return None, (jsonify({"success": False, "message": "Invalid timestamp format"}), 400)
+
+    return (ids, action, dt), None
+
+
+def bulk_response(action, results):
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    return jsonify({"success": True, "action": action, "summary": summary, "results": results}), 200
+
+
+@attendance_bp.route("/manual/staff/bulk", methods=["POST"])
+@jwt_required()
+def manual_staff_attendance_bulk():
+    """
+    Admin manual sign in/out for many staff at once:
+    {"user_ids": [...], "action": "sign_in" | "sign_out", "timestamp": optional}.
+
+    Today's records for every id are loaded in one query and the whole batch is
+    committed in one transaction; each id gets its own status in "results".
+    """
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    parsed, error = parse_bulk_request("user_ids")
+    if error:
+        return error
+    user_ids, action, dt = parsed
+
+    try:
+        # Loaded as objects so record.user resolves from the identity map when serializing
+        known = {u.id: u for u in User.query.filter(User.id.in_(user_ids))}
+
+        today = date.today()
+        start = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+        records = {}
+        for record in StaffAttendance.query.filter(
+            StaffAttendance.user_id.in_(list(known)),
+            StaffAttendance.created_at >= start,
+            StaffAttendance.created_at < start + timedelta(days=1)
+        ).order_by(StaffAttendance.id.desc()):
+            # Same record get_today_attendance_record() would pick: the latest of the day
+            records.setdefault(record.user_id, record)
+
+        outcomes = []
+        for user_id in user_ids:
+            if user_id not in known:
+                outcomes.append((user_id, "not_found", None))
+                continue
+            record, outcome = apply_manual_staff_action(records.get(user_id), user_id, action, dt)
+            outcomes.append((user_id, outcome, record))
+
+        db.session.flush()
+        results = []
+        for user_id, outcome, record in outcomes:
+            attendance = serialize_staff_record(record) if record else None
+            results.append({"id": user_id, "status": outcome, "attendance": attendance})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Bulk manual staff attendance failed")
+        return jsonify({"success": False, "message": f"Internal Server Error: {str(e)}"}), 500
+
+    return bulk_response(action, results)
+
+
+@attendance_bp.route("/manual/student/bulk", methods=["POST"])
+@jwt_required()
+def manual_student_attendance_bulk():
+    """
+    Manual sign in/out for a whole class:
+    {"student_ids": [...], "action": "sign_in" | "sign_out", "timestamp": optional}.
+
+    Same rules as /manual/student, applied in memory to today's records (one
+    query) and committed in one transaction.
+    """
+    parsed, error = parse_bulk_request("student_ids")
+    if error:
+        return error
+    student_ids, action, dt = parsed
+
+    try:
+        known = {s.id: s for s in Student.query.filter(Student.id.in_(student_ids))}
+
+        today = datetime.now(timezone.utc).date()
+        records = {}
+        for record in StudentAttendance.query.filter(
+            StudentAttendance.user_id.in_(list(known)),
+            StudentAttendance.date == today
+        ).order_by(StudentAttendance.id):
+            records.setdefault(record.user_id, record)
+
+        outcomes = []
+        for student_id in student_ids:
+            if student_id not in known:
+                outcomes.append((student_id, "not_found", None))
+                continue
+            record, outcome = apply_manual_student_action(records.get(student_id), student_id, action, dt, today)
+            outcomes.append((student_id, outcome, record))
+
+        db.session.flush()
+        results = []
+        for student_id, outcome, record in outcomes:
+            attendance = serialize_student_record(record) if record else None
+            results.append({"id": student_id, "status": outcome, "attendance": attendance})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception("Bulk manual student attendance failed")
+        return jsonify({"success": False, "message": f"Internal Server Error: {str(e)}"}), 500
+
+    return bulk_response(action, results)
+
+
 # ---------------------------
 # Admin: View Attendance (Today + All)
 # ---------------------------
 
 @attendance_bp.route("/today/staff", methods=["GET"])
 @jwt_required()
+@replica_reads
 def get_today_attendance():
     """Get today's attendance record for all staff."""
     claims = get_jwt()
@@ -429,22 +816,13 @@ def get_today_attendance():
         StaffAttendance.created_at <= end
     ).order_by(StaffAttendance.user_id).all()
 
-    data = [
-        {
-            "id": r.id,
-            "user_id": r.user_id,
-            "user_name": f"{r.user.firstname} {r.user.lastname}" if r.user else None,
-            "time_in": r.time_in.isoformat() if r.time_in else None,
-            "time_out": r.time_out.isoformat() if r.time_out else None,
-            "status": r.status,
-            "method": r.method
-        } for r in records
-    ]
+    data = [serialize_staff_record(r) for r in records]
     return jsonify({"success": True, "data": data}), 200
 
 
 @attendance_bp.route("/today/students", methods=["GET"])
 @jwt_required()
+@replica_reads
 def get_today_student_attendance():
     """Get today's attendance record for all students."""
     claims = get_jwt()
@@ -460,63 +838,441 @@ def get_today_student_attendance():
         StudentAttendance.created_at <= end
     ).order_by(StudentAttendance.user_id).all()
 
-    data = [
-        {
-            "id": r.id,
-            "user_id": r.user_id,
-            "user_name": f"{r.student.firstname} {r.student.lastname}" if r.student else None,
-            "time_in": r.time_in.isoformat() if r.time_in else None,
-            "time_out": r.time_out.isoformat() if r.time_out else None,
-            "status": r.status,
-            "method": r.method
-        } for r in records
-    ]
+    data = [serialize_student_record(r) for r in records]
     return jsonify({"success": True, "data": data}), 200
 
 
-@attendance_bp.route("/all/staff", methods=["GET"])
+# ---------------------------
+# Admin: Absentees & Late Arrivals
+# ---------------------------
+
+# kind → (person model, attendance model)
+ROSTERS = {
+    "staff": (User, StaffAttendance),
+    "students": (Student, StudentAttendance),
+}
+
+
+def parse_pagination(default=50, maximum=500):
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", default, type=int), 1), maximum)
+    return page, per_page
+
+
+def time_of_day(column):
+    """Time part of a timestamp column, comparable with a datetime.time (SQLite has no TIME type)."""
+    if db.session.get_bind().dialect.name == "sqlite":
+        return db.func.time(column)
+    return db.cast(column, db.Time)
+
+
+def roster_filters(kind):
+    """Who is on the kind's roster (admins are not), narrowed by ?department=."""
+    person, _ = ROSTERS[kind]
+    filters = [User.role == "STAFF"] if kind == "staff" else []
+    department = (request.args.get("department") or "").strip()
+    if department:
+        filters.append(person.department == department)
+    return filters
+
+
+def paginate(stmt, page, per_page):
+    """(total, rows) of one page of a select."""
+    total = db.session.execute(db.select(db.func.count()).select_from(stmt.subquery())).scalar()
+    rows = db.session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+    return total, rows
+
+
+def serialize_person(row):
+    return {
+        "id": row.id,
+        "uuid": row.uuid,
+        "firstname": row.firstname,
+        "lastname": row.lastname,
+        "department": row.department
+    }
+
+
+@attendance_bp.route("/today/absent", methods=["GET"])
 @jwt_required()
-def get_all_staff_attendance():
-    """Get all staff attendance records."""
+@replica_reads
+def get_today_absentees():
+    """
+    Staff (or ?kind=students) with no sign-in today, optionally ?department=,
+    paginated with ?page=&per_page=. An ABSENT row from the end-of-day closer
+    has no time_in, so it counts as absent too.
+    """
     claims = get_jwt()
     if claims.get("role") != "ADMIN":
         abort(403, description="Access forbidden: Admins only")
 
-    records = StaffAttendance.query.order_by(StaffAttendance.created_at.desc()).all()
+    kind = request.args.get("kind", "staff")
+    if kind not in ROSTERS:
+        return jsonify({"success": False, "message": "kind must be staff or students"}), 400
+    person, model = ROSTERS[kind]
+    page, per_page = parse_pagination()
+
+    today = datetime.now(timezone.utc).date()
+    if kind == "staff":
+        start = datetime(today.year, today.month, today.day)
+        on_day = [model.created_at >= start, model.created_at < start + timedelta(days=1)]
+    else:
+        on_day = [model.date == today]
+    signed_in = db.select(model.id).where(model.user_id == person.id, *on_day, model.time_in.isnot(None)).exists()
+
+    stmt = (
+        db.select(person.id, person.uuid, person.firstname, person.lastname, person.department)
+        .where(*roster_filters(kind), ~signed_in)
+        .order_by(person.lastname, person.firstname, person.id)
+    )
+    total, rows = paginate(stmt, page, per_page)
+
+    return jsonify({
+        "success": True,
+        "date": today.isoformat(),
+        "kind": kind,
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "data": [serialize_person(r) for r in rows]
+    }), 200
+
+
+@attendance_bp.route("/today/late", methods=["GET"])
+@jwt_required()
+@replica_reads
+def get_today_late_arrivals():
+    """Staff who signed in after OFFICE_OPEN today, earliest first (?department=, ?page=&per_page=)."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    page, per_page = parse_pagination()
+    today = datetime.now(timezone.utc).date()
+    start = datetime(today.year, today.month, today.day)
+
+    # By sign-in time rather than status: a sign-out replaces LATE with SIGNED_OUT / EARLY_SIGNOUT
+    stmt = (
+        db.select(User.id, User.uuid, User.firstname, User.lastname, User.department, StaffAttendance.time_in)
+        .join(StaffAttendance, StaffAttendance.user_id == User.id)
+        .where(
+            *roster_filters("staff"),
+            StaffAttendance.created_at >= start,
+            StaffAttendance.created_at < start + timedelta(days=1),
+            StaffAttendance.time_in.isnot(None),
+            time_of_day(StaffAttendance.time_in) > OFFICE_OPEN
+        )
+        .order_by(StaffAttendance.time_in, User.id)
+    )
+    total, rows = paginate(stmt, page, per_page)
+
+    return jsonify({
+        "success": True,
+        "date": today.isoformat(),
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "data": [{**serialize_person(r), "time_in": r.time_in.isoformat()} for r in rows]
+    }), 200
+
+
+@attendance_bp.route("/absent", methods=["GET"])
+@jwt_required()
+@replica_reads
+def get_absence_report():
+    """
+    Absence (and, for staff, late-arrival) counts per person over
+    ?start=&end= (YYYY-MM-DD, inclusive), for ?kind=staff|students and
+    optionally ?department=. Only working days count (?weekdays=, Monday=0,
+    default END_OF_DAY_WEEKDAYS) and never days after today. People with a
+    perfect record are left out; the rest come most-absent first, paginated.
+
+    One grouped LEFT JOIN of the roster against the range's sign-ins; only
+    rows still in the database count, not archived months.
+    """
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    kind = request.args.get("kind", "staff")
+    if kind not in ROSTERS:
+        return jsonify({"success": False, "message": "kind must be staff or students"}), 400
+    person, model = ROSTERS[kind]
+    page, per_page = parse_pagination()
+
+    try:
+        start, end = parse_date_range()
+        weekdays = {
+            int(d) for d in
+            (request.args.get("weekdays") or str(current_app.config.get("END_OF_DAY_WEEKDAYS", "0,1,2,3,4"))).split(",")
+            if d.strip()
+        }
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date range or weekdays"}), 400
+    if not start:
+        return jsonify({"success": False, "message": "start is required"}), 400
+
+    last = min(end.date(), datetime.now(timezone.utc).date() + timedelta(days=1))
+    working_days = [
+        start.date() + timedelta(days=i) for i in range((last - start.date()).days)
+        if (start.date() + timedelta(days=i)).weekday() in weekdays
+    ]
+    if not working_days:
+        return jsonify({"success": True, "working_days": 0, "total": 0, "page": page,
+                        "per_page": per_page, "data": []}), 200
+
+    if kind == "staff":
+        day = db.func.date(model.created_at)
+        in_range = [model.created_at >= start, model.created_at < end]
+    else:
+        day = model.date
+        in_range = [model.date >= start.date(), model.date < end.date()]
+
+    present = db.func.count(db.distinct(day))
+    columns = [person.id, person.uuid, person.firstname, person.lastname, person.department, present.label("present")]
+    having = present < len(working_days)
+    if kind == "staff":
+        late = db.func.count(db.distinct(db.case((time_of_day(model.time_in) > OFFICE_OPEN, day))))
+        columns.append(late.label("late"))
+        having = db.or_(having, late > 0)
+
+    stmt = (
+        db.select(*columns)
+        .outerjoin(model, db.and_(
+            model.user_id == person.id, *in_range, model.time_in.isnot(None), day.in_(working_days)
+        ))
+        .where(*roster_filters(kind))
+        .group_by(person.id, person.uuid, person.firstname, person.lastname, person.department)
+        .having(having)
+        .order_by(present, person.lastname, person.firstname, person.id)
+    )
+    total, rows = paginate(stmt, page, per_page)
+
+    data = []
+    for r in rows:
+        entry = {**serialize_person(r), "days_present": r.present, "days_absent": len(working_days) - r.present}
+        if kind == "staff":
+            entry["days_late"] = r.late
+        data.append(entry)
+
+    return jsonify({
+        "success": True,
+        "kind": kind,
+        "start": start.date().isoformat(),
+        "end": (end.date() - timedelta(days=1)).isoformat(),
+        "working_days": len(working_days),
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "data": data
+    }), 200
+
+
+def current_change_seq():
+    """The change_seq watermark: a cursor that has seen everything committed so far."""
+    return change_seq_watermark(db.session.connection())
+
+
+def attendance_changes(since, limit):
+    """Return (changes, next_since, has_more) for attendance rows changed after `since`."""
+    watermark = current_change_seq()
+
+    # Both tables are read through their change_seq index, limit + 1 rows each
+    staff = (
+        StaffAttendance.query.options(db.joinedload(StaffAttendance.user))
+        .filter(StaffAttendance.change_seq > since, StaffAttendance.change_seq <= watermark)
+        .order_by(StaffAttendance.change_seq).limit(limit + 1).all()
+    )
+    students = (
+        StudentAttendance.query.options(db.joinedload(StudentAttendance.student))
+        .filter(StudentAttendance.change_seq > since, StudentAttendance.change_seq <= watermark)
+        .order_by(StudentAttendance.change_seq).limit(limit + 1).all()
+    )
 
-    data = [
+    rows = sorted(
+        [("staff", r) for r in staff] + [("student", r) for r in students],
+        key=lambda item: item[1].change_seq,
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = [
         {
-            "id": r.id,
-            "user_id": r.user_id,
-            "user_name": f"{r.user.firstname} {r.user.lastname}" if r.user else None,
-            "time_in": r.time_in.isoformat() if r.time_in else None,
-            "time_out": r.time_out.isoformat() if r.time_out else None,
-            "status": r.status,
-            "method": r.method
-        } for r in records
+            "seq": r.change_seq,
+            "kind": kind,
+            "record": serialize_staff_record(r) if kind == "staff" else serialize_student_record(r)
+        } for kind, r in rows
     ]
+    # Nothing else at or under the watermark is left to arrive
+    return changes, changes[-1]["seq"] if has_more else max(since, watermark), has_more
+
+
+# Every worker's live stream is fed from the change cursor (utils/attendance_events.py)
+broker.attach_source(attendance_changes, current_change_seq)
+
+
+@attendance_bp.route("/stream", methods=["GET"])
+@jwt_required()
+def stream_today_attendance():
+    """
+    Server-sent events of attendance changes, about a second after commit.
+
+    Load /today/staff and /today/students once, then apply these events
+    (data: {"kind", "action", "seq", "record"}, upserted by kind and record
+    id). Reconnect with Last-Event-ID (or ?last_event_id=) to resume; on a
+    "reset" event, or a {"kind": "batch", "action": "reload"} event after a
+    bulk change, reload the snapshots.
+    """
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        subscriber = broker.subscribe(last_event_id)
+    except StreamFull:
+        return jsonify({"success": False, "message": "Too many live dashboards on this worker"}), 503
+
+    heartbeat = current_app.config.get("ATTENDANCE_STREAM_HEARTBEAT_SECONDS", 15)
+    return Response(
+        broker.stream(subscriber, heartbeat),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@attendance_bp.route("/changes", methods=["GET"])
+@jwt_required()
+def get_attendance_changes():
+    """
+    Staff and student attendance rows inserted or updated since ?since=<seq>.
+
+    Rows come back in change_seq order with at most ?limit= per page; pass
+    next_since back as since until has_more is false. A row that changes
+    again appears again with a higher seq, so clients upsert by (kind, id).
+
+    Sequence values are taken when a row is written, not when it commits, so
+    only rows up to the watermark (below every write still in progress) are
+    returned: a change is held back while an earlier-numbered one may still
+    commit, never skipped. A long write transaction delays later changes until
+    it ends. next_since can be higher than the last seq returned; always store
+    next_since, not the seq of the last change.
+    """
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    since = request.args.get("since", 0, type=int)
+    if since < 0:
+        return jsonify({"success": False, "message": "since must be a non-negative sequence"}), 400
+    limit = min(max(request.args.get("limit", 500, type=int), 1), 5000)
+
+    changes, next_since, has_more = attendance_changes(since, limit)
+    return jsonify({
+        "success": True,
+        "since": since,
+        "next_since": next_since,
+        "has_more": has_more,
+        "changes": changes
+    }), 200
+
+
+@attendance_bp.route("/all/staff", methods=["GET"])
+@jwt_required()
+@replica_reads
+def get_all_staff_attendance():
+    """
+    Get staff attendance records, newest first.
+
+    With ?start=/&end= only that range is returned, including months that
+    have been moved to the Parquet archive.
+    """
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    try:
+        start, end = parse_date_range()
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date format, expected YYYY-MM-DD"}), 400
+
+    query = StaffAttendance.query
+    if start:
+        query = query.filter(StaffAttendance.created_at >= start, StaffAttendance.created_at < end)
+    records = query.order_by(StaffAttendance.created_at.desc()).all()
+
+    data = [serialize_staff_record(r) for r in records]
+    if start:
+        data = with_archived_records(data, StaffAttendance, User, start, end)
     return jsonify({"success": True, "data": data}), 200
 
 
 @attendance_bp.route("/all/students", methods=["GET"])
 @jwt_required()
+@replica_reads
 def get_all_student_attendance():
-    """Get all student attendance records."""
+    """
+    Get student attendance records, newest first.
+
+    With ?start=/&end= only that range is returned, including months that
+    have been moved to the Parquet archive.
+    """
     claims = get_jwt()
     if claims.get("role") != "ADMIN":
         abort(403, description="Access forbidden: Admins only")
 
-    records = StudentAttendance.query.order_by(StudentAttendance.created_at.desc()).all()
-
-    data = [
-        {
-            "id": r.id,
-            "user_id": r.user_id,
-            "user_name": f"{r.student.firstname} {r.student.lastname}" if r.student else None,
-            "time_in": r.time_in.isoformat() if r.time_in else None,
-            "time_out": r.time_out.isoformat() if r.time_out else None,
-            "status": r.status,
-            "method": r.method
-        } for r in records
-    ]
+    try:
+        start, end = parse_date_range()
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date format, expected YYYY-MM-DD"}), 400
+
+    query = StudentAttendance.query
+    if start:
+        query = query.filter(StudentAttendance.created_at >= start, StudentAttendance.created_at < end)
+    records = query.order_by(StudentAttendance.created_at.desc()).all()
+
+    data = [serialize_student_record(r) for r in records]
+    if start:
+        data = with_archived_records(data, StudentAttendance, Student, start, end)
     return jsonify({"success": True, "data": data}), 200
+
+
+# ---------------------------
+# Analytics Export
+# ---------------------------
+
+@attendance_bp.route("/export", methods=["GET"])
+@jwt_required()
+@replica_reads
+def export_attendance():
+    """
+    Stream attendance as Parquet or Arrow IPC for analytics tools.
+
+    ?kind=staff|students, ?format=parquet|arrow, optional ?start=/&end=
+    (YYYY-MM-DD, archived months included). Rows carry the person's uuid,
+    name and department; department/status/method are dictionary-encoded.
+    """
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    kind = request.args.get("kind", "staff")
+    fmt = request.args.get("format", "parquet")
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        return jsonify({
+            "success": False,
+            "message": f"kind must be one of {sorted(EXPORT_KINDS)} and format one of {sorted(EXPORT_FORMATS)}"
+        }), 400
+
+    try:
+        start, end = parse_date_range()
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date format, expected YYYY-MM-DD"}), 400
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    suffix = f"-{start:%Y%m%d}-{end - timedelta(days=1):%Y%m%d}" if start else ""
+    return Response(
+        stream_with_context(stream_export(kind, fmt, start, end)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=attendance-{kind}{suffix}.{extension}"},
+    )
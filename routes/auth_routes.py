@@ -1,14 +1,16 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, abort
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
     jwt_required,
+    get_jwt,
     get_jwt_identity,
     set_access_cookies,
     set_refresh_cookies,
 )
 from models.models import User
 from app import db, argon2
+from utils.kiosk_auth import issue_kiosk_token, revoke_kiosk_tokens
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -70,3 +72,60 @@ def refresh():
     set_access_cookies(resp, new_access_token)
 
     return resp, 200
+
+
+@auth_bp.route("/kiosk-token", methods=["POST"])
+@jwt_required()
+def create_kiosk_token():
+    """
+    Issue an offline kiosk its credential (admin only).
+
+    Body: {"kiosk_id": ..., "scope": department or [departments], "expires_days": ...}.
+    The token only opens gallery sync and event upload (utils/kiosk_auth.py);
+    the kiosk sends it as the access_token_cookie cookie. Any earlier token of
+    the same kiosk stops working.
+    """
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    data = request.get_json(silent=True) or {}
+    kiosk_id = data.get("kiosk_id")
+    if not isinstance(kiosk_id, str) or not kiosk_id.strip():
+        return jsonify({"error": "kiosk_id is required"}), 400
+    if len(kiosk_id.strip()) > 64:
+        return jsonify({"error": "kiosk_id must be at most 64 characters"}), 400
+
+    scope = data.get("scope")
+    if isinstance(scope, str):
+        scope = [scope]
+    if scope is not None and not (isinstance(scope, list) and all(isinstance(d, str) and d for d in scope)):
+        return jsonify({"error": "scope must be a department name or a list of department names"}), 400
+
+    expires_days = data.get("expires_days")
+    if expires_days is not None and (not isinstance(expires_days, int) or not 1 <= expires_days <= 365):
+        return jsonify({"error": "expires_days must be between 1 and 365"}), 400
+
+    token, lifetime = issue_kiosk_token(kiosk_id.strip(), sorted(set(scope)) if scope else None, expires_days)
+    db.session.commit()
+    return jsonify({
+        "message": "Kiosk token issued",
+        "kiosk_id": kiosk_id.strip(),
+        "scope": sorted(set(scope)) if scope else None,
+        "access_token": token,
+        "expires_in": int(lifetime.total_seconds()),
+    }), 201
+
+
+@auth_bp.route("/kiosk-token/<kiosk_id>", methods=["DELETE"])
+@jwt_required()
+def revoke_kiosk_token(kiosk_id):
+    """Revoke every token issued to a kiosk (admin only), e.g. when it is lost or retired."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    if not revoke_kiosk_tokens(kiosk_id):
+        return jsonify({"error": "Unknown kiosk"}), 404
+    db.session.commit()
+    return jsonify({"message": "Kiosk tokens revoked", "kiosk_id": kiosk_id}), 200
@@ -1,15 +1,12 @@
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, current_app, request, jsonify, abort
 from flask_jwt_extended import jwt_required, get_jwt
 from app import db
 from models.models import User, Biometric
+from utils.metrics import time_matcher
+from utils.probe import read_probe
 import base64
 import json
-import numpy as np
-
-def cosine_similarity(a, b):
-    a, b = np.array(a), np.array(b)
-    dot = np.dot(a, b)
-    return dot / (np.linalg.norm(a) * np.linalg.norm(b))
+import time
 
 biometric_bp = Blueprint("biometrics", __name__, url_prefix="/api/biometrics")
 
@@ -41,6 +38,23 @@ def enroll_biometric():
             elif isinstance(face_template, list):
                 face_json = json.dumps(face_template).encode("utf-8")
 
+        duplicates = []
+        if face_json:
+            from utils.duplicates import enrolment_duplicates, record_duplicates
+            from utils.face_gallery import decode_template
+
+            vector = decode_template(face_json)
+            duplicates = enrolment_duplicates(vector, user) if vector is not None else []
+            if duplicates:
+                reject = (current_app.config.get("DUPLICATE_FACE_ACTION", "reject") == "reject"
+                          and not data.get("allow_duplicate"))
+                record_duplicates(user, duplicates, "rejected" if reject else "flagged")
+                if reject:
+                    return jsonify({
+                        "error": "Face already enrolled for another user",
+                        "duplicates": duplicates,
+                    }), 409
+
         bio = Biometric(
             user=user,
             fingerprint_template=base64.b64decode(fingerprint_template) if fingerprint_template else None,
@@ -50,7 +64,14 @@ def enroll_biometric():
         db.session.add(bio)
         db.session.commit()
 
-        return jsonify({"message": "Biometric enrollment successful"}), 201
+        if face_json:
+            from utils.face_gallery import gallery
+            gallery.invalidate()
+
+        response = {"message": "Biometric enrollment successful"}
+        if duplicates:
+            response["duplicates"] = duplicates
+        return jsonify(response), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": "Failed to enroll biometric data", "details": str(e)}), 500
@@ -59,28 +80,30 @@ def enroll_biometric():
 @biometric_bp.route("/verify/face", methods=["POST"])
 @jwt_required(optional=True)  # allow login attempt without session
 def verify_face():
-    data = request.get_json(silent=True)
-    if not data or "embedding" not in data:
+    """Identify a face; "embedding" may be a JSON array, base64 float32/float16 or an octet-stream body."""
+    try:
+        _, embedding = read_probe("embedding")
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if embedding is None:
         return jsonify({"success": False, "message": "Missing embedding"}), 400
 
-    embedding = data["embedding"]
-    biometrics = Biometric.query.filter(Biometric.face_template.isnot(None)).all()
-    if not biometrics:
+    from utils.face_gallery import gallery
+    from utils.match_telemetry import telemetry
+
+    if gallery.state().size == 0:
         return jsonify({"success": False, "message": "No enrolled faces"}), 200
 
     best_match = None
-    best_score = -1.0
     threshold = 0.65
 
-    for bio in biometrics:
-        try:
-            stored_embedding = json.loads(bio.face_template.decode("utf-8"))
-            score = cosine_similarity(embedding, stored_embedding)
-            if score > best_score:
-                best_match = bio.user
-                best_score = score
-        except Exception as e:
-            continue
+    started = time.perf_counter()
+    with time_matcher("face"):
+        user_id, best_score, runner_up = gallery.match(embedding, runner_up=True)
+    telemetry.record("verify", "gallery", gallery.state().size, best_score, runner_up, threshold,
+                     user_id is not None and best_score >= threshold, time.perf_counter() - started)
+    if user_id is not None:
+        best_match = db.session.get(User, user_id)
 
     if best_match and best_score >= threshold:
         return jsonify({
@@ -0,0 +1,117 @@
+from flask import Blueprint, request, jsonify, abort
+from flask_jwt_extended import jwt_required, get_jwt
+from utils.slow_query import recent_slow_queries, clear_slow_queries
+from utils.db_pool import pool_status, pool_sizing
+from utils.match_telemetry import telemetry
+from utils.memory import memory_report, start_tracing, stop_tracing, top_allocators, tracing_status
+import os
+
+diagnostics_bp = Blueprint("diagnostics", __name__, url_prefix="/api/diagnostics")
+
+
+# ---------------------------
+# Slow SQL
+# ---------------------------
+
+@diagnostics_bp.route("/slow-queries", methods=["GET"])
+@jwt_required()
+def list_slow_queries():
+    """Return the most recent slow SQL statements captured by this worker."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    limit = request.args.get("limit", type=int)
+    return jsonify({"success": True, "data": recent_slow_queries(limit)}), 200
+
+
+@diagnostics_bp.route("/slow-queries", methods=["DELETE"])
+@jwt_required()
+def reset_slow_queries():
+    """Clear this worker's slow query buffer."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    clear_slow_queries()
+    return jsonify({"success": True, "message": "Slow query buffer cleared"}), 200
+
+
+# ---------------------------
+# Connection pool
+# ---------------------------
+
+@diagnostics_bp.route("/pool", methods=["GET"])
+@jwt_required()
+def get_pool_status():
+    """Return this worker's connection pool state and sizing guidance."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    sizing = pool_sizing(
+        workers=request.args.get("workers", type=int),
+        threads=request.args.get("threads", type=int),
+        db_max_connections=request.args.get("db_max_connections", type=int),
+    )
+    return jsonify({"success": True, "pools": pool_status(), "sizing": sizing}), 200
+
+
+# ---------------------------
+# Face match telemetry
+# ---------------------------
+
+@diagnostics_bp.route("/matches", methods=["GET"])
+@jwt_required()
+def get_match_telemetry():
+    """Score histograms and latency percentiles of this worker's recent face matches (?bins=)."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    bins = min(max(request.args.get("bins", 20, type=int), 1), 200)
+    return jsonify({"success": True, "data": telemetry.summary(bins)}), 200
+
+
+# ---------------------------
+# Worker memory
+# ---------------------------
+
+@diagnostics_bp.route("/memory", methods=["GET"])
+@jwt_required()
+def get_memory():
+    """This worker's RSS/PSS, registered cache sizes and (if tracing) top allocators (?limit=&group_by=)."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    group_by = request.args.get("group_by", "lineno")
+    if group_by not in ("lineno", "filename", "traceback"):
+        return jsonify({"success": False, "message": "group_by must be lineno, filename or traceback"}), 400
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 200)
+
+    report = memory_report(allocators=0)
+    if report["tracemalloc"]["enabled"]:
+        report["top_allocators"] = top_allocators(limit, group_by)
+    return jsonify({"success": True, "data": report}), 200
+
+
+@diagnostics_bp.route("/memory/tracemalloc", methods=["POST"])
+@jwt_required()
+def toggle_tracemalloc():
+    """Turn allocation tracing on ({"enabled": true, "frames": n}) or off in this worker."""
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get("enabled"), bool):
+        return jsonify({"success": False, "message": "enabled must be true or false"}), 400
+    if data["enabled"]:
+        frames = data.get("frames", 1)
+        if not isinstance(frames, int) or isinstance(frames, bool) or not 1 <= frames <= 50:
+            return jsonify({"success": False, "message": "frames must be an integer from 1 to 50"}), 400
+        start_tracing(frames)
+    else:
+        stop_tracing()
+    return jsonify({"success": True, "pid": os.getpid(), "tracemalloc": tracing_status()}), 200
@@ -0,0 +1,91 @@
+from flask import Blueprint, request, jsonify, abort, send_file
+from flask_jwt_extended import jwt_required
+
+from utils.kiosk_auth import kiosk_scope, require_admin_or_kiosk
+
+gallery_bp = Blueprint("gallery", __name__, url_prefix="/api/gallery")
+
+
+def _scope_arg():
+    """
+    ?scope=Eng&scope=Ops or ?scope=Eng,Ops → sorted department list, or None.
+
+    A kiosk token's own scope is the default and the limit.
+    """
+    values = [part.strip() for value in request.args.getlist("scope") for part in value.split(",")]
+    values = sorted({v for v in values if v})
+    allowed = kiosk_scope()
+    if allowed:
+        if not set(values) <= set(allowed):
+            abort(403, description="Access forbidden: scope outside this kiosk's departments")
+        return values or sorted(allowed)
+    return values or None
+
+
+# ---------------------------
+# Offline kiosk sync
+# ---------------------------
+
+@gallery_bp.route("/version", methods=["GET"])
+@jwt_required()
+def get_gallery_version():
+    """Return the current gallery version (poll this before asking for deltas)."""
+    require_admin_or_kiosk()
+    from utils.gallery_sync import current_version  # imported lazily: gallery_sync needs numpy
+
+    return jsonify({"success": True, "version": current_version()}), 200
+
+
+@gallery_bp.route("/snapshot", methods=["GET"])
+@jwt_required()
+def download_snapshot():
+    """Download the binary gallery snapshot for a scope at the current version."""
+    require_admin_or_kiosk()
+    from utils.gallery_sync import SNAPSHOT_DTYPES, scope_key, snapshot_file
+
+    dtype = request.args.get("dtype", "float32")
+    if dtype not in SNAPSHOT_DTYPES:
+        return jsonify({"success": False, "message": f"dtype must be one of {sorted(SNAPSHOT_DTYPES)}"}), 400
+
+    scope = _scope_arg()
+    for attempt in range(3):
+        path, version = snapshot_file(scope, dtype)
+        try:
+            response = send_file(
+                path,
+                mimetype="application/octet-stream",
+                as_attachment=True,
+                download_name=f"gallery-v{version}.bin",
+                conditional=True,
+                etag=f"{scope_key(scope)}-{dtype}-v{version}",
+                max_age=0,
+            )
+            break
+        except FileNotFoundError:
+            # Pruned by another worker after several newer versions; build the current one
+            if attempt == 2:
+                raise
+    response.headers["X-Gallery-Version"] = str(version)
+    return response
+
+
+@gallery_bp.route("/delta", methods=["GET"])
+@jwt_required()
+def get_gallery_delta():
+    """Return enrolments and removals in scope since ?since=<version>."""
+    require_admin_or_kiosk()
+    from utils.gallery_sync import changes_since
+
+    since = request.args.get("since", type=int)
+    if since is None or since < 0:
+        return jsonify({"success": False, "message": "since must be a non-negative version"}), 400
+    limit = min(max(request.args.get("limit", 500, type=int), 1), 5000)
+
+    changes, version, has_more = changes_since(since, _scope_arg(), limit)
+    return jsonify({
+        "success": True,
+        "since": since,
+        "version": version,
+        "has_more": has_more,
+        "changes": changes,
+    }), 200
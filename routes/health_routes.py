@@ -0,0 +1,19 @@
+from flask import Blueprint, jsonify
+from utils.startup import is_ready, warm_up_status
+
+health_bp = Blueprint("health", __name__, url_prefix="/api/health")
+
+
+@health_bp.route("/live", methods=["GET"])
+def live():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"success": True, "status": "live"}), 200
+
+
+@health_bp.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: only true once warm-up (gallery load + dummy match) has finished."""
+    status = warm_up_status()
+    if not is_ready():
+        return jsonify({"success": False, "status": status["state"], "warm_up": status}), 503
+    return jsonify({"success": True, "status": "ready", "warm_up": status}), 200
@@ -0,0 +1,86 @@
+import os
+
+from flask import Blueprint, request, jsonify, abort, send_file
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from models.models import Job, User
+from utils.jobs import runner, QueueFull
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/api/jobs")
+
+
+def _require_admin():
+    claims = get_jwt()
+    if claims.get("role") != "ADMIN":
+        abort(403, description="Access forbidden: Admins only")
+
+
+def _get_job_or_404(job_uuid):
+    job = Job.query.filter_by(uuid=job_uuid).first()
+    if not job:
+        abort(404, description="Job not found")
+    return job
+
+
+# ---------------------------
+# Background jobs
+# ---------------------------
+
+@jobs_bp.route("", methods=["POST"])
+@jwt_required()
+def submit_job():
+    """Queue a job: {"type": "monthly_timesheet", "params": {...}} → 202 with the job to poll."""
+    _require_admin()
+
+    data = request.get_json(silent=True) or {}
+    if not data.get("type"):
+        return jsonify({"success": False, "message": "type is required"}), 400
+
+    user = User.query.filter_by(uuid=get_jwt_identity()).first()
+    try:
+        job = runner.submit(data["type"], data.get("params") or {}, user.id if user else None)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except QueueFull:
+        return jsonify({"success": False, "message": "Too many queued jobs, try again later"}), 503
+
+    return jsonify({"success": True, "job": job.to_dict()}), 202
+
+
+@jobs_bp.route("", methods=["GET"])
+@jwt_required()
+def list_jobs():
+    """Most recent jobs, optionally ?status= / ?type=."""
+    _require_admin()
+
+    query = Job.query
+    if request.args.get("status"):
+        query = query.filter(Job.status == request.args["status"].upper())
+    if request.args.get("type"):
+        query = query.filter(Job.type == request.args["type"])
+    limit = min(max(request.args.get("limit", 50, type=int), 1), 500)
+
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+    return jsonify({"success": True, "jobs": [j.to_dict() for j in jobs]}), 200
+
+
+@jobs_bp.route("/<job_uuid>", methods=["GET"])
+@jwt_required()
+def get_job(job_uuid):
+    """Poll a job's status and progress."""
+    _require_admin()
+    return jsonify({"success": True, "job": _get_job_or_404(job_uuid).to_dict()}), 200
+
+
+@jobs_bp.route("/<job_uuid>/download", methods=["GET"])
+@jwt_required()
+def download_job_result(job_uuid):
+    """Download a finished job's output file."""
+    _require_admin()
+
+    job = _get_job_or_404(job_uuid)
+    if job.status != "SUCCEEDED":
+        return jsonify({"success": False, "message": f"Job is {job.status.lower()}"}), 409
+    if not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({"success": False, "message": "Result has expired or is not on this server"}), 410
+
+    return send_file(job.result_path, as_attachment=True, download_name=job.result_name)
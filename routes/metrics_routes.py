@@ -0,0 +1,17 @@
+import hmac
+from flask import Blueprint, Response, current_app, request, abort
+from utils.metrics import render_latest
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied, token):
+            abort(401, description="Invalid metrics token")
+
+    return Response(render_latest(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, abort
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from models.models import User, Credential, Student
 from app import db, argon2
+from utils.replica import replica_reads
 
 # Blueprint with url_prefix and no strict slash issues
 user_bp = Blueprint("users", __name__, url_prefix="/api/users")
@@ -119,6 +120,7 @@ def enroll_student():
 # ---------------------------
 @user_bp.route("/staff", methods=["GET"], strict_slashes=False)
 @jwt_required()
+@replica_reads
 def get_all_staff():
     claims = get_jwt()
     role = claims.get("role")
@@ -146,6 +148,7 @@ def get_all_staff():
 # ---------------------------
 @user_bp.route("/students", methods=["GET"], strict_slashes=False)
 @jwt_required()
+@replica_reads
 def get_all_students():
     claims = get_jwt()
     role = claims.get("role")
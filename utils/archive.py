@@ -0,0 +1,332 @@
+"""
+Cold archival of old attendance rows to monthly Parquet files.
+
+Whole months older than ATTENDANCE_RETENTION_DAYS are copied, in batches, from
+staff_attendance / student_attendance into ARCHIVE_DIR/<table>/<YYYY-MM>.parquet
+and then deleted from the hot table. Files are sorted by created_at and
+written in small row groups, so a date-range read only decodes the row
+groups (and columns) it needs. manifest.json lists every archived month with
+its row count and created_at bounds; readers use it to decide which files a
+range touches without opening any of them.
+
+Crash safety: a month's file and the manifest are replaced atomically before
+any row is deleted. Re-running after a failure merges the remaining rows into
+the existing file (deduplicated by id) and finishes the deletes.
+
+Memory: the month is read in keyset batches in (created_at, id) order and
+merged with the existing file, read one row group at a time, straight into a
+ParquetWriter; only the month's ids are held whole.
+
+pyarrow is imported lazily: workers that never read an archived month do not
+load it.
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+from flask import current_app
+
+from app import db
+from utils import memory
+
+MANIFEST = "manifest.json"
+
+_manifest_lock = threading.Lock()
+_manifest_cache = {"mtime": None, "data": None}
+memory.register_cache(
+    "archive_manifest",
+    lambda: memory.deep_sizeof(_manifest_cache["data"]) if _manifest_cache["data"] is not None else None,
+)
+
+
+# ---------------------------
+# Layout / manifest
+# ---------------------------
+
+def archive_dir():
+    return current_app.config.get("ARCHIVE_DIR") or os.path.join(current_app.root_path, "archive")
+
+
+def _month_key(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def _month_bounds(key):
+    year, month = (int(part) for part in key.split("-"))
+    start = datetime(year, month, 1)
+    end = datetime(year + (month == 12), month % 12 + 1, 1)
+    return start, end
+
+
+def load_manifest():
+    """Return {"tables": {table: {month: entry}}}, cached until the file changes."""
+    path = os.path.join(archive_dir(), MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {"tables": {}}
+
+    with _manifest_lock:
+        if _manifest_cache["mtime"] != mtime:
+            with open(path) as fh:
+                _manifest_cache["data"] = json.load(fh)
+            _manifest_cache["mtime"] = mtime
+        return _manifest_cache["data"]
+
+
+def _save_manifest(manifest):
+    directory = archive_dir()
+    os.makedirs(directory, exist_ok=True)
+    tmp = os.path.join(directory, MANIFEST + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+
+def archived_months(model, start=None, end=None):
+    """Manifest entries of `model`'s archived months overlapping [start, end)."""
+    months = load_manifest()["tables"].get(model.__tablename__, {})
+    selected = []
+    for key in sorted(months):
+        month_start, month_end = _month_bounds(key)
+        if (start is None or month_end > start) and (end is None or month_start < end):
+            selected.append(dict(months[key], month=key))
+    return selected
+
+
+# ---------------------------
+# Schema
+# ---------------------------
+
+def _arrow_schema(table):
+    import pyarrow as pa
+
+    fields = []
+    for column in table.columns:
+        kind = column.type.python_type
+        if kind is datetime:
+            arrow_type = pa.timestamp("us")
+        elif kind is date:
+            arrow_type = pa.date32()
+        elif kind is int:
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+# ---------------------------
+# Archival
+# ---------------------------
+
+def archive_cutoff(retention_days=None, now=None):
+    """First day of the oldest month that must stay hot (naive UTC)."""
+    if retention_days is None:
+        retention_days = current_app.config.get("ATTENDANCE_RETENTION_DAYS", 400)
+    horizon = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    return datetime(horizon.year, horizon.month, 1)
+
+
+def _month_rows(table, in_month, batch_size, schema):
+    """Yield the month's hot rows as pyarrow tables, keyset-paged in (created_at, id) order."""
+    import pyarrow as pa
+
+    order = (table.c.created_at, table.c.id)
+    last = None
+    while True:
+        query = db.select(table).where(in_month)
+        if last is not None:
+            query = query.where(db.tuple_(*order) > last)
+        rows = db.session.execute(query.order_by(*order).limit(batch_size)).mappings().all()
+        if not rows:
+            return
+        last = (rows[-1]["created_at"], rows[-1]["id"])
+        yield pa.Table.from_pylist([dict(r) for r in rows], schema=schema)
+
+
+def _file_rows(path, replaced_ids, schema):
+    """Yield an existing month file one row group at a time, minus the rows being re-archived."""
+    if not os.path.exists(path):
+        return
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    replaced = pa.array(sorted(replaced_ids), pa.int64())
+    parquet = pq.ParquetFile(path)
+    for i in range(parquet.num_row_groups):
+        group = parquet.read_row_group(i).select(schema.names).cast(schema)
+        yield group.filter(pc.invert(pc.is_in(group["id"], value_set=replaced)))
+
+
+def _merge_sorted(schema, *sources):
+    """
+    Merge sources of (created_at, id)-sorted tables into sorted chunks, holding
+    about one chunk per source: a row is released once no source can still
+    produce a smaller one.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    sources = [iter(source) for source in sources]
+    frontier = {}  # live source → key of the last row read from it
+    buffer = schema.empty_table()
+
+    def pull(i):
+        for chunk in sources[i]:
+            if chunk.num_rows:
+                frontier[i] = (chunk["created_at"][-1].as_py(), chunk["id"][-1].as_py())
+                return chunk
+        frontier.pop(i, None)
+        return None
+
+    for i in range(len(sources)):
+        chunk = pull(i)
+        if chunk is not None:
+            buffer = pa.concat_tables([buffer, chunk])
+
+    while frontier:
+        buffer = buffer.sort_by([("created_at", "ascending"), ("id", "ascending")])
+        created, row_id = min(frontier.values())
+        bound = pa.scalar(created, type=schema.field("created_at").type)
+        ready = pc.or_(
+            pc.less(buffer["created_at"], bound),
+            pc.and_(pc.equal(buffer["created_at"], bound), pc.less_equal(buffer["id"], row_id)),
+        )
+        count = pc.sum(ready).as_py() or 0
+        if count:
+            yield buffer.slice(0, count)
+            buffer = buffer.slice(count)
+        chunk = pull(min(frontier, key=frontier.get))
+        if chunk is not None:
+            buffer = pa.concat_tables([buffer, chunk])
+
+    if buffer.num_rows:
+        yield buffer.sort_by([("created_at", "ascending"), ("id", "ascending")])
+
+
+def _write_month(model, key, fresh, replaced_ids, schema):
+    """
+    Merge the month's hot rows (`fresh`, sorted) into its file, atomically, and
+    return the manifest entry. Rows stream through a ParquetWriter; neither the
+    month nor the existing file is ever held whole.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table_dir = os.path.join(archive_dir(), model.__tablename__)
+    os.makedirs(table_dir, exist_ok=True)
+    path = os.path.join(table_dir, f"{key}.parquet")
+    row_group_size = current_app.config.get("ARCHIVE_ROW_GROUP_SIZE", 10000)
+
+    rows, first, last = 0, None, None
+    pending, pending_rows = [], 0
+    tmp = path + ".tmp"
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        for chunk in _merge_sorted(schema, _file_rows(path, replaced_ids, schema), fresh):
+            if first is None:
+                first = chunk["created_at"][0].as_py()
+            last = chunk["created_at"][-1].as_py()
+            rows += chunk.num_rows
+            pending.append(chunk)
+            pending_rows += chunk.num_rows
+            if pending_rows >= row_group_size:
+                # Full row groups now; the remainder waits for the next chunk
+                merged = pa.concat_tables(pending)
+                full = pending_rows - pending_rows % row_group_size
+                writer.write_table(merged.slice(0, full), row_group_size=row_group_size)
+                pending, pending_rows = [merged.slice(full)], pending_rows - full
+        if pending_rows:
+            writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+    os.replace(tmp, path)
+
+    return {
+        "file": os.path.join(model.__tablename__, f"{key}.parquet"),
+        "rows": rows,
+        "min_created_at": first.isoformat() if first else None,
+        "max_created_at": last.isoformat() if last else None,
+        "row_groups": pq.ParquetFile(path).num_row_groups,
+        "bytes": os.path.getsize(path),
+        "archived_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def archive_model(model, cutoff, batch_size=None, dry_run=False, log=print):
+    """Move `model` rows created before `cutoff` to monthly Parquet files."""
+    table = model.__table__
+    batch_size = batch_size or current_app.config.get("ARCHIVE_BATCH_SIZE", 5000)
+    created_at, row_id = table.c.created_at, table.c.id
+
+    oldest = db.session.execute(db.select(db.func.min(created_at)).where(created_at < cutoff)).scalar()
+    if oldest is None:
+        log(f"{table.name}: nothing older than {cutoff:%Y-%m-%d}")
+        return {}
+
+    schema = _arrow_schema(table)
+    summary = {}
+    key = _month_key(oldest)
+    while _month_bounds(key)[0] < cutoff:
+        month_start, month_end = _month_bounds(key)
+        in_month = (created_at >= month_start) & (created_at < month_end)
+
+        if dry_run:
+            count = db.session.execute(db.select(db.func.count()).where(in_month)).scalar()
+            log(f"{table.name} {key}: would archive {count} rows")
+            summary[key] = count
+        else:
+            # The ids first: they replace any copy already in the file (a re-run
+            # after a failure) and are deleted once the file is safely in place
+            ids = db.session.execute(db.select(row_id).where(in_month).order_by(row_id)).scalars().all()
+            if ids:
+                entry = _write_month(model, key, _month_rows(table, in_month, batch_size, schema), set(ids), schema)
+                manifest = load_manifest()
+                manifest = {"tables": {name: dict(months) for name, months in manifest["tables"].items()}}
+                manifest["tables"].setdefault(table.name, {})[key] = entry
+                _save_manifest(manifest)
+
+                for i in range(0, len(ids), batch_size):
+                    db.session.execute(table.delete().where(row_id.in_(ids[i:i + batch_size])))
+                    db.session.commit()
+                log(f"{table.name} {key}: archived {len(ids)} rows ({entry['rows']} in file)")
+            summary[key] = len(ids)
+
+        key = _month_key(month_end)
+    return summary
+
+
+# ---------------------------
+# Reads
+# ---------------------------
+
+def iter_archived(model, start, end, columns=None, filters=None):
+    """
+    Yield, one archived month at a time, pyarrow tables of `model` rows with
+    start <= created_at < end.
+
+    Only months the manifest says overlap the range are opened; within a file
+    pyarrow skips row groups whose created_at statistics fall outside it and
+    decodes only `columns`. `filters` adds extra (column, op, value) predicates.
+    """
+    months = archived_months(model, start, end)
+    if not months:
+        return
+
+    import pyarrow.parquet as pq
+
+    root = archive_dir()
+    predicates = [("created_at", ">=", start), ("created_at", "<", end)] + list(filters or [])
+    for month in months:
+        yield pq.read_table(os.path.join(root, month["file"]), columns=columns, filters=predicates)
+
+
+def read_archived(model, start, end, columns=None, filters=None):
+    """Rows of `model` archived with start <= created_at < end, as dicts."""
+    rows = []
+    for table in iter_archived(model, start, end, columns, filters):
+        rows.extend(table.to_pylist())
+    return rows
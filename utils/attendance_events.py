@@ -0,0 +1,265 @@
+"""
+Fan-out of committed attendance changes to live dashboards (SSE).
+
+Every worker feeds its own broker from the shared change_seq cursor: once a
+worker serves its first stream it polls the attendance changes past its
+cursor (up to the visibility watermark, see /api/attendance/changes) every
+ATTENDANCE_STREAM_POLL_SECONDS and publishes them, so each worker publishes
+every committed change, whichever worker or process wrote it. One poll is a
+single indexed range read per table. A poll that finds more than
+ATTENDANCE_STREAM_FEED_BATCH changes (the end-of-day closer, bulk marking)
+publishes one "reload" event instead, and dashboards reload their snapshot.
+
+Every subscriber (one per open /api/attendance/stream connection) gets its
+own bounded buffer: a dashboard that stops reading is dropped instead of
+growing memory, and it reconnects with Last-Event-ID to resume from the
+recent-history ring. If the id is older than the ring, or from another
+worker or before a restart, the subscriber is told to "reset" (reload the
+today snapshot) rather than silently missing events. A forked worker starts
+with a fresh broker and its own id epoch, so ids from a sibling never resume.
+
+Each open stream holds a server thread; see max_streams().
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+
+from utils import memory, metrics
+
+logger = logging.getLogger("attendance_events")
+
+DROPPED = metrics.counter(
+    "attendance_stream_dropped_total",
+    "SSE subscribers disconnected because their buffer was full.",
+)
+
+
+class StreamFull(Exception):
+    """Raised when this worker already serves max_streams() subscribers."""
+
+
+def max_streams(config):
+    """
+    Streams one worker may hold open. Each stream occupies one of the worker's
+    GUNICORN_THREADS threads until the client leaves, so two are always left
+    for ordinary requests (none for single-threaded workers).
+    """
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
+    return max(min(config.get("ATTENDANCE_STREAM_MAX_SUBSCRIBERS", threads - 2), threads - 2), 0)
+
+
+class _Subscriber:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.events = deque()
+        self.wake = threading.Event()
+        self.reset = False
+        self.lagged = False
+        self.start_seq = None
+
+    def offer(self, event):
+        if len(self.events) >= self.capacity:
+            self.lagged = True
+            self.wake.set()
+            return False
+        self.events.append(event)
+        self.wake.set()
+        return True
+
+
+def _new_epoch():
+    # Ids from a previous or sibling worker never resume
+    return f"{int(time.time() * 1000):x}p{os.getpid():x}"
+
+
+def change_action(record):
+    """What a changed attendance row now says: sign_out, sign_in, or its status (absent)."""
+    if record.get("time_out"):
+        return "sign_out"
+    if record.get("time_in"):
+        return "sign_in"
+    return (record.get("status") or "update").lower()
+
+
+class AttendanceBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._epoch = _new_epoch()
+        self._seq = 0
+        self._history = None
+        self._subscribers = set()
+        self._source = None
+        self._cursor = None
+        self._feed = None
+
+    def _after_fork(self):
+        # The parent's subscribers, history and feed thread belong to the parent
+        source = self._source
+        self.__init__()
+        self._source = source
+
+    def attach_source(self, changes, watermark):
+        """
+        Feed from changes(since, limit) → (changes, next_since, has_more) and
+        watermark() → the cursor to start from; both run in an app context.
+        """
+        self._source = (changes, watermark)
+
+    def _ring(self):
+        if self._history is None:
+            self._history = deque(maxlen=current_app.config.get("ATTENDANCE_STREAM_HISTORY", 1000))
+        return self._history
+
+    def event_id(self, seq):
+        return f"{self._epoch}-{seq}"
+
+    def _parse_id(self, last_event_id):
+        epoch, _, seq = (last_event_id or "").partition("-")
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, data):
+        """Assign the next event id and hand the event to every subscriber."""
+        payload = json.dumps(data, default=str)
+        with self._lock:
+            self._seq += 1
+            event = (self._seq, payload)
+            self._ring().append(event)
+            for subscriber in list(self._subscribers):
+                if not subscriber.offer(event):
+                    self._subscribers.discard(subscriber)
+                    DROPPED.inc()
+        return self.event_id(event[0])
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber, pre-filled with the events after last_event_id."""
+        config = current_app.config
+        self._ensure_feed()
+        with self._lock:
+            if len(self._subscribers) >= max_streams(config):
+                raise StreamFull()
+
+            subscriber = _Subscriber(config.get("ATTENDANCE_STREAM_BUFFER", 256))
+            if last_event_id:
+                history = self._ring()
+                seq = self._parse_id(last_event_id)
+                oldest = history[0][0] if history else self._seq + 1
+                if seq is None or seq > self._seq or seq < oldest - 1:
+                    subscriber.reset = True
+                else:
+                    backlog = [event for event in history if event[0] > seq]
+                    if len(backlog) > subscriber.capacity:
+                        subscriber.reset = True
+                    else:
+                        subscriber.events.extend(backlog)
+            else:
+                subscriber.start_seq = self._seq
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber, heartbeat=15.0):
+        """Yield SSE frames for a subscriber until it lags or the client goes away."""
+        try:
+            # A fresh stream starts at the current id; a resumed one keeps the client's
+            start = f"id: {self.event_id(subscriber.start_seq)}\n" if subscriber.start_seq is not None else ""
+            yield f"retry: 3000\n{start}event: ready\ndata: {{}}\n\n"
+            if subscriber.reset:
+                yield "event: reset\ndata: {}\n\n"
+                return
+            while True:
+                if not subscriber.events and not subscriber.lagged:
+                    if not subscriber.wake.wait(heartbeat):
+                        yield ": keep-alive\n\n"
+                        continue
+                subscriber.wake.clear()
+                while subscriber.events:
+                    seq, payload = subscriber.events.popleft()
+                    yield f"id: {self.event_id(seq)}\ndata: {payload}\n\n"
+                if subscriber.lagged:
+                    # Dropped by publish(): reconnecting with Last-Event-ID resumes or resets
+                    return
+        finally:
+            self.unsubscribe(subscriber)
+
+    # ---------------------------
+    # Change feed
+    # ---------------------------
+
+    def _ensure_feed(self):
+        if self._source is None or (self._feed is not None and self._feed[1] == os.getpid()):
+            return
+        with self._lock:
+            if self._feed is not None and self._feed[1] == os.getpid():
+                return
+            # Start at the current watermark: a new dashboard loads its snapshot first
+            self._cursor = self._source[1]()
+            thread = threading.Thread(
+                target=self._feed_loop, args=(current_app._get_current_object(),),
+                name="attendance-feed", daemon=True,
+            )
+            self._feed = (thread, os.getpid())
+            thread.start()
+
+    def _feed_loop(self, app):
+        changes, watermark = self._source
+        while True:
+            time.sleep(app.config.get("ATTENDANCE_STREAM_POLL_SECONDS", 1.0))
+            try:
+                with app.app_context():
+                    self.poll(changes, watermark, app.config.get("ATTENDANCE_STREAM_FEED_BATCH", 100))
+            except Exception:
+                logger.exception("Attendance change feed poll failed; retrying")
+
+    def poll(self, changes, watermark, batch):
+        """Publish the changes past the cursor (one "reload" event for more than `batch`)."""
+        rows, next_since, has_more = changes(self._cursor, batch)
+        if has_more:
+            upto = watermark()
+            self.publish({"kind": "batch", "action": "reload", "record": {"since": self._cursor, "until": upto}})
+            self._cursor = upto
+            return
+        for change in rows:
+            record = change["record"]
+            self.publish({"kind": change["kind"], "action": change_action(record), "seq": change["seq"],
+                          "record": record})
+        self._cursor = next_since
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "last_event_id": self.event_id(self._seq),
+                "history": len(self._history or ()),
+                "cursor": self._cursor,
+                "buffered": sum(len(s.events) for s in self._subscribers),
+            }
+
+
+broker = AttendanceBroker()
+os.register_at_fork(after_in_child=broker._after_fork)
+
+metrics.gauge(
+    "attendance_stream_subscribers",
+    "Open attendance SSE streams in this worker.",
+    callback=lambda: {(): broker.stats()["subscribers"]},
+)
+
+
+def _stream_bytes():
+    # Subscriber queues share their event tuples with the history ring
+    with broker._lock:
+        return memory.deep_sizeof([broker._history or (), *(s.events for s in broker._subscribers)])
+
+
+memory.register_cache("attendance_stream", _stream_bytes)
@@ -0,0 +1,191 @@
+"""
+Database connection pool profiles, sizing guidance and health reporting.
+
+Engine options are derived per environment (see engine_options) unless
+SQLALCHEMY_ENGINE_OPTIONS is set explicitly. The pool class times every
+connection acquisition so exhaustion shows up as wait time in /metrics and
+/api/diagnostics/pool rather than as kiosk timeouts.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from utils import metrics
+
+POOL_ACQUIRE = metrics.histogram(
+    "db_pool_acquire_seconds",
+    "Time to get a connection from the pool (includes connect for new connections).",
+    ("bind",),
+    (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+POOL_TIMEOUTS = metrics.counter("db_pool_timeouts_total", "Pool checkouts that hit pool_timeout.", ("bind",))
+
+_engines = {}
+
+
+# ---------------------------
+# Instrumented pool
+# ---------------------------
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits."""
+
+    bind_name = "default"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self._waits = deque(maxlen=1000)
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.bind_name = self.bind_name
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc(bind=self.bind_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            POOL_ACQUIRE.observe(elapsed, bind=self.bind_name)
+            with self._wait_lock:
+                self._waits.append(elapsed)
+                self._wait_count += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+
+    def wait_stats(self):
+        with self._wait_lock:
+            recent = sorted(self._waits)
+            count, total, worst = self._wait_count, self._wait_total, self._wait_max
+        p95 = recent[int(0.95 * (len(recent) - 1))] if recent else 0.0
+        return {
+            "checkouts": count,
+            "avg_ms": round(total / count * 1000, 3) if count else 0.0,
+            "p95_recent_ms": round(p95 * 1000, 3),
+            "max_ms": round(worst * 1000, 3),
+        }
+
+
+# ---------------------------
+# Sizing guidance
+# ---------------------------
+
+def pool_sizing(workers=None, threads=None, db_max_connections=None, reserved=None):
+    """
+    Per-worker pool sizing from the server's worker/thread counts.
+
+    Each request thread holds at most one connection, plus one for background
+    work (jobs, schedulers). Overflow absorbs short bursts, but the total over
+    all workers must stay under the database's max_connections minus a
+    reserve for migrations, psql sessions and replicas.
+    """
+    workers = workers or int(os.getenv("WEB_CONCURRENCY", "2"))
+    threads = threads or int(os.getenv("GUNICORN_THREADS", "4"))
+    db_max_connections = db_max_connections or int(os.getenv("DB_MAX_CONNECTIONS", "100"))
+    reserved = reserved if reserved is not None else int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))
+
+    budget = max(db_max_connections - reserved, workers)
+    per_worker_budget = max(budget // workers, 1)
+    pool_size = min(threads + 1, per_worker_budget)
+    max_overflow = max(min(threads, per_worker_budget - pool_size), 0)
+
+    return {
+        "workers": workers,
+        "threads_per_worker": threads,
+        "db_max_connections": db_max_connections,
+        "reserved_connections": reserved,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "total_steady_connections": pool_size * workers,
+        "total_peak_connections": (pool_size + max_overflow) * workers,
+    }
+
+
+def engine_options(env, config):
+    """Return SQLALCHEMY_ENGINE_OPTIONS for the environment."""
+    sizing = pool_sizing()
+
+    if env == "production":
+        defaults = {
+            "pool_size": sizing["pool_size"],
+            "max_overflow": sizing["max_overflow"],
+            "pool_timeout": 10,
+            "pool_recycle": 1800,   # below typical proxy/firewall idle cut-offs
+            "pool_pre_ping": True,  # survives DB restarts and idle nights
+        }
+    else:
+        defaults = {
+            "pool_size": 2,
+            "max_overflow": 3,
+            "pool_timeout": 30,
+            "pool_recycle": 3600,
+            "pool_pre_ping": True,
+        }
+
+    overrides = {
+        "pool_size": config.get("DB_POOL_SIZE"),
+        "max_overflow": config.get("DB_MAX_OVERFLOW"),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT"),
+        "pool_recycle": config.get("DB_POOL_RECYCLE"),
+    }
+    options = {**defaults, **{k: v for k, v in overrides.items() if v is not None}}
+    options["poolclass"] = InstrumentedQueuePool
+    return options
+
+
+# ---------------------------
+# Health surface
+# ---------------------------
+
+def register_engines(engines):
+    """Remember the app's engines (bind key → engine) for reporting."""
+    for key, engine in engines.items():
+        name = key or "default"
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            engine.pool.bind_name = name
+        _engines[name] = engine
+
+
+def pool_status():
+    status = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        entry = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        if isinstance(pool, InstrumentedQueuePool):
+            entry["wait"] = pool.wait_stats()
+        status[name] = entry
+    return status
+
+
+def _gauge(field):
+    def read():
+        return {(name,): entry[field] for name, entry in pool_status().items() if field in entry}
+    return read
+
+
+metrics.gauge("db_pool_size", "Configured pool size.", ("bind",), _gauge("size"))
+metrics.gauge("db_pool_checked_out", "Connections currently checked out.", ("bind",), _gauge("checked_out"))
+metrics.gauge("db_pool_checked_in", "Idle connections in the pool.", ("bind",), _gauge("checked_in"))
+metrics.gauge("db_pool_overflow", "Overflow connections currently open.", ("bind",), _gauge("overflow"))
@@ -0,0 +1,133 @@
+"""
+Duplicate face detection.
+
+At enrolment the new face is searched against the gallery (top
+DUPLICATE_FACE_TOP_K users, the enrollee's own templates excluded). If any
+other user scores at least DUPLICATE_FACE_THRESHOLD the enrolment is rejected
+with 409 (DUPLICATE_FACE_ACTION = "reject"; an admin can resend with
+"allow_duplicate": true, e.g. for twins) or stored and reported in the
+response ("flag"). Either way the near-duplicates are logged and counted.
+
+The "duplicate_audit" job finds every pair of different users whose
+templates score at least the threshold across the whole gallery, tile by tile
+(utils/similarity.pairs_above), and writes one CSV row per user pair with its
+best score.
+"""
+
+import csv
+import logging
+
+from flask import current_app
+
+from app import db
+from models.models import User
+from utils import metrics
+from utils.jobs import job_type
+
+logger = logging.getLogger("duplicates")
+
+DUPLICATES_FOUND = metrics.counter(
+    "face_enrolment_duplicates_total",
+    "Face enrolments that matched another user, by action taken.",
+    ("action",),
+)
+
+
+def enrolment_duplicates(vector, user):
+    """Other users whose enrolled faces score at least the threshold against `vector`, best first."""
+    config = current_app.config
+    if config.get("DUPLICATE_FACE_ACTION", "reject") == "off":
+        return []
+
+    from utils.face_gallery import gallery  # imported lazily: the gallery needs numpy
+
+    threshold = config.get("DUPLICATE_FACE_THRESHOLD", 0.65)
+    nearest = gallery.nearest(vector, config.get("DUPLICATE_FACE_TOP_K", 5), exclude_user=user.id)
+    hits = [(user_id, score) for user_id, _, score in nearest if score >= threshold]
+    if not hits:
+        return []
+
+    people = {u.id: u for u in User.query.filter(User.id.in_([user_id for user_id, _ in hits]))}
+    return [
+        {
+            "user_uuid": people[user_id].uuid,
+            "firstname": people[user_id].firstname,
+            "lastname": people[user_id].lastname,
+            "score": round(score, 4),
+        }
+        for user_id, score in hits
+        if user_id in people
+    ]
+
+
+def record_duplicates(user, duplicates, action):
+    DUPLICATES_FOUND.inc(action=action)
+    logger.warning(
+        "Face enrolment for %s matches %s (%s)", user.uuid,
+        ", ".join(f"{d['user_uuid']}={d['score']}" for d in duplicates), action,
+    )
+
+
+# ---------------------------
+# Gallery-wide audit job
+# ---------------------------
+
+def _validate_audit(params):
+    value = params.get("threshold")
+    if value is None:
+        return {}
+    try:
+        threshold = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("threshold must be a number")
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold must be in (0, 1]")
+    return {"threshold": threshold}
+
+
+@job_type("duplicate_audit", max_attempts=2, validate=_validate_audit)
+def duplicate_audit(ctx):
+    from utils.face_gallery import gallery
+    from utils.similarity import pairs_above
+
+    threshold = ctx.params.get("threshold") or current_app.config.get("DUPLICATE_FACE_THRESHOLD", 0.65)
+    state = gallery.state()
+
+    # Best score per unordered user pair
+    best = {}
+    for rows, cols, scores in pairs_above(
+        state.matrix, state.user_ids, threshold,
+        progress=lambda done, total: ctx.progress(0.9 * done / total),
+    ):
+        for i, j, score in zip(rows, cols, scores):
+            a, b = int(state.user_ids[i]), int(state.user_ids[j])
+            if a > b:
+                a, b, i, j = b, a, j, i
+            if score > best.get((a, b), (-1.0,))[0]:
+                best[(a, b)] = (float(score), int(state.biometric_ids[i]), int(state.biometric_ids[j]))
+
+    user_ids = {user_id for pair in best for user_id in pair}
+    people = {}
+    if user_ids:
+        people = {
+            row.id: row
+            for row in db.session.query(User.id, User.uuid, User.firstname, User.lastname, User.department)
+            .filter(User.id.in_(user_ids))
+        }
+
+    with open(ctx.output_path(f"duplicate-faces-{threshold:.2f}.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            "score", "user_a_uuid", "user_a_name", "user_a_department", "biometric_a",
+            "user_b_uuid", "user_b_name", "user_b_department", "biometric_b",
+        ])
+        for (a, b), (score, bio_a, bio_b) in sorted(best.items(), key=lambda item: -item[1][0]):
+            row = [f"{score:.4f}"]
+            for user_id, bio_id in ((a, bio_a), (b, bio_b)):
+                person = people.get(user_id)
+                row += [
+                    person.uuid if person else "", f"{person.firstname} {person.lastname}" if person else "",
+                    person.department if person else "", bio_id,
+                ]
+            writer.writerow(row)
+    logger.info("Duplicate audit at %.2f: %d user pairs over %d templates", threshold, len(best), state.size)
@@ -0,0 +1,206 @@
+"""
+End-of-day closer: automatic sign-out and absence marking in set-based SQL.
+
+For one day (UTC) it:
+  * closes open records (signed in, never signed out) at OFFICE_CLOSE; staff
+    get SIGNED_OUT, students keep their status as with a manual sign-out;
+  * inserts an ABSENT row (no time_in) for every staff member and student
+    without a record that day: one INSERT ... SELECT ... WHERE NOT EXISTS per
+    table.
+
+That is a handful of statements whatever the headcount, all in one
+transaction, and the run is idempotent: a second run finds nothing open and
+nobody missing. Someone who signs in after the run updates their ABSENT row,
+which is the day's record: staff get ON_TIME/LATE, students SIGNED_IN
+(check_end_of_day.py exercises both). On PostgreSQL the run holds a transaction-level
+advisory lock, so when every worker's scheduler fires only one does the work.
+
+Runs from the in-process scheduler at END_OF_DAY_AT, from close_day.py, or as
+the "end_of_day" background job.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from app import db
+from models.models import User, Student, StaffAttendance, StudentAttendance, bulk_change_seq
+from routes.attendance_route import OFFICE_CLOSE
+from utils.jobs import job_type
+
+logger = logging.getLogger("end_of_day")
+
+# pg_try_advisory_xact_lock key ("EOD")
+ADVISORY_LOCK_KEY = 0x454F44
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+def _targets(day):
+    """(name, attendance model, person model, people filter, day filter, extra ABSENT columns) per table."""
+    start = datetime(day.year, day.month, day.day)
+    return [
+        ("staff", StaffAttendance, User, [User.role == "STAFF"],
+         [StaffAttendance.created_at >= start, StaffAttendance.created_at < start + timedelta(days=1)], {}),
+        ("students", StudentAttendance, Student, [],
+         [StudentAttendance.date == day], {"date": day}),
+    ]
+
+
+def _id_range(connection, id_column, where):
+    """(rows, min id, max id) of the rows a statement will touch."""
+    return connection.execute(
+        db.select(db.func.count(id_column), db.func.min(id_column), db.func.max(id_column)).where(*where)
+    ).one()
+
+
+def _close_open(connection, model, day_filter, close_at, dry_run):
+    where = [*day_filter, model.time_in.isnot(None), model.time_out.is_(None)]
+    rows, low, high = _id_range(connection, model.id, where)
+    if dry_run or not rows:
+        return rows
+
+    values = {
+        # A sign-in after closing time is closed at the sign-in itself
+        "time_out": db.case((model.time_in > close_at, model.time_in), else_=close_at),
+        "change_seq": bulk_change_seq(connection, model.id, low, high),
+    }
+    if model is StaffAttendance:
+        values["status"] = "SIGNED_OUT"
+    return connection.execute(db.update(model).where(*where).values(**values)).rowcount
+
+
+def _mark_absent(connection, model, person, people_filter, day_filter, extra, start, dry_run):
+    record_exists = db.select(model.id).where(model.user_id == person.id, *day_filter).exists()
+    where = [*people_filter, ~record_exists]
+    rows, low, high = _id_range(connection, person.id, where)
+    if dry_run or not rows:
+        return rows
+
+    columns = ["user_id", "created_at", "status", "change_seq", *extra]
+    select = db.select(
+        person.id,
+        db.literal(start, db.DateTime),
+        db.literal("ABSENT"),
+        bulk_change_seq(connection, person.id, low, high),
+        *(db.literal(value) for value in extra.values()),
+    ).where(*where)
+    return connection.execute(db.insert(model).from_select(columns, select)).rowcount
+
+
+def close_day(day=None, dry_run=False):
+    """
+    Close `day` (default: today, UTC). Returns the counts per table, or None if
+    another process holds the lock (PostgreSQL only).
+    """
+    day = day or _today()
+    start = datetime(day.year, day.month, day.day)
+    close_at = datetime.combine(day, OFFICE_CLOSE)
+    connection = db.session.connection()
+
+    if connection.dialect.name == "postgresql":
+        locked = connection.execute(
+            db.text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+        ).scalar()
+        if not locked:
+            db.session.rollback()
+            logger.info("End of day %s is already running elsewhere", day)
+            return None
+
+    started = time.perf_counter()
+    summary = {"date": day.isoformat()}
+    try:
+        for name, model, person, people_filter, day_filter, extra in _targets(day):
+            summary[f"{name}_closed"] = _close_open(connection, model, day_filter, close_at, dry_run)
+            summary[f"{name}_absent"] = _mark_absent(
+                connection, model, person, people_filter, day_filter, extra, start, dry_run
+            )
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info("End of day %s%s: %s in %.2fs", day, " (dry run)" if dry_run else "",
+                summary, time.perf_counter() - started)
+    return summary
+
+
+def _validate_end_of_day(params):
+    value = params.get("date")
+    try:
+        day = date.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        raise ValueError("date must be YYYY-MM-DD")
+    return {"date": day.isoformat()} if day else {}
+
+
+@job_type("end_of_day", max_attempts=3, validate=_validate_end_of_day)
+def end_of_day(ctx):
+    day = ctx.params.get("date")
+    close_day(date.fromisoformat(day) if day else None)
+
+
+# ---------------------------
+# In-process scheduler
+# ---------------------------
+
+class EndOfDayScheduler:
+    """Runs close_day() once a day at END_OF_DAY_AT (UTC) in every worker."""
+
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._last_run = None
+
+    def init_app(self, app):
+        self._app = app
+        if app.config.get("END_OF_DAY_ENABLED", True):
+            app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        # A forked worker inherits the parent's scheduler object but not its thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._loop, name="end-of-day", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def due(self, now):
+        config = self._app.config
+        at = datetime.strptime(config.get("END_OF_DAY_AT", "23:00"), "%H:%M").time()
+        weekdays = {int(d) for d in str(config.get("END_OF_DAY_WEEKDAYS", "0,1,2,3,4")).split(",") if d.strip()}
+        return now.time() >= at and now.weekday() in weekdays and self._last_run != now.date()
+
+    def _loop(self):
+        while True:
+            time.sleep(self._app.config.get("END_OF_DAY_POLL_SECONDS", 60))
+            now = datetime.now(timezone.utc)
+            if not self.due(now):
+                continue
+            try:
+                with self._app.app_context():
+                    close_day(now.date())
+                # Also when another worker held the lock: it did the work
+                self._last_run = now.date()
+            except Exception:
+                logger.exception("End of day %s failed; retrying", now.date())
+
+
+scheduler = EndOfDayScheduler()
+
+
+def init_end_of_day(app):
+    """Attach the end-of-day scheduler; its thread starts with the worker's first request."""
+    scheduler.init_app(app)
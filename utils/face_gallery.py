@@ -0,0 +1,447 @@
+"""
+In-memory face gallery.
+
+All enrolled face templates are decoded once into a single L2-normalised
+float32 matrix, so matching a probe is one matrix-vector product instead of
+a JSON decode plus cosine per template per scan. The gallery is swapped
+atomically on reload; readers never take a lock.
+
+Freshness: enrolments in this process call invalidate(); other workers pick
+up changes within FACE_GALLERY_REFRESH_SECONDS by comparing the gallery
+version (the gallery_version counter, one primary-key lookup).
+
+FACE_GALLERY_MODE = "int8" keeps only per-vector scaled int8 codes (plus
+their norms) in memory. A probe is scored against the codes to build a
+shortlist of FACE_GALLERY_SHORTLIST candidates, which are then re-scored
+exactly in float32 from a memory-mapped copy of the normalised templates.
+
+Rows are ordered by the owner's department, so each department is a
+contiguous partition (a zero-copy slice of every array) and a kiosk scoped
+to some departments only scans those slices.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from flask import current_app
+
+from app import db
+from models.models import Biometric, GalleryVersion, User
+from utils import memory, metrics
+
+logger = logging.getLogger(__name__)
+
+GALLERY_LOAD = metrics.histogram("face_gallery_load_seconds", "Time to (re)build the face gallery.")
+
+
+class _GalleryState:
+    """Immutable snapshot of the gallery."""
+
+    __slots__ = (
+        "matrix", "user_ids", "biometric_ids", "dim", "fingerprint", "loaded_at",
+        "mode", "codes", "code_norms", "partitions",
+    )
+
+    def __init__(self, matrix, user_ids, biometric_ids, dim, fingerprint, mode="float32", codes=None, code_norms=None,
+                 partitions=None):
+        self.matrix = matrix  # float32 unit rows (a read-only memmap in int8 mode)
+        self.user_ids = user_ids
+        self.biometric_ids = biometric_ids
+        self.dim = dim
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+        self.mode = mode
+        self.codes = codes
+        self.code_norms = code_norms
+        self.partitions = partitions or {}  # department → slice of rows
+
+    @property
+    def size(self):
+        return len(self.user_ids)
+
+    @property
+    def nbytes(self):
+        """Resident bytes (the memory-mapped exact copy in int8 mode is file-backed)."""
+        ids = self.user_ids.nbytes + self.biometric_ids.nbytes
+        if self.mode == "int8":
+            return self.codes.nbytes + self.code_norms.nbytes + ids
+        return self.matrix.nbytes + ids
+
+
+def _fingerprint():
+    return db.session.query(GalleryVersion.version).filter(GalleryVersion.id == 1).scalar() or 0
+
+
+def decode_template(raw):
+    """Decode a stored face template (JSON array bytes) to float32, or None if unusable."""
+    try:
+        vector = np.asarray(json.loads(raw.decode("utf-8")), dtype=np.float32)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if vector.ndim != 1 or vector.size == 0 or not np.isfinite(vector).all():
+        return None
+    return vector
+
+
+def normalise(vector):
+    """Return the L2-normalised float32 vector, or None for zero/invalid input."""
+    try:
+        vector = np.asarray(vector, dtype=np.float32)
+    except (ValueError, TypeError):
+        return None
+    if vector.ndim != 1:
+        return None
+    norm = np.linalg.norm(vector)
+    if not np.isfinite(norm) or norm == 0:
+        return None
+    return vector / norm
+
+
+# ---------------------------
+# Int8 quantisation
+# ---------------------------
+
+# Products of int8 codes are at most 127² and float32 represents integers
+# exactly up to 2²⁴, so BLAS float32 dot products of codes are exact integer
+# dot products for dimensions up to 1040.
+_EXACT_FLOAT32_DIM = (1 << 24) // (127 * 127)
+_SCAN_BLOCK = 16384
+
+
+def quantize_int8(matrix):
+    """Per-row symmetric int8 quantisation; returns (codes, L2 norms of the codes)."""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    peak = np.abs(matrix).max(axis=1, keepdims=True)
+    peak[peak == 0] = 1.0
+    codes = np.rint(matrix * (127.0 / peak)).astype(np.int8)
+    norms = np.linalg.norm(codes.astype(np.float32), axis=1)
+    norms[norms == 0] = 1.0
+    return codes, norms
+
+
+def int8_dot(codes, probe_codes):
+    """Integer dot products of every code row with the probe codes, scanned in blocks."""
+    out = np.empty(len(codes), dtype=np.float32)
+    exact_in_float = codes.shape[1] <= _EXACT_FLOAT32_DIM
+    probe = probe_codes.astype(np.float32 if exact_in_float else np.int32)
+    for start in range(0, len(codes), _SCAN_BLOCK):
+        block = codes[start:start + _SCAN_BLOCK]
+        out[start:start + len(block)] = block.astype(probe.dtype) @ probe
+    return out
+
+
+def _spill(matrix, spill_dir):
+    """Write the exact rows to an unlinked temp file and map them read-only."""
+    fd, path = tempfile.mkstemp(prefix="face-gallery-", suffix=".f32", dir=spill_dir)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(np.ascontiguousarray(matrix).tobytes())
+        if not len(matrix):
+            return np.empty(matrix.shape, dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=matrix.shape)
+    finally:
+        try:
+            os.unlink(path)  # the mapping stays valid; nothing is left behind on disk
+        except OSError:
+            pass
+
+
+def _partition(departments):
+    """Return the stable department ordering of rows and department → slice bounds."""
+    departments = np.asarray(departments, dtype=object)
+    order = np.argsort(departments, kind="stable")
+    partitions = {}
+    start = 0
+    ordered = departments[order]
+    for i in range(1, len(ordered) + 1):
+        if i == len(ordered) or ordered[i] != ordered[start]:
+            partitions[ordered[start]] = slice(start, i)
+            start = i
+    return order, partitions
+
+
+def build_state(matrix, user_ids, biometric_ids, fingerprint=None, mode="float32", spill_dir=None, departments=None):
+    """Build a gallery snapshot from unit-normalised float32 rows."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    biometric_ids = np.asarray(biometric_ids, dtype=np.int64)
+    dim = matrix.shape[1] if matrix.ndim == 2 else 0
+
+    partitions = None
+    if departments is not None and len(matrix):
+        order, partitions = _partition(departments)
+        matrix, user_ids, biometric_ids = matrix[order], user_ids[order], biometric_ids[order]
+
+    if mode == "int8":
+        codes, code_norms = quantize_int8(matrix) if len(matrix) else (
+            np.empty((0, dim), dtype=np.int8), np.empty(0, dtype=np.float32))
+        return _GalleryState(_spill(matrix, spill_dir), user_ids, biometric_ids, dim, fingerprint,
+                             mode="int8", codes=codes, code_norms=code_norms, partitions=partitions)
+    return _GalleryState(matrix, user_ids, biometric_ids, dim, fingerprint, partitions=partitions)
+
+
+RUNNER_UP_CANDIDATES = 8
+
+
+def _runner_up(user_ids, scores, best_user):
+    """Best of `scores` belonging to a user other than best_user (user_ids aligned with scores), or None."""
+    k = min(RUNNER_UP_CANDIDATES, len(scores))
+    top = np.argpartition(scores, -k)[-k:]
+    others = top[user_ids[top] != best_user]
+    if len(others) == 0 and k < len(scores):
+        # Every top candidate is the same person (several templates): full pass
+        others = np.flatnonzero(user_ids != best_user)
+    return float(scores[others].max()) if len(others) else None
+
+
+def _score_rows(state, rows, probe, shortlist):
+    """Best (row, score, runner-up score of another user) within one contiguous slice of the gallery."""
+    offset = rows.start or 0
+    size = (rows.stop if rows.stop is not None else state.size) - offset
+    if size <= 0:
+        return None, None, None
+
+    if state.mode != "int8" or size <= shortlist:
+        scores = np.asarray(state.matrix[rows]) @ probe
+        best = int(np.argmax(scores))
+        user_ids = state.user_ids[rows]
+        return offset + best, float(scores[best]), _runner_up(user_ids, scores, user_ids[best])
+
+    probe_codes, probe_norm = quantize_int8(probe)
+    approx = int8_dot(state.codes[rows], probe_codes[0]) / (state.code_norms[rows] * probe_norm[0])
+    candidates = offset + np.sort(np.argpartition(approx, -shortlist)[-shortlist:])
+
+    # Exact float32 re-rank of the shortlist (sorted rows → sequential reads)
+    exact = np.asarray(state.matrix[candidates]) @ probe
+    best = int(np.argmax(exact))
+    user_ids = state.user_ids[candidates]
+    return int(candidates[best]), float(exact[best]), _runner_up(user_ids, exact, user_ids[best])
+
+
+def score_state(state, probe, shortlist=32, scope=None, runner_up=False):
+    """
+    Return (row, score) of the best gallery row for a unit-normalised probe,
+    or (row, score, runner-up score) with runner_up=True: the best score of
+    any other user, None if there is none (approximate in int8 mode: taken
+    from the shortlist).
+
+    scope limits the search to the given departments' partitions; unknown
+    departments contribute nothing. Returns Nones if nothing was searched.
+    """
+    if scope is None:
+        result = _score_rows(state, slice(0, state.size), probe, shortlist)
+        return result if runner_up else result[:2]
+
+    results = []
+    for department in scope:
+        rows = state.partitions.get(department)
+        if rows is None:
+            continue
+        row, score, second = _score_rows(state, rows, probe, shortlist)
+        if row is not None:
+            results.append((row, score, second))
+    if not results:
+        return (None, None, None) if runner_up else (None, None)
+
+    best_row, best_score, second = max(results, key=lambda r: r[1])
+    if not runner_up:
+        return best_row, best_score
+    best_user = state.user_ids[best_row]
+    for row, score, other in results:
+        if row == best_row:
+            continue
+        # Another partition's best is a runner-up unless it is the same person
+        candidate = score if state.user_ids[row] != best_user else other
+        if candidate is not None and (second is None or candidate > second):
+            second = candidate
+    return best_row, best_score, second
+
+
+def top_users(state, probe, k=5, exclude_user=None, shortlist=32):
+    """
+    Up to k (row, score) pairs for a unit-normalised probe, best first, at most
+    one row (the best) per user; exclude_user's templates are skipped. In
+    int8 mode the candidates come from a shortlist and are re-scored exactly.
+    """
+    if state.size == 0:
+        return []
+    if state.mode == "int8" and state.size > shortlist:
+        probe_codes, probe_norm = quantize_int8(probe)
+        approx = int8_dot(state.codes, probe_codes[0]) / (state.code_norms * probe_norm[0])
+        count = min(max(shortlist, k * RUNNER_UP_CANDIDATES), state.size)
+        rows = np.sort(np.argpartition(approx, -count)[-count:])
+        scores = np.asarray(state.matrix[rows]) @ probe
+    else:
+        rows = np.arange(state.size)
+        scores = np.asarray(state.matrix) @ probe
+    user_ids = state.user_ids[rows]
+    if exclude_user is not None:
+        keep = user_ids != exclude_user
+        rows, scores, user_ids = rows[keep], scores[keep], user_ids[keep]
+
+    # Look at the best few rows first; widen to everything if they are too few people
+    for count in (min(k * RUNNER_UP_CANDIDATES, len(scores)), len(scores)):
+        top = np.argpartition(scores, -count)[-count:] if count < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        _, first = np.unique(user_ids[top], return_index=True)
+        picked = top[np.sort(first)][:k]
+        if len(picked) >= k or count == len(scores):
+            break
+    return [(int(rows[i]), float(scores[i])) for i in picked]
+
+
+class FaceGallery:
+    def __init__(self):
+        self._state = None
+        self._lock = threading.Lock()
+        self._stale = True
+        self._checked_at = 0.0
+
+    # ---------------------------
+    # Loading
+    # ---------------------------
+
+    def load(self):
+        """Rebuild the gallery from the database (requires an app context)."""
+        with self._lock:
+            return self._load_locked()
+
+    def _load_locked(self):
+        started = time.perf_counter()
+        fingerprint = _fingerprint()
+
+        rows = (
+            db.session.query(Biometric.id, Biometric.user_id, Biometric.face_template, User.department)
+            .join(User, User.id == Biometric.user_id)
+            .filter(Biometric.face_template.isnot(None))
+            .order_by(Biometric.id)
+            .yield_per(1000)
+        )
+        vectors, user_ids, biometric_ids, departments = [], [], [], []
+        skipped = 0
+        for bio_id, user_id, raw, department in rows:
+            vector = decode_template(raw)
+            unit = normalise(vector) if vector is not None else None
+            if unit is None:
+                skipped += 1
+                continue
+            vectors.append(unit)
+            user_ids.append(user_id)
+            biometric_ids.append(bio_id)
+            departments.append(department)
+
+        # Templates must share one dimension; keep the dominant one
+        dim = Counter(v.size for v in vectors).most_common(1)[0][0] if vectors else 0
+        keep = [i for i, v in enumerate(vectors) if v.size == dim]
+        skipped += len(vectors) - len(keep)
+        if skipped:
+            logger.warning("Face gallery skipped %d unusable templates", skipped)
+
+        matrix = np.empty((len(keep), dim), dtype=np.float32)
+        for row, i in enumerate(keep):
+            matrix[row] = vectors[i]
+        del vectors
+
+        mode = current_app.config.get("FACE_GALLERY_MODE", "float32")
+        self._state = build_state(
+            matrix,
+            [user_ids[i] for i in keep],
+            [biometric_ids[i] for i in keep],
+            fingerprint,
+            mode=mode,
+            spill_dir=current_app.config.get("FACE_GALLERY_SPILL_DIR"),
+            departments=[departments[i] for i in keep],
+        )
+        self._stale = False
+        self._checked_at = time.monotonic()
+        GALLERY_LOAD.observe(time.perf_counter() - started)
+        logger.info("Face gallery loaded: %d templates, dim=%d, mode=%s", len(keep), dim, mode)
+        return self._state
+
+    def invalidate(self):
+        """Force a reload before the next match (call after enrolment changes)."""
+        self._stale = True
+
+    def state(self):
+        """Return the current snapshot, reloading it if stale."""
+        state = self._state
+        if state is None or self._stale:
+            with self._lock:
+                # Another thread may have rebuilt it while we waited
+                if self._state is None or self._stale:
+                    return self._load_locked()
+                return self._state
+
+        interval = current_app.config.get("FACE_GALLERY_REFRESH_SECONDS", 30)
+        now = time.monotonic()
+        if now - self._checked_at >= interval:
+            self._checked_at = now
+            if _fingerprint() != state.fingerprint:
+                return self.load()
+        return state
+
+    # ---------------------------
+    # Matching
+    # ---------------------------
+
+    def match(self, embedding, scope=None, runner_up=False):
+        """
+        Return (user_id, score) of the best match, or (None, None) if nothing comparable.
+
+        scope is an optional list of departments to restrict the search to.
+        With runner_up=True a third value is returned: the best score of any
+        other user (the match margin), or None.
+        """
+        state = self.state()
+        probe = normalise(embedding)
+        if probe is None or state.size == 0 or probe.size != state.dim:
+            return (None, None, None) if runner_up else (None, None)
+
+        shortlist = current_app.config.get("FACE_GALLERY_SHORTLIST", 32)
+        row, score, second = score_state(state, probe, shortlist, scope, runner_up=True)
+        if row is None:
+            return (None, None, None) if runner_up else (None, None)
+        user_id = int(state.user_ids[row])
+        return (user_id, score, second) if runner_up else (user_id, score)
+
+    def nearest(self, embedding, k=5, exclude_user=None):
+        """Return up to k (user_id, biometric_id, score) of the closest enrolled users, best first."""
+        state = self.state()
+        probe = normalise(embedding)
+        if probe is None or state.size == 0 or probe.size != state.dim:
+            return []
+        shortlist = current_app.config.get("FACE_GALLERY_SHORTLIST", 32)
+        return [
+            (int(state.user_ids[row]), int(state.biometric_ids[row]), score)
+            for row, score in top_users(state, probe, k, exclude_user, shortlist)
+        ]
+
+    def stats(self):
+        state = self._state
+        if state is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "templates": state.size,
+            "dim": state.dim,
+            "mode": state.mode,
+            "partitions": {dept: rows.stop - rows.start for dept, rows in state.partitions.items()},
+            "bytes": state.nbytes,
+            "loaded_at": state.loaded_at,
+        }
+
+
+gallery = FaceGallery()
+
+metrics.gauge(
+    "face_gallery_templates",
+    "Face templates held in this worker's gallery.",
+    callback=lambda: {(): gallery._state.size if gallery._state is not None else 0},
+)
+memory.register_cache("face_gallery", lambda: gallery._state.nbytes if gallery._state is not None else None)
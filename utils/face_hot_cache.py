@@ -0,0 +1,164 @@
+"""
+Recent-arrival hot cache for face matching.
+
+Each kiosk sees roughly the same few hundred people every day, so before
+searching the whole gallery a probe is compared against the templates of
+the users that kiosk matched recently. The hot set is an LRU of users per
+kiosk and scope (and an LRU of those), and a hit must clear the normal
+threshold by FACE_HOT_CACHE_MARGIN; anything less falls through to the full
+gallery. Keying by scope keeps a scoped probe from hitting someone the same
+kiosk matched in an unscoped (or differently scoped) search.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from flask import current_app
+
+from utils import memory, metrics
+from utils.face_gallery import gallery, normalise
+
+LOOKUPS = metrics.counter("face_hot_cache_lookups_total", "Hot cache lookups by result.", ("result",))
+SAVED = metrics.counter("face_hot_cache_saved_seconds_total", "Estimated matcher time saved by hot cache hits.")
+
+
+class _KioskHotSet:
+    """LRU of user_id → unit template rows, with a lazily stacked matrix."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.users = OrderedDict()
+        self._matrix = None
+        self._owners = None
+
+    def remember(self, user_id, rows):
+        self.users[user_id] = rows
+        self.users.move_to_end(user_id)
+        while len(self.users) > self.capacity:
+            self.users.popitem(last=False)
+        self._matrix = None
+
+    def touch(self, user_id):
+        self.users.move_to_end(user_id)
+
+    def matrix(self):
+        if self._matrix is None:
+            owners, blocks = [], []
+            for user_id, rows in self.users.items():
+                owners.extend([user_id] * len(rows))
+                blocks.append(rows)
+            self._matrix = np.vstack(blocks) if blocks else None
+            self._owners = np.asarray(owners, dtype=np.int64)
+        return self._matrix, self._owners
+
+    @property
+    def nbytes(self):
+        stacked = self._matrix.nbytes if self._matrix is not None else 0
+        return stacked + sum(rows.nbytes for rows in self.users.values())
+
+
+class FaceHotCache:
+    def __init__(self):
+        self._kiosks = OrderedDict()
+        self._lock = threading.Lock()
+        self._gallery_state = None
+        self._full_search_ewma = None
+
+    def _config(self):
+        config = current_app.config
+        return (
+            config.get("FACE_HOT_CACHE_ENABLED", True),
+            config.get("FACE_HOT_CACHE_SIZE", 500),
+            config.get("FACE_HOT_CACHE_KIOSKS", 64),
+            config.get("FACE_HOT_CACHE_MARGIN", 0.1),
+        )
+
+    def _sync_with_gallery(self, state):
+        # Templates may have been removed or replaced: start cold after every reload
+        if state is not self._gallery_state:
+            self._kiosks.clear()
+            self._gallery_state = state
+
+    @staticmethod
+    def _key(kiosk_id, scope):
+        return kiosk_id, tuple(sorted(scope)) if scope else None
+
+    def match(self, kiosk_id, embedding, threshold, scope=None):
+        """Return (user_id, score) on a confident hot-set hit, else (None, None)."""
+        enabled, _, _, margin = self._config()
+        if not enabled or kiosk_id is None:
+            return None, None
+
+        started = time.perf_counter()
+        state = gallery.state()
+        probe = normalise(embedding)
+        if probe is None or probe.size != state.dim:
+            return None, None
+
+        with self._lock:
+            self._sync_with_gallery(state)
+            hot = self._kiosks.get(self._key(kiosk_id, scope))
+            if hot is None or not hot.users:
+                LOOKUPS.inc(result="miss")
+                return None, None
+            matrix, owners = hot.matrix()
+            scores = matrix @ probe
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < threshold + margin:
+                LOOKUPS.inc(result="miss")
+                return None, None
+            user_id = int(owners[best])
+            hot.touch(user_id)
+
+        LOOKUPS.inc(result="hit")
+        if self._full_search_ewma is not None:
+            SAVED.inc(max(self._full_search_ewma - (time.perf_counter() - started), 0.0))
+        return user_id, score
+
+    def record_full_search(self, seconds):
+        """Track full-gallery search time (EWMA) to estimate what hits save."""
+        previous = self._full_search_ewma
+        self._full_search_ewma = seconds if previous is None else 0.9 * previous + 0.1 * seconds
+
+    def remember(self, kiosk_id, user_id, scope=None):
+        """Add a freshly matched user's templates to the kiosk's hot set for `scope`."""
+        enabled, capacity, max_kiosks, _ = self._config()
+        if not enabled or kiosk_id is None:
+            return
+
+        state = gallery.state()
+        rows = np.asarray(state.matrix[np.flatnonzero(state.user_ids == user_id)])
+        if not len(rows):
+            return
+
+        with self._lock:
+            self._sync_with_gallery(state)
+            key = self._key(kiosk_id, scope)
+            hot = self._kiosks.get(key)
+            if hot is None:
+                hot = self._kiosks[key] = _KioskHotSet(capacity)
+            self._kiosks.move_to_end(key)
+            while len(self._kiosks) > max_kiosks:
+                self._kiosks.popitem(last=False)
+            hot.remember(user_id, rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kiosks": len(self._kiosks),
+                "users": sum(len(h.users) for h in self._kiosks.values()),
+                "bytes": sum(h.nbytes for h in self._kiosks.values()),
+            }
+
+
+hot_cache = FaceHotCache()
+
+metrics.gauge(
+    "face_hot_cache_users",
+    "Users held across all kiosk hot sets in this worker.",
+    callback=lambda: {(): hot_cache.stats()["users"]},
+)
+memory.register_cache("face_hot_cache", lambda: hot_cache.stats()["bytes"])
@@ -0,0 +1,162 @@
+"""
+Gallery compaction: remove orphaned and superseded biometric rows.
+
+Every biometric row is loaded by the face gallery or scanned by
+match_fingerprint, so rows nobody can match any more only cost time. A run
+removes:
+  * orphans: no user_id, a user_id whose user no longer exists, or neither
+    template set;
+  * superseded templates: beyond the GALLERY_KEEP_PER_USER most recently
+    enrolled (highest id) face templates of a user. Fingerprint templates are
+    ranked the same way, and a row is only removed when neither of its
+    templates is kept.
+
+Rows are deleted GALLERY_COMPACTION_BATCH_SIZE at a time, each batch in its
+own short transaction together with its REMOVE entries in gallery_changes
+(record_gallery_removals), so kiosks syncing deltas never see a template
+vanish unannounced and the table is never locked for the whole run. The
+version bump makes other workers reload their gallery at their next refresh
+check; a run normally finishes within one FACE_GALLERY_REFRESH_SECONDS, so
+they reload once. Afterwards the table is vacuumed (VACUUM ANALYZE on
+PostgreSQL, VACUUM on SQLite).
+
+Runs as the "gallery_compaction" background job or from compact_gallery.py.
+"""
+
+import logging
+import time
+
+from flask import current_app
+
+from app import db
+from models.models import Biometric, User, record_gallery_removals
+from utils.jobs import job_type
+
+logger = logging.getLogger("gallery_compaction")
+
+
+def _ranked(template):
+    """Recency rank of each row's template among the user's rows that have one (1 = newest)."""
+    return db.func.row_number().over(
+        partition_by=(Biometric.user_id, template.is_(None)),
+        order_by=Biometric.id.desc(),
+    )
+
+
+def removal_candidates(keep):
+    """(biometric_id, user_id, department, has_face, reason) of every row to remove, by id."""
+    ranks = (
+        db.select(
+            Biometric.id,
+            Biometric.user_id,
+            User.department,
+            User.id.label("owner"),
+            Biometric.face_template.isnot(None).label("has_face"),
+            Biometric.fingerprint_template.isnot(None).label("has_fingerprint"),
+            _ranked(Biometric.face_template).label("face_rank"),
+            _ranked(Biometric.fingerprint_template).label("fingerprint_rank"),
+        )
+        .outerjoin(User, User.id == Biometric.user_id)
+        .subquery()
+    )
+    orphan = db.or_(
+        ranks.c.owner.is_(None),
+        db.and_(ranks.c.has_face.is_(False), ranks.c.has_fingerprint.is_(False)),
+    )
+    superseded = db.and_(
+        db.or_(ranks.c.has_face.is_(False), ranks.c.face_rank > keep),
+        db.or_(ranks.c.has_fingerprint.is_(False), ranks.c.fingerprint_rank > keep),
+    )
+    rows = db.session.execute(
+        db.select(
+            ranks.c.id, ranks.c.user_id, ranks.c.department, ranks.c.has_face,
+            db.case((orphan, "orphan"), else_="superseded"),
+        )
+        .where(db.or_(orphan, superseded))
+        .order_by(ranks.c.id)
+    ).all()
+    return [(row[0], row[1], row[2], bool(row[3]), row[4]) for row in rows]
+
+
+def vacuum():
+    """Reclaim the deleted rows' space (outside a transaction, as both databases require)."""
+    engine = db.engine
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(db.text(f"VACUUM ANALYZE {Biometric.__tablename__}"))
+        elif engine.dialect.name == "sqlite":
+            conn.execute(db.text("VACUUM"))
+
+
+def compact_gallery(keep=None, batch_size=None, dry_run=False, progress=None):
+    """
+    Remove orphaned and superseded biometric rows; returns a summary dict.
+    progress(fraction) is called after each batch.
+    """
+    config = current_app.config
+    keep = keep or config.get("GALLERY_KEEP_PER_USER", 3)
+    batch_size = batch_size or config.get("GALLERY_COMPACTION_BATCH_SIZE", 500)
+    started = time.perf_counter()
+
+    candidates = removal_candidates(keep)
+    db.session.rollback()  # don't hold the read transaction across batches
+    summary = {
+        "keep_per_user": keep,
+        "orphans": sum(1 for c in candidates if c[4] == "orphan"),
+        "superseded": sum(1 for c in candidates if c[4] == "superseded"),
+        "face_templates": sum(1 for c in candidates if c[3]),
+        "deleted": 0,
+    }
+    if dry_run or not candidates:
+        logger.info("Gallery compaction%s: %s", " (dry run)" if dry_run else "", summary)
+        return summary
+
+    table = Biometric.__table__
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        try:
+            connection = db.session.connection()
+            summary["deleted"] += connection.execute(
+                table.delete().where(table.c.id.in_([c[0] for c in batch]))
+            ).rowcount
+            record_gallery_removals(connection, [(c[0], c[1], c[2]) for c in batch if c[3]])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if progress:
+            progress((start + len(batch)) / len(candidates))
+
+    from utils.face_gallery import gallery  # imported lazily: the gallery needs numpy
+
+    gallery.invalidate()
+    try:
+        vacuum()
+        summary["vacuumed"] = True
+    except Exception:
+        # The deletes are committed; a later run (or autovacuum) reclaims the space
+        logger.exception("Vacuum after gallery compaction failed")
+        summary["vacuumed"] = False
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info("Gallery compaction: %s", summary)
+    return summary
+
+
+def _validate_compaction(params):
+    cleaned = {}
+    if params.get("keep") is not None:
+        try:
+            cleaned["keep"] = int(params["keep"])
+        except (TypeError, ValueError):
+            raise ValueError("keep must be an integer")
+        if cleaned["keep"] < 1:
+            raise ValueError("keep must be at least 1")
+    if params.get("dry_run"):
+        cleaned["dry_run"] = True
+    return cleaned
+
+
+@job_type("gallery_compaction", max_attempts=2, validate=_validate_compaction)
+def gallery_compaction(ctx):
+    compact_gallery(ctx.params.get("keep"), dry_run=ctx.params.get("dry_run", False),
+                    progress=lambda fraction: ctx.progress(0.95 * fraction))
@@ -0,0 +1,203 @@
+"""
+Versioned gallery snapshots and deltas for offline kiosks.
+
+The gallery version is the gallery_version counter, which every enrolment
+and removal bumps in its own transaction, so versions follow commit order
+and a kiosk's cursor never skips a change that committed late (an id or
+sequence cursor would). A kiosk downloads a
+snapshot for its scope once, then polls for deltas (ADD/REMOVE keyed by
+biometric id) since the version it holds, matches locally and uploads only
+attendance events. Deltas are idempotent: a kiosk applies ADD as an upsert
+and REMOVE as a delete, so a change that also made it into a snapshot is
+harmless to replay.
+
+Snapshot format (little-endian):
+    b"FGS1"                     magic
+    uint32                      header length H
+    H bytes                     JSON header: version, scope, count, dim, dtype,
+                                normalized, users [{id, uuid, firstname, lastname}]
+    int64[count]                biometric ids
+    int64[count]                user ids
+    dtype[count * dim]          unit-normalised embeddings, row-major
+
+Snapshots are built once per (version, scope, dtype) and cached as files in
+GALLERY_SNAPSHOT_DIR, shared by every worker on the host. The newest
+SNAPSHOT_KEEP versions per (scope, dtype) are kept, so a file another worker
+has just handed out is not deleted under its download.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+from flask import current_app
+from app import db
+from models.models import Biometric, GalleryChange, GalleryVersion, User
+from utils.face_gallery import decode_template, normalise
+
+SNAPSHOT_MAGIC = b"FGS1"
+SNAPSHOT_DTYPES = {"float32": np.float32, "float16": np.float16}
+SNAPSHOT_KEEP = 3
+
+_build_lock = threading.Lock()
+
+
+def current_version():
+    return db.session.query(GalleryVersion.version).filter(GalleryVersion.id == 1).scalar() or 0
+
+
+def scope_key(scope):
+    if not scope:
+        return "all"
+    return hashlib.sha1("\x1f".join(sorted(scope)).encode("utf-8")).hexdigest()[:16]
+
+
+def _snapshot_dir():
+    path = current_app.config.get("GALLERY_SNAPSHOT_DIR") or os.path.join(tempfile.gettempdir(), "gallery-snapshots")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _snapshot_versions(directory, prefix):
+    """Sorted versions of the snapshot files named <prefix><version>.bin."""
+    versions = []
+    for name in os.listdir(directory):
+        stem = name[len(prefix):-len(".bin")]
+        if name.startswith(prefix) and name.endswith(".bin") and stem.isdigit():
+            versions.append(int(stem))
+    return sorted(versions)
+
+
+def build_snapshot(version, scope, dtype="float32"):
+    """Serialise the current face templates in scope to the snapshot format."""
+    query = (
+        db.session.query(Biometric.id, Biometric.user_id, Biometric.face_template)
+        .join(User, User.id == Biometric.user_id)
+        .filter(Biometric.face_template.isnot(None))
+        .order_by(Biometric.id)
+    )
+    if scope:
+        query = query.filter(User.department.in_(scope))
+
+    biometric_ids, user_ids, vectors = [], [], []
+    for bio_id, user_id, raw in query.yield_per(1000):
+        vector = decode_template(raw)
+        unit = normalise(vector) if vector is not None else None
+        if unit is None:
+            continue
+        biometric_ids.append(bio_id)
+        user_ids.append(user_id)
+        vectors.append(unit)
+
+    dim = vectors[0].size if vectors else 0
+    keep = [i for i, v in enumerate(vectors) if v.size == dim]
+    users = (
+        db.session.query(User.id, User.uuid, User.firstname, User.lastname)
+        .filter(User.id.in_({user_ids[i] for i in keep}))
+        .all()
+    ) if keep else []
+
+    header = json.dumps({
+        "version": version,
+        "scope": sorted(scope) if scope else None,
+        "count": len(keep),
+        "dim": dim,
+        "dtype": dtype,
+        "normalized": True,
+        "users": [{"id": u.id, "uuid": u.uuid, "firstname": u.firstname, "lastname": u.lastname} for u in users],
+    }).encode("utf-8")
+
+    matrix = np.stack([vectors[i] for i in keep]) if keep else np.empty((0, dim), dtype=np.float32)
+    return b"".join([
+        SNAPSHOT_MAGIC,
+        struct.pack("<I", len(header)),
+        header,
+        np.asarray([biometric_ids[i] for i in keep], dtype="<i8").tobytes(),
+        np.asarray([user_ids[i] for i in keep], dtype="<i8").tobytes(),
+        matrix.astype(np.dtype(SNAPSHOT_DTYPES[dtype]).newbyteorder("<")).tobytes(),
+    ])
+
+
+def snapshot_file(scope, dtype="float32"):
+    """Return (path, version) of the cached snapshot for the current version, building it once."""
+    version = current_version()
+    key = scope_key(scope)
+    directory = _snapshot_dir()
+    path = os.path.join(directory, f"gallery-{key}-{dtype}-v{version}.bin")
+    if os.path.exists(path):
+        return path, version
+
+    with _build_lock:
+        if os.path.exists(path):
+            return path, version
+
+        data = build_snapshot(version, scope, dtype)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)  # atomic: other workers see either nothing or the full file
+
+        # Older versions for this scope are no longer handed out; keep the last
+        # few for downloads still in flight in other workers
+        prefix = f"gallery-{key}-{dtype}-v"
+        older = [v for v in _snapshot_versions(directory, prefix) if v < version]
+        for old in older[:max(len(older) - (SNAPSHOT_KEEP - 1), 0)]:
+            try:
+                os.remove(os.path.join(directory, f"{prefix}{old}.bin"))
+            except OSError:
+                pass
+    return path, version
+
+
+def changes_since(since, scope=None, limit=1000):
+    """Return (changes, version, has_more) for gallery changes after `since`."""
+    # Read the counter first: every change up to it has committed, so capping
+    # the query there never returns a version with an earlier one still missing
+    current = current_version()
+    query = GalleryChange.query.filter(GalleryChange.version > since, GalleryChange.version <= current)
+    if scope:
+        query = query.filter(GalleryChange.department.in_(scope))
+    rows = query.order_by(GalleryChange.version).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    added = [r.biometric_id for r in rows if r.op == "ADD"]
+    templates = dict(
+        db.session.query(Biometric.id, Biometric.face_template)
+        .filter(Biometric.id.in_(added))
+        .all()
+    ) if added else {}
+    uuids = dict(
+        db.session.query(User.id, User.uuid)
+        .filter(User.id.in_({r.user_id for r in rows if r.user_id}))
+        .all()
+    ) if rows else {}
+
+    changes = []
+    for r in rows:
+        change = {
+            "seq": r.version,
+            "op": r.op,
+            "biometric_id": r.biometric_id,
+            "user_id": r.user_id,
+            "user_uuid": uuids.get(r.user_id),
+            "department": r.department,
+        }
+        if r.op == "ADD":
+            raw = templates.get(r.biometric_id)
+            vector = decode_template(raw) if raw is not None else None
+            unit = normalise(vector) if vector is not None else None
+            if unit is None:
+                # Removed (or unusable) since; a later REMOVE or nothing follows
+                continue
+            change["embedding"] = base64.b64encode(unit.astype("<f4").tobytes()).decode("ascii")
+        changes.append(change)
+
+    # With no (in-scope) changes left the kiosk is current as of the counter
+    version = rows[-1].version if has_more else max(since, current)
+    return changes, version, has_more
@@ -0,0 +1,317 @@
+"""
+Background jobs for work too slow for a request (reports, maintenance).
+
+Jobs are rows in the jobs table, so status, progress and the result location
+survive restarts and are visible to every worker. Each worker process runs a
+JobRunner: a dispatcher thread that claims QUEUED jobs (a conditional UPDATE,
+so exactly one worker wins each job) and a bounded thread pool (JOB_WORKERS)
+that executes them. Handlers are registered with @job_type, write their
+output under JOB_OUTPUT_DIR and report progress through the JobContext.
+
+A failing job is re-queued with exponential backoff until max_attempts, then
+marked FAILED (raise JobFailed to skip retries). The dispatcher heartbeats its
+running jobs; a RUNNING job whose worker died (no heartbeat for
+JOB_STALE_SECONDS) goes back to the queue.
+
+The runner starts on the first request a worker handles (or on submit()), so
+scripts that only call create_app() never pick up jobs. Results are served
+from local disk: with several hosts, JOB_OUTPUT_DIR must be shared.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+
+from app import db
+from models.models import Job
+from utils import metrics
+
+logger = logging.getLogger("jobs")
+
+# Modules whose @job_type handlers are imported when the runner starts
+JOB_MODULES = ("utils.reports", "utils.end_of_day", "utils.duplicates", "utils.gallery_compaction")
+
+JOB_TYPES = {}
+
+FINISHED = metrics.counter("jobs_finished_total", "Background jobs finished, by type and outcome.", ("type", "status"))
+DURATION = metrics.histogram(
+    "job_duration_seconds", "Background job attempt duration.", ("type",),
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+
+
+class JobFailed(Exception):
+    """Raised by a handler for a failure that retrying cannot fix."""
+
+
+class QueueFull(Exception):
+    """Raised by submit() when JOB_QUEUE_LIMIT jobs are already waiting."""
+
+
+def job_type(name, max_attempts=3, validate=None):
+    """
+    Register a job handler. `validate(params)` runs at submit time and returns
+    the cleaned params or raises ValueError (reported to the client as 400).
+    """
+    def register(func):
+        JOB_TYPES[name] = {"handler": func, "max_attempts": max_attempts, "validate": validate}
+        return func
+    return register
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobContext:
+    """What a handler gets: its params, an output location and progress reporting."""
+
+    def __init__(self, job, output_dir):
+        self.job_id = job.id
+        self.job_uuid = job.uuid
+        self.params = dict(job.params or {})
+        self.attempt = job.attempts
+        self.output_dir = output_dir
+        self.result = None
+        self._last_progress = 0.0
+
+    def output_path(self, filename):
+        """Path to write the job's result file to (registered as its download)."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{self.job_uuid}-{filename}")
+        self.result = (path, filename)
+        return path
+
+    def progress(self, fraction):
+        """Record progress (0..1); written at most once a second, on its own connection."""
+        now = time.monotonic()
+        if fraction < 1.0 and now - self._last_progress < 1.0:
+            return
+        self._last_progress = now
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.update(Job).where(Job.id == self.job_id)
+                .values(progress=min(max(float(fraction), 0.0), 1.0), heartbeat_at=_utcnow())
+            )
+
+
+class JobRunner:
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pool = None
+        self._thread = None
+        self._pid = None
+        self._running = set()
+        self._last_cleanup = 0.0
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+
+    def init_app(self, app):
+        self._app = app
+        app.extensions["jobs"] = self
+        if app.config.get("JOBS_ENABLED", True):
+            app.before_request(self.ensure_started)
+
+    def ensure_started(self):
+        # A forked worker inherits the parent's runner object but not its threads
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            for module in JOB_MODULES:
+                importlib.import_module(module)
+            config = self._app.config
+            self._running = set()
+            self._pool = ThreadPoolExecutor(max_workers=config.get("JOB_WORKERS", 2), thread_name_prefix="job")
+            self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            logger.info("Job runner started with %d workers", config.get("JOB_WORKERS", 2))
+
+    # ---------------------------
+    # Submission
+    # ---------------------------
+
+    def submit(self, type_name, params=None, user_id=None):
+        """Queue a job; raises ValueError for bad input and QueueFull when saturated."""
+        for module in JOB_MODULES:
+            importlib.import_module(module)
+        spec = JOB_TYPES.get(type_name)
+        if spec is None:
+            raise ValueError(f"Unknown job type '{type_name}'")
+        params = spec["validate"](params or {}) if spec["validate"] else (params or {})
+
+        limit = current_app.config.get("JOB_QUEUE_LIMIT", 100)
+        queued = db.session.query(db.func.count(Job.id)).filter(Job.status == "QUEUED").scalar()
+        if queued >= limit:
+            raise QueueFull()
+
+        now = _utcnow()
+        job = Job(type=type_name, params=params, status="QUEUED", max_attempts=spec["max_attempts"],
+                  created_by=user_id, created_at=now, run_after=now)
+        db.session.add(job)
+        db.session.commit()
+
+        if current_app.config.get("JOBS_ENABLED", True):
+            self.ensure_started()
+            self._wake.set()
+        return job
+
+    # ---------------------------
+    # Dispatcher
+    # ---------------------------
+
+    def _dispatch_loop(self):
+        poll = self._app.config.get("JOB_POLL_SECONDS", 5)
+        while True:
+            self._wake.wait(poll)
+            self._wake.clear()
+            try:
+                with self._app.app_context():
+                    self._heartbeat()
+                    self._requeue_stale()
+                    self._claim()
+                    self._expire_results()
+            except Exception:
+                logger.exception("Job dispatcher iteration failed")
+
+    def _heartbeat(self):
+        running = list(self._running)
+        if running:
+            db.session.execute(db.update(Job).where(Job.id.in_(running)).values(heartbeat_at=_utcnow()))
+            db.session.commit()
+
+    def _requeue_stale(self):
+        cutoff = _utcnow() - timedelta(seconds=self._app.config.get("JOB_STALE_SECONDS", 120))
+        stale = (Job.status == "RUNNING") & (Job.heartbeat_at < cutoff)
+        if self._running:
+            stale &= Job.id.notin_(list(self._running))
+        exhausted = db.session.execute(
+            db.update(Job).where(stale, Job.attempts >= Job.max_attempts)
+            .values(status="FAILED", error="Worker stopped while running the job", finished_at=_utcnow())
+        ).rowcount
+        requeued = db.session.execute(db.update(Job).where(stale).values(status="QUEUED", run_after=_utcnow())).rowcount
+        db.session.commit()
+        if exhausted or requeued:
+            logger.warning("Recovered stale jobs: %d re-queued, %d failed", requeued, exhausted)
+
+    def _claim(self):
+        free = self._app.config.get("JOB_WORKERS", 2) - len(self._running)
+        if free <= 0:
+            return
+        now = _utcnow()
+        candidates = db.session.execute(
+            db.select(Job.id).where(Job.status == "QUEUED", Job.run_after <= now).order_by(Job.id).limit(free)
+        ).scalars().all()
+        for job_id in candidates:
+            claimed = db.session.execute(
+                db.update(Job).where(Job.id == job_id, Job.status == "QUEUED")
+                .values(status="RUNNING", attempts=Job.attempts + 1, started_at=now, heartbeat_at=now)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                self._running.add(job_id)
+                self._pool.submit(self._run, job_id)
+
+    def _expire_results(self):
+        if time.monotonic() - self._last_cleanup < 600:
+            return
+        self._last_cleanup = time.monotonic()
+        cutoff = _utcnow() - timedelta(hours=self._app.config.get("JOB_RESULT_TTL_HOURS", 72))
+        expired = Job.query.filter(Job.finished_at < cutoff, Job.result_path.isnot(None)).all()
+        for job in expired:
+            try:
+                os.remove(job.result_path)
+            except OSError:
+                pass
+            job.result_path = None
+        db.session.commit()
+
+    # ---------------------------
+    # Execution
+    # ---------------------------
+
+    def _run(self, job_id):
+        try:
+            with self._app.app_context():
+                self._execute(job_id)
+        except Exception:
+            logger.exception("Job %s crashed outside its handler", job_id)
+        finally:
+            self._running.discard(job_id)
+            self._wake.set()
+
+    def _execute(self, job_id):
+        job = db.session.get(Job, job_id)
+        spec = JOB_TYPES.get(job.type)
+        output_dir = self._app.config.get("JOB_OUTPUT_DIR") or os.path.join(self._app.root_path, "job-output")
+        context = JobContext(job, output_dir)
+        started = time.perf_counter()
+        try:
+            if spec is None:
+                raise JobFailed(f"Unknown job type '{job.type}'")
+            spec["handler"](context)
+        except Exception as e:
+            db.session.rollback()
+            if context.result and os.path.exists(context.result[0]):
+                os.remove(context.result[0])
+
+            job = db.session.get(Job, job_id)
+            job.error = f"{type(e).__name__}: {e}"
+            if not isinstance(e, JobFailed) and job.attempts < job.max_attempts:
+                backoff = self._app.config.get("JOB_RETRY_BACKOFF_SECONDS", 30) * 2 ** (job.attempts - 1)
+                job.status = "QUEUED"
+                job.run_after = _utcnow() + timedelta(seconds=backoff)
+                logger.warning("Job %s (%s) attempt %d failed, retrying in %ss", job.uuid, job.type, job.attempts, backoff)
+            else:
+                job.status = "FAILED"
+                job.finished_at = _utcnow()
+                FINISHED.inc(type=job.type, status="failed")
+                logger.exception("Job %s (%s) failed", job.uuid, job.type)
+            db.session.commit()
+            return
+        finally:
+            DURATION.observe(time.perf_counter() - started, type=job.type)
+
+        job = db.session.get(Job, job_id)
+        job.status = "SUCCEEDED"
+        job.progress = 1.0
+        job.error = None
+        job.finished_at = _utcnow()
+        if context.result:
+            job.result_path, job.result_name = context.result
+        db.session.commit()
+        FINISHED.inc(type=job.type, status="succeeded")
+        logger.info("Job %s (%s) finished in %.1fs", job.uuid, job.type, time.perf_counter() - started)
+
+    def stats(self):
+        return {
+            "started": self._thread is not None and self._pid == os.getpid(),
+            "workers": self._app.config.get("JOB_WORKERS", 2) if self._app else None,
+            "running": len(self._running),
+        }
+
+
+runner = JobRunner()
+
+metrics.gauge(
+    "jobs_running",
+    "Background jobs executing in this worker.",
+    callback=lambda: {(): runner.stats()["running"]},
+)
+
+
+def init_jobs(app):
+    """Attach the job runner; its threads start with the first request a worker handles."""
+    runner.init_app(app)
@@ -0,0 +1,114 @@
+"""
+Kiosk credentials.
+
+An offline kiosk syncs the gallery and uploads the sign-ins it matched
+locally; it should not hold an admin login to do that. An admin issues it a
+long-lived access token (POST /api/auth/kiosk-token) with role KIOSK, the
+kiosk id and optionally the departments it serves. The kiosk sends it like
+any other access token, as the access_token_cookie cookie.
+
+A KIOSK token is accepted only by the endpoints in KIOSK_ENDPOINTS; every
+other endpoint answers 403 before its view runs, including the ones that
+only ask for a valid login. A department scope in the token caps what the
+kiosk may download and whose sign-ins it may upload.
+
+Each token also carries its kiosk's token version (KioskCredential). Issuing
+a new token or revoking (DELETE /api/auth/kiosk-token/<kiosk_id>) bumps the
+version, so a lost or replaced kiosk's earlier tokens answer 401 from then
+on instead of living out their expiry.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from flask import abort, current_app, jsonify, request
+from flask_jwt_extended import create_access_token, get_jwt
+
+from app import db
+from models.models import KioskCredential
+
+KIOSK_ROLE = "KIOSK"
+
+# Blueprint endpoints a KIOSK token may call
+KIOSK_ENDPOINTS = frozenset({
+    "gallery.get_gallery_version",
+    "gallery.download_snapshot",
+    "gallery.get_gallery_delta",
+    "attendance.upload_kiosk_events",
+})
+
+
+def _bump_version(kiosk_id, create=False):
+    credential = db.session.get(KioskCredential, kiosk_id, with_for_update=True)
+    if credential is None:
+        if not create:
+            return None
+        credential = KioskCredential(kiosk_id=kiosk_id, token_version=0)
+        db.session.add(credential)
+    credential.token_version += 1
+    return credential
+
+
+def issue_kiosk_token(kiosk_id, scope=None, expires_days=None):
+    """
+    Return (token, lifetime) of a KIOSK access token for `kiosk_id`; earlier
+    tokens of that kiosk stop working once the caller commits.
+    """
+    credential = _bump_version(kiosk_id, create=True)
+    credential.issued_at = datetime.now(timezone.utc)
+    credential.revoked_at = None
+
+    days = expires_days or current_app.config.get("KIOSK_TOKEN_EXPIRES_DAYS", 90)
+    lifetime = timedelta(days=days)
+    claims = {"role": KIOSK_ROLE, "kiosk_id": kiosk_id, "kiosk_version": credential.token_version}
+    if scope:
+        claims["scope"] = scope
+    token = create_access_token(
+        identity=f"kiosk:{kiosk_id}",
+        additional_claims=claims,
+        expires_delta=lifetime,
+    )
+    return token, lifetime
+
+
+def revoke_kiosk_tokens(kiosk_id):
+    """Invalidate every token issued to `kiosk_id`; False if it never had one. The caller commits."""
+    credential = _bump_version(kiosk_id)
+    if credential is None:
+        return False
+    credential.revoked_at = datetime.now(timezone.utc)
+    return True
+
+
+def _token_current(jwt_data):
+    credential = db.session.get(KioskCredential, jwt_data.get("kiosk_id"))
+    return credential is not None and credential.token_version == jwt_data.get("kiosk_version")
+
+
+def require_admin_or_kiosk():
+    """Abort with 403 unless the caller is an admin or a kiosk."""
+    if get_jwt().get("role") not in ("ADMIN", KIOSK_ROLE):
+        abort(403, description="Access forbidden: Admins or kiosks only")
+
+
+def kiosk_scope():
+    """Departments the calling kiosk token is limited to, or None."""
+    claims = get_jwt()
+    if claims.get("role") != KIOSK_ROLE:
+        return None
+    return claims.get("scope") or None
+
+
+def init_kiosk_auth(jwt):
+    """Confine KIOSK tokens to KIOSK_ENDPOINTS and to their kiosk's current version."""
+
+    @jwt.token_verification_loader
+    def _kiosk_token_allowed(jwt_header, jwt_data):
+        if jwt_data.get("role") != KIOSK_ROLE:
+            return True
+        return request.endpoint in KIOSK_ENDPOINTS and _token_current(jwt_data)
+
+    @jwt.token_verification_failed_loader
+    def _kiosk_token_refused(jwt_header, jwt_data):
+        if request.endpoint in KIOSK_ENDPOINTS:
+            return jsonify({"success": False, "message": "Kiosk token revoked or superseded"}), 401
+        return jsonify({"success": False, "message": "Access forbidden: not available to kiosk tokens"}), 403
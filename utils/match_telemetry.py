@@ -0,0 +1,230 @@
+"""
+Face match telemetry: a fixed-size ring buffer of match events per worker.
+
+Every face match (sign-in and verify) records its endpoint, where it was
+answered (kiosk hot set, whole gallery, scoped partitions, or the global
+fallback after a scoped miss), gallery size, top-1 score, the best score of
+any other user (top-2), the threshold, the decision and the duration. Records
+go into a preallocated NumPy structured array under a lock, so recording is
+O(1) and never touches the database.
+
+A background thread appends new records every MATCH_TELEMETRY_FLUSH_SECONDS
+to MATCH_TELEMETRY_DIR/match-telemetry-YYYY-MM-DD.bin: raw telemetry_dtype()
+rows, one write per batch (O_APPEND, so several workers can share a file).
+Read them back with read_file(), e.g. for threshold calibration. If more than
+MATCH_TELEMETRY_SIZE records arrive between flushes the oldest are counted as
+dropped. summary() (GET /api/diagnostics/matches) builds score histograms and
+latency percentiles from the in-memory buffer.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from utils import memory, metrics
+
+logger = logging.getLogger("match_telemetry")
+
+ENDPOINTS = ("signin", "verify")
+SOURCES = ("hot", "gallery", "scoped", "fallback")
+
+# NaN top1/top2 = nothing to compare against
+TELEMETRY_FIELDS = [
+    ("ts", "<f8"),            # unix time
+    ("endpoint", "u1"),       # index into ENDPOINTS
+    ("source", "u1"),         # index into SOURCES
+    ("accepted", "u1"),       # 1 = matched (top1 >= threshold)
+    ("gallery_size", "<i4"),
+    ("top1", "<f4"),
+    ("top2", "<f4"),
+    ("threshold", "<f4"),
+    ("duration_ms", "<f4"),
+]
+
+DROPPED = metrics.counter("match_telemetry_dropped_total", "Match events overwritten before they were flushed.")
+
+
+def telemetry_dtype():
+    import numpy as np  # imported lazily: recording is only reached after a face match
+
+    return np.dtype(TELEMETRY_FIELDS)
+
+
+def read_file(path):
+    """Load a flushed telemetry file as a structured array."""
+    import numpy as np
+
+    return np.fromfile(path, dtype=telemetry_dtype())
+
+
+class MatchTelemetry:
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._buffer = None
+        self._written = 0
+        self._flushed = 0
+        self._dropped = 0
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        self._app = app
+        app.extensions["match_telemetry"] = self
+
+    def _config(self):
+        config = self._app.config if self._app else {}
+        return (
+            config.get("MATCH_TELEMETRY_ENABLED", True),
+            config.get("MATCH_TELEMETRY_SIZE", 10000),
+            config.get("MATCH_TELEMETRY_FLUSH_SECONDS", 5),
+        )
+
+    # ---------------------------
+    # Recording
+    # ---------------------------
+
+    def record(self, endpoint, source, gallery_size, top1, top2, threshold, accepted, duration):
+        enabled, size, flush_seconds = self._config()
+        if not enabled or self._app is None:
+            return
+        if self._buffer is None:
+            import numpy as np
+
+            with self._lock:
+                if self._buffer is None:
+                    self._buffer = np.zeros(size, dtype=telemetry_dtype())
+        if flush_seconds and (self._thread is None or self._pid != os.getpid()):
+            self._start_flusher()
+
+        nan = float("nan")
+        row = (
+            time.time(), ENDPOINTS.index(endpoint), SOURCES.index(source), bool(accepted), gallery_size or 0,
+            nan if top1 is None else top1, nan if top2 is None else top2, threshold, duration * 1000,
+        )
+        with self._lock:
+            self._buffer[self._written % len(self._buffer)] = row
+            self._written += 1
+
+    def _ordered(self, count):
+        """The last `count` records, oldest first (caller holds the lock)."""
+        import numpy as np
+
+        capacity = len(self._buffer)
+        count = min(count, self._written, capacity)
+        end = self._written % capacity
+        if count <= end:
+            return self._buffer[end - count:end].copy()
+        return np.concatenate([self._buffer[capacity - (count - end):], self._buffer[:end]])
+
+    def snapshot(self):
+        """Copy of the buffered records, oldest first (None if nothing recorded yet)."""
+        with self._lock:
+            if self._buffer is None:
+                return None
+            return self._ordered(self._written)
+
+    # ---------------------------
+    # Flushing
+    # ---------------------------
+
+    def _start_flusher(self):
+        # A forked worker inherits the parent's object but not its thread
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._flushed = self._written
+            self._thread = threading.Thread(target=self._flush_loop, name="match-telemetry", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._config()[2])
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Match telemetry flush failed")
+
+    def flush(self):
+        """Append records not yet written to today's file; returns how many were written."""
+        with self._lock:
+            if self._buffer is None:
+                return 0
+            pending = self._written - self._flushed
+            dropped = max(pending - len(self._buffer), 0)
+            rows = self._ordered(pending) if pending else None
+            self._flushed = self._written
+            self._dropped += dropped
+        if dropped:
+            DROPPED.inc(dropped)
+        if rows is None or not len(rows):
+            return 0
+
+        directory = self._app.config.get("MATCH_TELEMETRY_DIR") or os.path.join(self._app.root_path, "match-telemetry")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"match-telemetry-{datetime.now(timezone.utc):%Y-%m-%d}.bin")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, rows.tobytes())
+        finally:
+            os.close(fd)
+        return len(rows)
+
+    # ---------------------------
+    # Reporting
+    # ---------------------------
+
+    def summary(self, bins=20):
+        """Score histograms and latency percentiles over the buffered records."""
+        import numpy as np
+
+        rows = self.snapshot()
+        if rows is None or not len(rows):
+            return {"records": 0}
+
+        edges = np.linspace(0.0, 1.0, bins + 1)
+
+        def histogram(values):
+            values = values[~np.isnan(values)]
+            counts, _ = np.histogram(np.clip(values, 0.0, 1.0), edges)
+            return counts.tolist()
+
+        def latency(selected):
+            durations = selected["duration_ms"]
+            if not len(durations):
+                return None
+            p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+            return {"count": int(len(durations)), "p50_ms": round(float(p50), 3), "p90_ms": round(float(p90), 3),
+                    "p99_ms": round(float(p99), 3), "max_ms": round(float(durations.max()), 3)}
+
+        accepted = rows["accepted"] == 1
+        return {
+            "records": int(len(rows)),
+            "since": datetime.fromtimestamp(float(rows["ts"][0]), timezone.utc).isoformat(),
+            "dropped_unflushed": self._dropped,
+            "decisions": {"matched": int(accepted.sum()), "rejected": int((~accepted).sum())},
+            "by_endpoint": {name: int((rows["endpoint"] == i).sum()) for i, name in enumerate(ENDPOINTS)},
+            "by_source": {name: int((rows["source"] == i).sum()) for i, name in enumerate(SOURCES)},
+            "histogram_edges": [round(float(e), 4) for e in edges],
+            "top1_matched": histogram(rows["top1"][accepted]),
+            "top1_rejected": histogram(rows["top1"][~accepted]),
+            "top2": histogram(rows["top2"]),
+            # top1 - top2 for matches: how clearly the winner beat the next person
+            "margin_matched": histogram(rows["top1"][accepted] - rows["top2"][accepted]),
+            "latency": {
+                "all": latency(rows),
+                **{name: latency(rows[rows["source"] == i]) for i, name in enumerate(SOURCES)},
+            },
+        }
+
+
+telemetry = MatchTelemetry()
+memory.register_cache("match_telemetry", lambda: telemetry._buffer.nbytes if telemetry._buffer is not None else None)
+
+
+def init_match_telemetry(app):
+    """Attach the match telemetry buffer (allocated on the first match)."""
+    telemetry.init_app(app)
@@ -0,0 +1,200 @@
+"""
+Per-worker memory diagnostics.
+
+  * process memory from /proc: RSS, peak RSS, and from smaps_rollup the
+    proportional (PSS) and shared/private split, which shows how much of a
+    pre-forked worker is still shared copy-on-write with the master
+    (getrusage peak RSS where /proc is missing);
+  * the byte size of every registered in-process cache: modules holding
+    data in memory call register_cache(name, callback) at import;
+  * tracemalloc top allocators, switched on at runtime per worker
+    (start_tracing / stop_tracing) or at start-up with MEMORY_TRACEMALLOC_FRAMES.
+    Tracing costs CPU and memory on every allocation: turn it on, take a few
+    snapshots, turn it off.
+
+Everything is per process. Read through GET /api/diagnostics/memory (the
+answer names the worker pid) or memory_report.py, which also reads other
+processes' /proc entries, e.g. every gunicorn worker.
+"""
+
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from collections import deque
+
+from utils import metrics
+
+logger = logging.getLogger("memory")
+
+_caches = {}
+_lock = threading.Lock()
+
+# /proc/<pid>/status and smaps_rollup fields reported, in kB
+STATUS_FIELDS = ("VmRSS", "VmHWM", "RssAnon", "RssFile", "RssShmem")
+SMAPS_FIELDS = ("Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def register_cache(name, size):
+    """Report `size()` (bytes held, or None if not loaded) as cache `name`."""
+    with _lock:
+        _caches[name] = size
+
+
+def cache_sizes():
+    """{name: bytes or None} of every registered cache."""
+    with _lock:
+        caches = dict(_caches)
+    sizes = {}
+    for name, size in sorted(caches.items()):
+        try:
+            sizes[name] = size()
+        except Exception:
+            logger.exception("Sizing cache %s failed", name)
+            sizes[name] = None
+    return sizes
+
+
+def deep_sizeof(obj, _seen=None):
+    """Approximate bytes of a structure of dicts, lists, tuples, sets, deques, strings and numbers."""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+# ---------------------------
+# Process memory
+# ---------------------------
+
+def _read_kb_fields(path, fields):
+    values = {}
+    try:
+        with open(path) as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    values[key] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return values
+
+
+def process_memory(pid=None):
+    """Memory of a process (default: this one) in bytes; None if it cannot be read."""
+    proc = f"/proc/{pid or 'self'}"
+    status = _read_kb_fields(f"{proc}/status", STATUS_FIELDS)
+    if status is None:
+        if pid is not None:
+            return None
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"peak_rss": peak if sys.platform == "darwin" else peak * 1024}
+
+    memory = {
+        "rss": status.get("VmRSS"),
+        "peak_rss": status.get("VmHWM"),
+        "rss_anon": status.get("RssAnon"),
+        "rss_file": status.get("RssFile"),
+        "rss_shmem": status.get("RssShmem"),
+    }
+    smaps = _read_kb_fields(f"{proc}/smaps_rollup", SMAPS_FIELDS)
+    if smaps:
+        memory.update({
+            "pss": smaps.get("Pss"),
+            "shared": smaps.get("Shared_Clean", 0) + smaps.get("Shared_Dirty", 0),
+            "private": smaps.get("Private_Clean", 0) + smaps.get("Private_Dirty", 0),
+            "swap": smaps.get("Swap"),
+        })
+    return memory
+
+
+metrics.gauge(
+    "process_resident_memory_bytes",
+    "Resident set size of this worker.",
+    callback=lambda: {(): (process_memory() or {}).get("rss") or 0},
+)
+metrics.gauge(
+    "cache_bytes",
+    "Bytes held by each registered in-process cache (this worker).",
+    ("cache",),
+    callback=lambda: {(name,): size for name, size in cache_sizes().items() if size is not None},
+)
+
+
+# ---------------------------
+# tracemalloc
+# ---------------------------
+
+def start_tracing(frames=1):
+    """Start tracing allocations with `frames` of traceback (restarts if already on)."""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    tracemalloc.start(frames)
+    logger.info("tracemalloc on (%d frames) in pid %d", frames, os.getpid())
+
+
+def stop_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info("tracemalloc off in pid %d", os.getpid())
+
+
+def tracing_status():
+    if not tracemalloc.is_tracing():
+        return {"enabled": False}
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "enabled": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+    }
+
+
+def top_allocators(limit=20, group_by="lineno"):
+    """Largest live allocations since tracing started, grouped by line, file or traceback."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    return [
+        {
+            "where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            "bytes": stat.size,
+            "blocks": stat.count,
+        }
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def memory_report(allocators=20):
+    """Everything above for this process."""
+    report = {
+        "pid": os.getpid(),
+        "process": process_memory(),
+        "caches": cache_sizes(),
+        "tracemalloc": tracing_status(),
+    }
+    if report["tracemalloc"]["enabled"] and allocators:
+        report["top_allocators"] = top_allocators(allocators)
+    return report
+
+
+def init_memory_diagnostics(app):
+    """Start tracemalloc at boot if MEMORY_TRACEMALLOC_FRAMES is set."""
+    frames = app.config.get("MEMORY_TRACEMALLOC_FRAMES", 0)
+    if frames and not tracemalloc.is_tracing():
+        start_tracing(frames)
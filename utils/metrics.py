@@ -0,0 +1,269 @@
+"""
+In-process performance metrics exposed in Prometheus text format.
+
+A deliberately small registry (counters, gauges and fixed-bucket histograms)
+so instrumentation costs a dict lookup and a lock per observation rather than
+pulling in a client library. Values are per process: with several server
+workers, each worker reports its own series.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+# ---------------------------
+# Metric types
+# ---------------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Gauge whose value is either set directly or read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self.callback is not None:
+            # callback returns {label_tuple: value}
+            items = list(self.callback().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts + the +Inf slot, sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][idx] += 1
+            state[1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1]) for key, state in self._values.items()]
+
+        lines = self.header()
+        bucket_names = self.labelnames + ("le",)
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_names, key + (le,))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-registering by name returns the existing metric (module reloads, tests)
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=(), callback=None):
+    return registry.register(Gauge(name, documentation, labelnames, callback))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# ---------------------------
+# Core series
+# ---------------------------
+
+REQUESTS = counter("http_requests_total", "HTTP requests by endpoint, method and status.", ("endpoint", "method", "status"))
+REQUEST_LATENCY = histogram("http_request_duration_seconds", "Request latency by endpoint.", ("endpoint", "method"))
+REQUEST_SIZE = histogram("http_request_size_bytes", "Request body size by endpoint.", ("endpoint",), SIZE_BUCKETS)
+RESPONSE_SIZE = histogram("http_response_size_bytes", "Response body size by endpoint.", ("endpoint",), SIZE_BUCKETS)
+REQUEST_SQL_QUERIES = histogram("http_request_sql_queries", "SQL statements executed per request.", ("endpoint",), COUNT_BUCKETS)
+REQUEST_SQL_TIME = histogram("http_request_sql_seconds", "Time spent in SQL per request.", ("endpoint",))
+SQL_QUERIES = counter("sql_queries_total", "SQL statements executed (inside and outside requests).")
+SQL_TIME = counter("sql_query_seconds_total", "Total time spent executing SQL statements.")
+MATCHER_LATENCY = histogram("biometric_match_duration_seconds", "Time spent in the biometric matcher.", ("method",))
+
+
+@contextmanager
+def time_matcher(method):
+    """Time one matcher call; the time is also attributed to the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        MATCHER_LATENCY.observe(elapsed, method=method)
+        if has_request_context():
+            g._metrics_matcher_time = g.get("_metrics_matcher_time", 0.0) + elapsed
+
+
+# ---------------------------
+# SQLAlchemy engine events
+# ---------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    SQL_QUERIES.inc()
+    SQL_TIME.inc(elapsed)
+    if has_request_context():
+        g._metrics_sql_count = g.get("_metrics_sql_count", 0) + 1
+        g._metrics_sql_time = g.get("_metrics_sql_time", 0.0) + elapsed
+
+
+def _install_engine_listeners():
+    # Listening on the Engine class covers every engine/bind Flask-SQLAlchemy creates
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------------------------
+# Request middleware
+# ---------------------------
+
+def _endpoint_label():
+    return request.endpoint or "unmatched"
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is None:
+        return response
+
+    endpoint = _endpoint_label()
+    elapsed = time.perf_counter() - start
+
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method)
+    REQUEST_SQL_QUERIES.observe(g.get("_metrics_sql_count", 0), endpoint=endpoint)
+    REQUEST_SQL_TIME.observe(g.get("_metrics_sql_time", 0.0), endpoint=endpoint)
+    if request.content_length:
+        REQUEST_SIZE.observe(request.content_length, endpoint=endpoint)
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, endpoint=endpoint)
+
+    if "_metrics_matcher_time" in g:
+        response.headers["Server-Timing"] = (
+            f"app;dur={elapsed * 1000:.1f}, "
+            f"sql;dur={g.get('_metrics_sql_time', 0.0) * 1000:.1f}, "
+            f"match;dur={g._metrics_matcher_time * 1000:.1f}"
+        )
+    return response
+
+
+def init_metrics(app):
+    """Register request middleware and SQL listeners on the app."""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    _install_engine_listeners()
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+def render_latest():
+    return registry.render()
@@ -0,0 +1,96 @@
+"""
+Face probe payloads for /api/attendance/signin and /api/biometrics/verify/face.
+
+A probe embedding can arrive as:
+  * a JSON array of floats (the original format, still accepted);
+  * a base64 string of little-endian float32 bytes in the same JSON field, or
+    float16 with "embedding_dtype": "float16";
+  * the raw bytes as an application/octet-stream body, with the dtype in the
+    X-Embedding-Dtype header and the other fields in headers / the query
+    string (X-Kiosk-Id, ?scope=).
+
+Binary payloads are decoded with np.frombuffer instead of parsing one Python
+float per dimension: a 512-d probe is 2 KB as float32 (1 KB as float16) rather
+than ~5 KB of JSON text. Every format is checked against the gallery's
+dimension, so a kiosk running a different model gets a 400 instead of a
+silent "no match".
+"""
+
+import base64
+import binascii
+
+from flask import request
+
+from utils import metrics
+
+PROBE_DTYPES = {"float32": "<f4", "float16": "<f2"}
+MAX_PROBE_DIM = 4096
+
+PROBE_PAYLOADS = metrics.counter(
+    "face_probe_payloads_total",
+    "Face probes received, by payload format.",
+    ("format",),
+)
+
+
+def decode_probe(value, dtype="float32"):
+    """Decode a JSON list, base64 string or raw bytes to a float32 vector; raises ValueError."""
+    import numpy as np  # imported lazily: only matching needs numpy
+
+    if dtype not in PROBE_DTYPES:
+        raise ValueError(f"embedding dtype must be one of {', '.join(PROBE_DTYPES)}")
+
+    if isinstance(value, str):
+        try:
+            value = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("embedding is not valid base64")
+
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        dtype = np.dtype(PROBE_DTYPES[dtype])
+        if len(value) % dtype.itemsize:
+            raise ValueError(f"embedding is {len(value)} bytes, not a whole number of {dtype.name} values")
+        vector = np.frombuffer(value, dtype=dtype).astype(np.float32)
+    elif isinstance(value, list):
+        try:
+            vector = np.asarray(value, dtype=np.float32)
+        except (TypeError, ValueError):
+            raise ValueError("embedding must be an array of numbers")
+    else:
+        raise ValueError("embedding must be an array of numbers or a base64 string")
+
+    if vector.ndim != 1 or not 0 < vector.size <= MAX_PROBE_DIM:
+        raise ValueError("embedding must be a non-empty flat vector")
+    if not np.isfinite(vector).all():
+        raise ValueError("embedding contains non-finite values")
+
+    from utils.face_gallery import gallery
+
+    dim = gallery.state().dim
+    if dim and vector.size != dim:
+        raise ValueError(f"embedding must have {dim} dimensions, got {vector.size}")
+    return vector
+
+
+def read_probe(field):
+    """
+    (request fields, probe vector or None) for the current request; fields is
+    None when there is no usable payload. Raises ValueError for a bad probe.
+    """
+    if request.mimetype == "application/octet-stream":
+        fields = {"kiosk_id": request.headers.get("X-Kiosk-Id"), "scope": request.args.getlist("scope") or None}
+        body = request.get_data(cache=False)
+        if not body:
+            return None, None
+        dtype = request.headers.get("X-Embedding-Dtype") or request.args.get("dtype") or "float32"
+        PROBE_PAYLOADS.inc(format="octet-stream")
+        return fields, decode_probe(body, dtype.lower())
+
+    data = request.get_json(silent=True)
+    if not data:
+        return None, None
+    value = data.get(field)
+    if value is None or (isinstance(value, (list, str)) and not value):
+        return data, None
+    PROBE_PAYLOADS.inc(format="base64" if isinstance(value, str) else "json")
+    return data, decode_probe(value, str(data.get("embedding_dtype") or "float32").lower())
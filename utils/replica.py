@@ -0,0 +1,166 @@
+"""
+Optional read-replica routing for report and roster endpoints.
+
+With REPLICA_DATABASE_URL set, the replica is registered as the "replica"
+bind and RoutingSession (the session class of `db`) sends a SELECT there when
+all of these hold:
+  * the view is marked @replica_reads (reports, roster lists, exports);
+  * the session has not flushed anything in this request, so a view that
+    writes and then reads sees its own write;
+  * the client did not write within REPLICA_MAX_LAG_SECONDS: requests that
+    write set a db_last_write cookie, so an admin who just marked attendance
+    gets the primary on the next page load (read-your-own-writes);
+  * the replica's measured lag is within REPLICA_MAX_LAG_SECONDS (checked at
+    most every REPLICA_LAG_CHECK_SECONDS; PostgreSQL only, other databases
+    count as caught up) and the last check did not fail.
+Everything else, including every write and all of /signin, uses the primary.
+
+Without a replica URL nothing changes. For local testing, point the replica
+at a second SQLite file and keep it refreshed with replica_standin.py.
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql import Select
+
+from utils import metrics
+
+logger = logging.getLogger("replica")
+
+REPLICA_BIND = "replica"
+WRITE_COOKIE = "db_last_write"
+
+ROUTED_READS = metrics.counter(
+    "db_replica_routed_total",
+    "SELECTs from @replica_reads views, by the bind they went to.",
+    ("bind",),
+)
+
+# pg_last_xact_replay_timestamp() alone reports an idle replica as lagging
+LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class _ReplicaHealth:
+    """Per-process cache of the replica's lag."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.lag = 0.0
+        self.healthy = True
+        self.configured = False
+
+    def usable(self, engine, config):
+        if time.monotonic() - self._checked_at >= config.get("REPLICA_LAG_CHECK_SECONDS", 5):
+            with self._lock:
+                if time.monotonic() - self._checked_at >= config.get("REPLICA_LAG_CHECK_SECONDS", 5):
+                    self._check(engine)
+        return self.healthy and self.lag <= config.get("REPLICA_MAX_LAG_SECONDS", 10)
+
+    def _check(self, engine):
+        self._checked_at = time.monotonic()
+        try:
+            if engine.dialect.name == "postgresql":
+                with engine.connect() as conn:
+                    self.lag = float(conn.execute(LAG_SQL).scalar() or 0)
+            else:
+                self.lag = 0.0
+            if not self.healthy:
+                logger.info("Replica is reachable again")
+            self.healthy = True
+        except Exception:
+            if self.healthy:
+                logger.exception("Replica check failed; reading from the primary")
+            self.healthy = False
+
+
+health = _ReplicaHealth()
+
+metrics.gauge(
+    "db_replica_lag_seconds",
+    "Replica lag at the last check (this worker).",
+    callback=lambda: {(): health.lag} if health.configured else {},
+)
+
+
+def _recent_writer(config):
+    try:
+        last_write = float(request.cookies.get(WRITE_COOKIE, 0))
+    except ValueError:
+        return False
+    return time.time() - last_write < config.get("REPLICA_MAX_LAG_SECONDS", 10)
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that can send a request's reads to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and isinstance(clause, Select)
+            and not self._flushing
+            and not self.info.get("wrote")
+            and has_request_context()
+            and g.get("db_replica_reads")
+        ):
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                config = current_app.config
+                if not _recent_writer(config) and health.usable(engine, config):
+                    ROUTED_READS.inc(bind=REPLICA_BIND)
+                    return engine
+                ROUTED_READS.inc(bind="primary")
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    # Bulk UPDATE / DELETE / INSERT statements don't flush
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["wrote"] = True
+
+
+def replica_reads(view):
+    """Let this view's SELECTs go to the replica (see module docstring)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_replica_reads = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_replica(app, db):
+    """Register the replica bind (if configured) and the write cookie."""
+    url = app.config.get("REPLICA_DATABASE_URL")
+    if not url:
+        return
+    app.config["SQLALCHEMY_BINDS"] = {**(app.config.get("SQLALCHEMY_BINDS") or {}), REPLICA_BIND: url}
+    health.configured = True
+
+    @app.after_request
+    def remember_write(response):
+        if db.session.info.get("wrote"):
+            response.set_cookie(
+                WRITE_COOKIE, f"{time.time():.3f}",
+                max_age=int(app.config.get("REPLICA_MAX_LAG_SECONDS", 10)) + 1,
+                httponly=True,
+                secure=app.config.get("JWT_COOKIE_SECURE", False),
+                samesite=app.config.get("JWT_COOKIE_SAMESITE", "Lax"),
+            )
+        return response
@@ -0,0 +1,127 @@
+"""
+Report job types (run by utils/jobs.py, never inside a request).
+
+monthly_timesheet: one XLSX per department and month, a row per staff member
+with their sign-in/out times for every day plus totals. Written with
+openpyxl's write-only workbook, which streams rows to disk instead of
+building the sheet in memory.
+"""
+
+import re
+from calendar import monthrange
+from datetime import datetime
+
+from app import db
+from models.models import User, StaffAttendance
+from utils.archive import iter_archived
+from utils.jobs import job_type
+
+TIMESHEET_COLUMNS = ["user_id", "created_at", "time_in", "time_out", "status"]
+
+
+def _validate_timesheet(params):
+    try:
+        year, month = int(params.get("year")), int(params.get("month"))
+    except (TypeError, ValueError):
+        raise ValueError("year and month are required integers")
+    if not 1 <= month <= 12 or not 2000 <= year <= 2100:
+        raise ValueError("Invalid year/month")
+    department = (params.get("department") or "").strip()
+    if not department:
+        raise ValueError("department is required")
+    return {"year": year, "month": month, "department": department}
+
+
+def _month_records(user_ids, start, end):
+    """{user_id: {day: (time_in, time_out, status)}} for the month, hot and archived rows."""
+    days = {}
+
+    def add(user_id, created_at, time_in, time_out, status):
+        day = (time_in or created_at).day
+        previous = days.setdefault(user_id, {}).get(day)
+        # Keep the earliest sign-in of the day if there are several rows
+        if previous is None or (time_in and (previous[0] is None or time_in < previous[0])):
+            days[user_id][day] = (time_in, time_out, status)
+
+    for month in iter_archived(StaffAttendance, start, end, TIMESHEET_COLUMNS, [("user_id", "in", list(user_ids))]):
+        for r in month.to_pylist():
+            add(r["user_id"], r["created_at"], r["time_in"], r["time_out"], r["status"])
+
+    stmt = (
+        db.select(StaffAttendance.user_id, StaffAttendance.created_at, StaffAttendance.time_in,
+                  StaffAttendance.time_out, StaffAttendance.status)
+        .join(User, User.id == StaffAttendance.user_id)
+        .where(User.id.in_(user_ids), StaffAttendance.created_at >= start, StaffAttendance.created_at < end)
+    )
+    for row in db.session.execute(stmt.execution_options(yield_per=5000)):
+        add(*row)
+    return days
+
+
+@job_type("monthly_timesheet", max_attempts=3, validate=_validate_timesheet)
+def monthly_timesheet(ctx):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+
+    year, month, department = ctx.params["year"], ctx.params["month"], ctx.params["department"]
+    days_in_month = monthrange(year, month)[1]
+    start = datetime(year, month, 1)
+    end = datetime(year + (month == 12), month % 12 + 1, 1)
+
+    staff = (
+        db.session.query(User.id, User.firstname, User.lastname, User.email)
+        .filter(User.department == department)
+        .order_by(User.lastname, User.firstname)
+        .all()
+    )
+    records = _month_records([s.id for s in staff], start, end) if staff else {}
+    ctx.progress(0.2)
+
+    wb = Workbook(write_only=True)
+    # Sheet titles may not contain / \ ? * [ ] : (and at most 31 characters)
+    sheet_department = " ".join(re.sub(r"[/\\?*\[\]:]", " ", department).split())[:22].strip(" '") or "Timesheet"
+    ws = wb.create_sheet(f"{sheet_department} {year}-{month:02d}")
+    ws.freeze_panes = "C3"
+    ws.column_dimensions["A"].width = 28
+    ws.column_dimensions["B"].width = 30
+
+    bold = Font(bold=True)
+    late_fill = PatternFill("solid", start_color="FFE699")
+
+    def cell(value, font=None, fill=None):
+        c = WriteOnlyCell(ws, value=value)
+        if font:
+            c.font = font
+        if fill:
+            c.fill = fill
+        return c
+
+    ws.append([cell(f"Timesheet — {department} — {start:%B %Y}", bold)])
+    ws.append([cell(h, bold) for h in
+               ["Name", "Email", *range(1, days_in_month + 1), "Days present", "Late", "Early sign-out", "Hours"]])
+
+    for i, person in enumerate(staff):
+        row = [f"{person.firstname} {person.lastname}", person.email]
+        present = late = early = 0
+        seconds = 0.0
+        for day in range(1, days_in_month + 1):
+            entry = records.get(person.id, {}).get(day)
+            if not entry or not entry[0]:
+                row.append(None)
+                continue
+            time_in, time_out, status = entry
+            present += 1
+            late += status == "LATE"
+            early += status == "EARLY_SIGNOUT"
+            if time_out and time_out > time_in:
+                seconds += (time_out - time_in).total_seconds()
+            text = f"{time_in:%H:%M}–{time_out:%H:%M}" if time_out else f"{time_in:%H:%M}–"
+            row.append(cell(text, fill=late_fill if status == "LATE" else None))
+        row.extend([present, late, early, round(seconds / 3600, 2)])
+        ws.append(row)
+        if i % 50 == 0:
+            ctx.progress(0.2 + 0.75 * (i + 1) / len(staff))
+
+    safe_department = re.sub(r"[^A-Za-z0-9_-]+", "_", department).strip("_") or "department"
+    wb.save(ctx.output_path(f"timesheet-{safe_department}-{year}-{month:02d}.xlsx"))
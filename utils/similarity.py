@@ -0,0 +1,151 @@
+"""
+Vectorised all-pairs similarity statistics for face templates.
+
+Scores every pair of unit-normalised templates with blocked matrix products
+(block × block tiles of the upper triangle), so memory stays at a few tiles
+whatever the gallery size and the full N×N matrix never exists. Each tile is
+reduced straight to fixed-width histograms over [-1, 1]: pairs of templates of
+the same user are genuine, all others impostor. FAR/FRR, ROC/DET points and
+thresholds are then read off the cumulative histograms. pairs_above() walks
+the same tiles to find cross-user pairs above a threshold.
+
+Used by calibrate_threshold.py and the duplicate_audit job.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_BINS = 2000  # 0.001 score resolution
+
+
+def score_bins(scores, bins):
+    """Histogram bin index of each score; bin i covers [-1 + 2i/bins, -1 + 2(i+1)/bins)."""
+    idx = ((scores + 1.0) * (bins / 2.0)).astype(np.int32)
+    np.clip(idx, 0, bins - 1, out=idx)
+    return idx
+
+
+def bin_edges(bins):
+    return np.linspace(-1.0, 1.0, bins + 1)
+
+
+def row_block_histograms(matrix, user_ids, row_start, row_stop, block, bins):
+    """(genuine, impostor) histograms of rows [row_start, row_stop) against every later row."""
+    genuine = np.zeros(bins, dtype=np.int64)
+    total = np.zeros(bins, dtype=np.int64)
+    rows = matrix[row_start:row_stop]
+    row_users = user_ids[row_start:row_stop]
+
+    for col_start in range(row_start, len(matrix), block):
+        col_stop = min(col_start + block, len(matrix))
+        idx = score_bins(rows @ matrix[col_start:col_stop].T, bins)
+        same = row_users[:, None] == user_ids[None, col_start:col_stop]
+        if col_start == row_start:
+            # Diagonal tile: each pair once, no self-pairs
+            upper = np.triu(np.ones(idx.shape, dtype=bool), k=1)
+            total += np.bincount(idx[upper], minlength=bins)
+            same &= upper
+        else:
+            total += np.bincount(idx.ravel(), minlength=bins)
+        genuine += np.bincount(idx[same], minlength=bins)
+    return genuine, total - genuine
+
+
+_worker = {}
+
+
+def _init_worker(matrix, user_ids, block, bins):
+    _worker.update(matrix=matrix, user_ids=user_ids, block=block, bins=bins)
+
+
+def _worker_histograms(row_start):
+    w = _worker
+    return row_block_histograms(
+        w["matrix"], w["user_ids"], row_start, min(row_start + w["block"], len(w["matrix"])), w["block"], w["bins"]
+    )
+
+
+def pair_histograms(matrix, user_ids, block=2048, bins=DEFAULT_BINS, workers=1, progress=None):
+    """
+    Genuine and impostor score histograms over all template pairs.
+
+    workers > 1 spreads row blocks over a process pool (each worker gets one
+    copy of the matrix); progress(done, total) is called per row block.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    user_ids = np.asarray(user_ids)
+    starts = list(range(0, len(matrix), block))
+    genuine = np.zeros(bins, dtype=np.int64)
+    impostor = np.zeros(bins, dtype=np.int64)
+
+    if workers > 1 and len(starts) > 1:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(matrix, user_ids, block, bins)) as pool:
+            for done, (g, i) in enumerate(pool.map(_worker_histograms, starts), 1):
+                genuine += g
+                impostor += i
+                if progress:
+                    progress(done, len(starts))
+    else:
+        for done, start in enumerate(starts, 1):
+            g, i = row_block_histograms(matrix, user_ids, start, min(start + block, len(matrix)), block, bins)
+            genuine += g
+            impostor += i
+            if progress:
+                progress(done, len(starts))
+    return genuine, impostor
+
+
+def pairs_above(matrix, user_ids, threshold, block=2048, progress=None):
+    """
+    Yield (rows, cols, scores) arrays of the pairs of different users scoring
+    at least threshold, one tile at a time (each pair once, row < col).
+    progress(done, total) is called per row block.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    user_ids = np.asarray(user_ids)
+    n = len(matrix)
+    starts = range(0, n, block)
+    for done, row_start in enumerate(starts, 1):
+        row_stop = min(row_start + block, n)
+        rows = np.asarray(matrix[row_start:row_stop])
+        row_users = user_ids[row_start:row_stop]
+        for col_start in range(row_start, n, block):
+            col_stop = min(col_start + block, n)
+            scores = rows @ np.asarray(matrix[col_start:col_stop]).T
+            hit = scores >= threshold
+            hit &= row_users[:, None] != user_ids[None, col_start:col_stop]
+            if col_start == row_start:
+                hit &= np.triu(np.ones(hit.shape, dtype=bool), k=1)
+            i, j = np.nonzero(hit)
+            if len(i):
+                yield row_start + i, col_start + j, scores[i, j]
+        if progress:
+            progress(done, len(starts))
+
+
+def error_rates(genuine, impostor):
+    """
+    (thresholds, FAR, FRR) at every bin edge: accepting score >= threshold,
+    FAR is the share of impostor pairs accepted, FRR of genuine pairs rejected.
+    """
+    bins = len(genuine)
+    thresholds = bin_edges(bins)
+    # Pairs scoring at or above each edge
+    impostor_above = np.concatenate([np.cumsum(impostor[::-1])[::-1], [0]])
+    genuine_below = np.concatenate([[0], np.cumsum(genuine)])
+    far = impostor_above / max(int(impostor.sum()), 1)
+    frr = genuine_below / max(int(genuine.sum()), 1)
+    return thresholds, far, frr
+
+
+def threshold_for_far(thresholds, far, target):
+    """Lowest threshold whose FAR is at most target (index, threshold)."""
+    index = int(np.argmax(far <= target))
+    return index, float(thresholds[index])
+
+
+def equal_error_rate(thresholds, far, frr):
+    """(threshold, rate) where FAR and FRR cross."""
+    index = int(np.argmin(np.abs(far - frr)))
+    return float(thresholds[index]), float((far[index] + frr[index]) / 2)
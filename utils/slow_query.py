@@ -0,0 +1,126 @@
+"""
+Slow SQL detection.
+
+Statements slower than SLOW_QUERY_THRESHOLD_MS are recorded in a bounded
+in-memory ring buffer (statement, parameter shape, calling endpoint and,
+on PostgreSQL when SLOW_QUERY_EXPLAIN is on, the EXPLAIN plan) and logged.
+Admins read the buffer through /api/diagnostics/slow-queries.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils import memory
+
+logger = logging.getLogger("slow_query")
+
+_settings = {"threshold": 0.2, "explain": False}
+_buffer = deque(maxlen=200)
+_lock = threading.Lock()
+
+
+def param_shape(parameters, executemany=False):
+    """Describe bound parameters by type only, never by value."""
+    if executemany and parameters:
+        return {"rows": len(parameters), "row": param_shape(parameters[0])}
+    if isinstance(parameters, dict):
+        return {k: type(v).__name__ for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(v).__name__ for v in parameters]
+    return None
+
+
+def _explain(conn, statement, parameters):
+    """Return the EXPLAIN plan lines, run on the raw DBAPI connection inside a savepoint."""
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute("EXPLAIN " + statement, parameters or None)
+            plan = [row[0] for row in cursor.fetchall()]
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_slow_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_slow_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if elapsed < _settings["threshold"]:
+        return
+
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(elapsed * 1000, 2),
+        "statement": statement,
+        "params": param_shape(parameters, executemany),
+        "endpoint": request.endpoint if has_request_context() else None,
+        "plan": None,
+    }
+
+    if (
+        _settings["explain"]
+        and not executemany
+        and conn.dialect.name == "postgresql"
+        and statement.lstrip().upper().startswith("SELECT")
+    ):
+        entry["plan"] = _explain(conn, statement, parameters)
+
+    with _lock:
+        _buffer.append(entry)
+    logger.warning("Slow query (%.1f ms) at %s: %s", entry["duration_ms"], entry["endpoint"], statement)
+
+
+def recent_slow_queries(limit=None):
+    """Newest-first copy of the ring buffer."""
+    with _lock:
+        entries = list(_buffer)
+    entries.reverse()
+    return entries[:limit] if limit else entries
+
+
+def clear_slow_queries():
+    with _lock:
+        _buffer.clear()
+
+
+def _buffer_bytes():
+    with _lock:
+        return memory.deep_sizeof(_buffer)
+
+
+memory.register_cache("slow_query_log", _buffer_bytes)
+
+
+def init_slow_query_log(app):
+    """Configure the threshold/buffer from app config and install engine listeners."""
+    global _buffer
+
+    _settings["threshold"] = app.config.get("SLOW_QUERY_THRESHOLD_MS", 200) / 1000.0
+    _settings["explain"] = app.config.get("SLOW_QUERY_EXPLAIN", False)
+
+    size = app.config.get("SLOW_QUERY_BUFFER_SIZE", 200)
+    with _lock:
+        if _buffer.maxlen != size:
+            _buffer = deque(_buffer, maxlen=size)
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
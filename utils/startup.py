@@ -0,0 +1,94 @@
+"""
+Worker warm-up and readiness.
+
+warm_up() imports the matcher stack, loads the face gallery and the archive
+manifest and runs a dummy match so BLAS initialisation and the first gallery
+build are paid before traffic arrives. /api/health/ready reports 503 until
+it has completed.
+
+Under a pre-forking server (gunicorn.conf.py) warm-up runs once in the
+master; prepare_fork() and after_fork() bracket each fork so workers share
+the warmed pages copy-on-write and never share database connections.
+"""
+
+import gc
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+_status = {"state": "pending", "started_at": None, "finished_at": None, "duration_ms": None, "error": None}
+
+
+def warm_up(app):
+    """Run the warm-up phase synchronously (call before serving traffic)."""
+    _status.update(state="running", started_at=time.time(), error=None)
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            import numpy as np
+            from utils.face_gallery import gallery
+
+            from utils.archive import load_manifest
+
+            load_manifest()
+            state = gallery.load()
+            if state.size:
+                # One real product initialises BLAS threads and page-faults the matrix in
+                gallery.match(np.ones(state.dim, dtype=np.float32))
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        _status.update(state="failed", error=str(e))
+        return False
+
+    _status.update(
+        state="ready",
+        finished_at=time.time(),
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    _ready.set()
+    logger.info("Warm-up finished in %.1f ms", _status["duration_ms"])
+    return True
+
+
+def start_warm_up(app):
+    """Run warm-up in a background thread so the server can start accepting probes."""
+    thread = threading.Thread(target=warm_up, args=(app,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def warm_up_status():
+    return dict(_status)
+
+
+def prepare_fork(app):
+    """
+    In the master, before each fork: close its database connections (a
+    worker must never reuse a socket another process holds) and move every
+    object into the permanent GC generation, so collections in the workers
+    don't write to, and so un-share, the pages holding the warmed data.
+    """
+    from app import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    gc.freeze()
+
+
+def after_fork(app):
+    """In a new worker: drop inherited pool state and turn collection back on."""
+    from app import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: the master's connections (if any) belong to the master
+            engine.dispose(close=False)
+    gc.enable()
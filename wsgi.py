@@ -0,0 +1,15 @@
+"""
+Production WSGI entry point: `gunicorn wsgi:app` (settings in gunicorn.conf.py).
+
+Warm-up runs at import. With preload_app (the default in gunicorn.conf.py)
+that is once, in the master, and every worker starts with the gallery
+already loaded; without it each worker warms itself up before serving.
+Leave WARMUP_ON_START off here: a background warm-up thread must not be
+running when the master forks.
+"""
+
+from app import create_app
+from utils.startup import warm_up
+
+app = create_app()
+warm_up(app)